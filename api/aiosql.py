@@ -0,0 +1,552 @@
+import asyncio
+import re
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Optional, Sequence
+
+from api.sql import (
+    DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT,
+    SCHEDULES_BY_WEEK_SQL, COUNTS_FOR_RANGE_SQL, BOOKINGS_BY_MEMBER_SQL,
+    LOCK_SCHEDULE_SQL, PROMOTE_WAITLIST_SQL, COUNT_BOOKINGS_SQL, BOOK_SQL, CANCEL_BOOKING_SQL,
+    BOOKING_STATE_SQL, INSERT_BOOKING_SQL, JOIN_WAITLIST_SQL, LEAVE_WAITLIST_SQL, WAITLIST_BY_MEMBER_SQL,
+    BookingResult, WaitlistResult,
+)
+from api.sql import (
+    Member as _Member, Coach as _Coach, Plan as _Plan, Course as _Course, ConfirmSQL as _ConfirmSQL,
+    Analysis as _Analysis, Booking as _Booking, CourseSchedule as _CourseSchedule, Waitlist as _Waitlist,
+)
+from api.cache import WEEK_GRID_CACHE
+
+# ------------------------------------------------------------
+# api/sql.py 的 asyncio 版本 (asyncpg，需另外安裝)
+#
+# 方法名稱、參數、回傳格式 (tuple / list of tuple) 都與 api/sql.py 相同，
+# 差別只在要 await，並且彼此獨立的查詢可以用 DB.gather 同時送出：
+#     rows, bookings = await DB.gather(
+#         CourseSchedule.get_schedules_by_week(start, end),
+#         Booking.get_bookings_by_member(member_id),
+#     )
+# 會員首頁、預約、取消與候補 (Booking / Waitlist / get_schedules_by_week) 直接走 asyncpg，
+# SQL 與同步版共用 api/sql.py 的模組常數 (psycopg2 的 %s / %(name)s 寫法)，
+# 送出前才轉成 asyncpg 的 $1, $2 …；日期參數在這裡轉成 datetime.date。
+# 其餘的後台與帳號操作 (Member / Coach / Plan / Course / ConfirmSQL / Analysis 與排程管理)
+# 不在高並發的路徑上，以 asyncio.to_thread 呼叫同步版，快取失效等行為也就與同步版完全相同。
+#
+# 連線池綁定 event loop，每個 loop 各自一個池子 (大小沿用 DB_POOL_MIN / DB_POOL_MAX)。
+# 匯出用的 stream_history / stream_orders 與 Rollup.rebuild 只有同步版。
+# 500 位會員同時載入首頁的負載測試：python -m benchmarks.async_load
+# ------------------------------------------------------------
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+@lru_cache(maxsize=512)
+def _convert(sql: str, named: bool):
+    """
+    把 psycopg2 的佔位符換成 $n。回傳 (新的 SQL, 具名參數的名稱順序 / 位置參數個數)
+    """
+    names = []
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        token = match.group(0)
+        if token == "%%":
+            return "%"
+        if named:
+            name = match.group(1)
+            if name not in names:
+                names.append(name)
+            return f"${names.index(name) + 1}"
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(replace, sql), (tuple(names) if named else count)
+
+
+def _prepare(sql: str, input_params):
+    if isinstance(input_params, dict):
+        converted, names = _convert(sql, True)
+        return converted, [input_params[name] for name in names]
+    converted, _ = _convert(sql, False)
+    return converted, list(input_params or ())
+
+
+class Connection:
+    """
+    包裝 asyncpg 連線，提供與同步版 cursor 相近的 fetchall / fetchone / execute
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self.rowcount = -1
+
+    async def execute(self, sql: str, input_params=None):
+        converted, args = _prepare(sql, input_params)
+        status = await self._connection.execute(converted, *args)
+        # asyncpg 回傳 "DELETE 3" / "INSERT 0 1" 之類的字串，最後一段是筆數
+        last = status.rsplit(" ", 1)[-1] if status else ""
+        self.rowcount = int(last) if last.isdigit() else -1
+
+    async def fetchall(self, sql: str, input_params=None):
+        converted, args = _prepare(sql, input_params)
+        rows = await self._connection.fetch(converted, *args)
+        self.rowcount = len(rows)
+        return [tuple(r) for r in rows]
+
+    async def fetchone(self, sql: str, input_params=None):
+        converted, args = _prepare(sql, input_params)
+        row = await self._connection.fetchrow(converted, *args)
+        return tuple(row) if row is not None else None
+
+
+class DB:
+    _pools = {}  # event loop -> asyncpg pool
+    _locks = {}  # event loop -> asyncio.Lock (避免同一個 loop 同時建立兩個池子)
+
+    @staticmethod
+    async def _get_pool():
+        """
+        第一次在某個 event loop 中呼叫時建立該 loop 的連線池
+        """
+        import asyncpg
+
+        loop = asyncio.get_running_loop()
+        pool = DB._pools.get(loop)
+        if pool is None:
+            async with DB._locks.setdefault(loop, asyncio.Lock()):
+                pool = DB._pools.get(loop)
+                if pool is None:
+                    pool = await asyncpg.create_pool(
+                        user=DB_USER,
+                        password=DB_PASSWORD,
+                        host=DB_HOST,
+                        port=int(DB_PORT),
+                        database=DB_NAME,
+                        min_size=DB_POOL_MIN,
+                        max_size=DB_POOL_MAX,
+                    )
+                    DB._pools[loop] = pool
+        return pool
+
+    @staticmethod
+    async def close():
+        """
+        關閉目前 event loop 的連線池 (loop 結束前呼叫)
+        """
+        loop = asyncio.get_running_loop()
+        DB._locks.pop(loop, None)
+        pool = DB._pools.pop(loop, None)
+        if pool is not None:
+            await pool.close()
+
+    @staticmethod
+    @asynccontextmanager
+    async def connect():
+        """
+        從連線池借一條連線；最多等待 DB_POOL_TIMEOUT 秒
+        """
+        pool = await DB._get_pool()
+        connection = await pool.acquire(timeout=DB_POOL_TIMEOUT)
+        try:
+            yield Connection(connection)
+        finally:
+            await pool.release(connection)
+
+    @staticmethod
+    async def execute(sql: str, input_params: Optional[Sequence[Any]] = None):
+        """
+        不需要回傳結果，只要執行 (asyncpg 沒有交易時每個指令自動 commit)
+        """
+        async with DB.connect() as connection:
+            try:
+                await connection.execute(sql, input_params)
+            except Exception as e:
+                print(f"Error executing SQL: {e}")
+                raise e
+
+    # 與同步版相同，有參數的寫入也走 execute
+    execute_input = execute
+
+    @staticmethod
+    async def fetchall(sql: str, input_params: Optional[Sequence[Any]] = None):
+        """
+        回傳多筆資料
+        """
+        async with DB.connect() as connection:
+            try:
+                return await connection.fetchall(sql, input_params)
+            except Exception as e:
+                print(f"Error fetching data: {e}")
+                raise e
+
+    @staticmethod
+    async def fetchone(sql: str, input_params: Optional[Sequence[Any]] = None):
+        """
+        回傳一筆資料
+        """
+        async with DB.connect() as connection:
+            try:
+                return await connection.fetchone(sql, input_params)
+            except Exception as e:
+                print(f"Error fetching data: {e}")
+                raise e
+
+    @staticmethod
+    @asynccontextmanager
+    async def transaction():
+        """
+        在同一條連線上執行多個指令，全部成功才 commit，任何錯誤都 rollback。
+        用法：
+            async with DB.transaction() as connection:
+                await connection.execute(...)
+        """
+        async with DB.connect() as connection:
+            async with connection._connection.transaction():
+                yield connection
+
+    @staticmethod
+    async def gather(*aws):
+        """
+        同時執行多個彼此獨立的查詢 (各自向池子借連線)，依傳入順序回傳結果
+        """
+        return await asyncio.gather(*aws)
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def _slot_params(courseId, scheduleDate, timeSlot, memberId):
+    return {
+        "courseid": courseId,
+        "scheduledate": _as_date(scheduleDate),
+        "timeslot": timeSlot,
+        "memberid": memberId,
+    }
+
+
+class Member:
+    @staticmethod
+    async def get_by_id(memberId):
+        return await asyncio.to_thread(_Member.get_by_id, memberId)
+
+    @staticmethod
+    async def create_member(input_data):
+        await asyncio.to_thread(_Member.create_member, input_data)
+
+    @staticmethod
+    async def update_status_by_id(memberId, new_status):
+        """
+        會員簽署合約後，更新其狀態。
+        """
+        await asyncio.to_thread(_Member.update_status_by_id, memberId, new_status)
+
+
+class Coach:
+    @staticmethod
+    async def get_by_id(coachId):
+        return await asyncio.to_thread(_Coach.get_by_id, coachId)
+
+    @staticmethod
+    async def create_coach(input_data):
+        await asyncio.to_thread(_Coach.create_coach, input_data)
+
+    @staticmethod
+    async def get_all_coach():
+        return await asyncio.to_thread(_Coach.get_all_coach)
+
+
+class Plan:
+    @staticmethod
+    async def get_next_planid():
+        return await asyncio.to_thread(_Plan.get_next_planid)
+
+    @staticmethod
+    async def get_all_plan():
+        return await asyncio.to_thread(_Plan.get_all_plan)
+
+    @staticmethod
+    async def get_period_by_id(planId):
+        return await asyncio.to_thread(_Plan.get_period_by_id, planId)
+
+    @staticmethod
+    async def add_plan(input_data):
+        await asyncio.to_thread(_Plan.add_plan, input_data)
+
+    @staticmethod
+    async def delete_plan(planid):
+        await asyncio.to_thread(_Plan.delete_plan, planid)
+
+
+class Course:
+    @staticmethod
+    async def count():
+        return await asyncio.to_thread(_Course.count)
+
+    @staticmethod
+    async def get_course(courseid):
+        return await asyncio.to_thread(_Course.get_course, courseid)
+
+    @staticmethod
+    async def get_all_course():
+        return await asyncio.to_thread(_Course.get_all_course)
+
+    @staticmethod
+    async def get_name(courseid):
+        return await asyncio.to_thread(_Course.get_name, courseid)
+
+    @staticmethod
+    async def add_course(input_data):
+        await asyncio.to_thread(_Course.add_course, input_data)
+
+    @staticmethod
+    async def delete_course(courseid):
+        await asyncio.to_thread(_Course.delete_course, courseid)
+
+    @staticmethod
+    async def update_course(input_data):
+        await asyncio.to_thread(_Course.update_course, input_data)
+
+    @staticmethod
+    async def get_courseid():
+        return await asyncio.to_thread(_Course.get_courseid)
+
+
+class CourseSchedule:
+    """
+    只有會員首頁用的 get_schedules_by_week 走 asyncpg；新增 / 刪除排程要在同一個交易中
+    做衝堂檢查 (find_conflicts 以 psycopg2 cursor 與 execute_values 操作)，
+    這些後台操作直接在執行緒中呼叫同步版。
+    """
+
+    @staticmethod
+    async def create(input_data):
+        await asyncio.to_thread(_CourseSchedule.create, input_data)
+
+    @staticmethod
+    async def create_recurring(courseid, coachid, timeslot, dates):
+        return await asyncio.to_thread(_CourseSchedule.create_recurring, courseid, coachid, timeslot, dates)
+
+    @staticmethod
+    async def delete(courseid, scheduledate, timeslot):
+        await asyncio.to_thread(_CourseSchedule.delete, courseid, scheduledate, timeslot)
+
+    @staticmethod
+    async def get_all_joined():
+        return await asyncio.to_thread(_CourseSchedule.get_all_joined)
+
+    @staticmethod
+    async def list_window(start_date, end_date, coachid=None, courseid=None, after=None, limit=50):
+        return await asyncio.to_thread(
+            _CourseSchedule.list_window, start_date, end_date, coachid, courseid, after, limit
+        )
+
+    @staticmethod
+    async def get_schedules_by_week(start_date, end_date):
+        """
+        獲取特定日期範圍內的所有排程，並 JOIN 課程、教練名稱、人數限制
+        """
+        return await DB.fetchall(SCHEDULES_BY_WEEK_SQL, (_as_date(start_date), _as_date(end_date)))
+
+    @staticmethod
+    async def check_course_in_use(courseid):
+        return await asyncio.to_thread(_CourseSchedule.check_course_in_use, courseid)
+
+
+class Booking:
+    BOOKED = _Booking.BOOKED
+    ALREADY_BOOKED = _Booking.ALREADY_BOOKED
+    FULL = _Booking.FULL
+    NOT_FOUND = _Booking.NOT_FOUND
+    CANCELLED = _Booking.CANCELLED
+    NOT_BOOKED = _Booking.NOT_BOOKED
+
+    @staticmethod
+    async def get_bookings_by_member(memberId):
+        """
+        查詢特定會員的所有預約紀錄 (未來的)，並 JOIN 課程資訊
+        """
+        return await DB.fetchall(BOOKINGS_BY_MEMBER_SQL, (memberId,))
+
+    @staticmethod
+    async def check_booking_exists(courseId, scheduleDate, timeSlot, memberId):
+        return await asyncio.to_thread(_Booking.check_booking_exists, courseId, scheduleDate, timeSlot, memberId)
+
+    @staticmethod
+    async def count_bookings_for_schedule(courseId, scheduleDate, timeSlot):
+        return await DB.fetchone(COUNT_BOOKINGS_SQL, _slot_params(courseId, scheduleDate, timeSlot, None))
+
+    @staticmethod
+    async def counts_for_range(start_date, end_date):
+        return await DB.fetchall(COUNTS_FOR_RANGE_SQL, (_as_date(start_date), _as_date(end_date)))
+
+    @staticmethod
+    async def check_schedule_in_use(courseid, scheduledate, timeslot):
+        return await asyncio.to_thread(_Booking.check_schedule_in_use, courseid, scheduledate, timeslot)
+
+    @staticmethod
+    async def book(courseId, scheduleDate, timeSlot, memberId):
+        """
+        與 api.sql.Booking.book 相同：鎖住時段、先補候補、再依人數上限條件式寫入。
+        asyncpg 不能一次送多個帶參數的指令，所以分成三個指令 (同一個交易)。
+        """
+        params = _slot_params(courseId, scheduleDate, timeSlot, memberId)
+        async with DB.transaction() as connection:
+            if await connection.fetchone(LOCK_SCHEDULE_SQL, params) is None:
+                return BookingResult(Booking.NOT_FOUND, 0, None)
+            await connection.execute(PROMOTE_WAITLIST_SQL, params)
+            limit, count, mine, inserted = await connection.fetchone(BOOK_SQL, params)
+
+        if inserted:
+            result = BookingResult(Booking.BOOKED, count + 1, limit)
+        elif mine:
+            result = BookingResult(Booking.ALREADY_BOOKED, count, limit)
+        else:
+            result = BookingResult(Booking.FULL, count, limit)
+        WEEK_GRID_CACHE.set_count(courseId, params["scheduledate"], timeSlot, result.current_count)
+        return result
+
+    @staticmethod
+    async def delete_booking(courseId, scheduleDate, timeSlot, memberId):
+        return await Booking.cancel(courseId, scheduleDate, timeSlot, memberId)
+
+    @staticmethod
+    async def cancel(courseId, scheduleDate, timeSlot, memberId):
+        """
+        與 api.sql.Booking.cancel 相同：取消並在同一個交易中依序補上候補
+        """
+        params = _slot_params(courseId, scheduleDate, timeSlot, memberId)
+        async with DB.transaction() as connection:
+            row = await connection.fetchone(LOCK_SCHEDULE_SQL, params)
+            if row is None:
+                return BookingResult(Booking.NOT_FOUND, 0, None)
+            limit = row[0]
+
+            await connection.execute(CANCEL_BOOKING_SQL, params)
+            deleted = connection.rowcount > 0
+
+            promoted = ()
+            if deleted:
+                promoted = tuple(r[0] for r in await connection.fetchall(PROMOTE_WAITLIST_SQL, params))
+            count = (await connection.fetchone(COUNT_BOOKINGS_SQL, params))[0]
+
+        status = Booking.CANCELLED if deleted else Booking.NOT_BOOKED
+        WEEK_GRID_CACHE.set_count(courseId, params["scheduledate"], timeSlot, count)
+        return BookingResult(status, count, limit, promoted)
+
+
+class Waitlist:
+    WAITLISTED = _Waitlist.WAITLISTED
+    ALREADY_WAITLISTED = _Waitlist.ALREADY_WAITLISTED
+    LEFT = _Waitlist.LEFT
+    NOT_WAITLISTED = _Waitlist.NOT_WAITLISTED
+
+    @staticmethod
+    async def join(courseId, scheduleDate, timeSlot, memberId):
+        """
+        與 api.sql.Waitlist.join 相同：補完空位後仍有位子就直接預約，否則排到候補名單最後
+        """
+        params = _slot_params(courseId, scheduleDate, timeSlot, memberId)
+        async with DB.transaction() as connection:
+            row = await connection.fetchone(LOCK_SCHEDULE_SQL, params)
+            if row is None:
+                return WaitlistResult(Booking.NOT_FOUND, None, 0, None)
+            limit = row[0]
+
+            await connection.execute(PROMOTE_WAITLIST_SQL, params)
+            count, mine = await connection.fetchone(BOOKING_STATE_SQL, params)
+
+            if mine:
+                result = WaitlistResult(Booking.ALREADY_BOOKED, None, count, limit)
+            elif limit is None or count < limit:
+                await connection.execute(INSERT_BOOKING_SQL, params)
+                result = WaitlistResult(Booking.BOOKED, None, count + 1, limit)
+            else:
+                await connection.execute(JOIN_WAITLIST_SQL, params)
+                status = Waitlist.WAITLISTED if connection.rowcount else Waitlist.ALREADY_WAITLISTED
+                position = (await connection.fetchone(_Waitlist.POSITION_SQL, params))[0]
+                result = WaitlistResult(status, position, count, limit)
+
+        WEEK_GRID_CACHE.set_count(courseId, params["scheduledate"], timeSlot, result.current_count)
+        return result
+
+    @staticmethod
+    async def leave(courseId, scheduleDate, timeSlot, memberId):
+        """
+        退出候補，回傳 Waitlist.LEFT / NOT_WAITLISTED
+        """
+        row = await DB.fetchone(LEAVE_WAITLIST_SQL, (courseId, _as_date(scheduleDate), timeSlot, memberId))
+        return Waitlist.LEFT if row is not None else Waitlist.NOT_WAITLISTED
+
+    @staticmethod
+    async def position(courseId, scheduleDate, timeSlot, memberId):
+        """
+        會員在該時段候補名單中的順位 (1 起算)；不在名單中回傳 0
+        """
+        params = _slot_params(courseId, scheduleDate, timeSlot, memberId)
+        return (await DB.fetchone(_Waitlist.POSITION_SQL, params))[0]
+
+    @staticmethod
+    async def get_by_member(memberId):
+        """
+        會員目前 (未來時段) 的所有候補與順位：(courseid, scheduledate, timeslot, position)
+        """
+        return await DB.fetchall(WAITLIST_BY_MEMBER_SQL, (memberId,))
+
+
+class ConfirmSQL:
+    @staticmethod
+    async def create_confirmation(memberId, planId, paymentType, period_months):
+        await asyncio.to_thread(_ConfirmSQL.create_confirmation, memberId, planId, paymentType, period_months)
+
+    @staticmethod
+    async def check_plan_in_use(planId):
+        return await asyncio.to_thread(_ConfirmSQL.check_plan_in_use, planId)
+
+
+class Analysis:
+    """
+    儀表板查詢 (讀 Rollup 的彙總表)，在執行緒中呼叫同步版。
+    """
+
+    @staticmethod
+    async def monthly_summary(year=None, start_date=None, end_date=None):
+        return await asyncio.to_thread(_Analysis.monthly_summary, year, start_date, end_date)
+
+    @staticmethod
+    async def month_price(i):
+        return await asyncio.to_thread(_Analysis.month_price, i)
+
+    @staticmethod
+    async def month_count(i):
+        return await asyncio.to_thread(_Analysis.month_count, i)
+
+    @staticmethod
+    async def category_sale():
+        return await asyncio.to_thread(_Analysis.category_sale)
+
+    @staticmethod
+    async def member_sale():
+        return await asyncio.to_thread(_Analysis.member_sale)
+
+    @staticmethod
+    async def member_sale_count():
+        return await asyncio.to_thread(_Analysis.member_sale_count)
+
+
+async def load_member_week(member_id, week_start):
+    """
+    會員首頁需要的四個查詢同時送出：
+    一週排程、每格人數、會員自己的預約、會員的候補。
+    回傳 (schedules, counts, bookings, waiting)，格式與同步版各方法相同。
+    """
+    week_start = _as_date(week_start)
+    week_end = week_start + timedelta(days=6)
+    return await DB.gather(
+        CourseSchedule.get_schedules_by_week(week_start, week_end),
+        Booking.counts_for_range(week_start, week_end),
+        Booking.get_bookings_by_member(member_id),
+        Waitlist.get_by_member(member_id),
+    )
@@ -1,12 +1,11 @@
 import os
-import psycopg2
-from dotenv import load_dotenv
 
 from flask import (
     render_template,
     Blueprint,
     redirect,
     request,
+    session,
     url_for,
     flash,
 )
@@ -20,31 +19,16 @@ from flask_login import (
 )
 
 # ============================================================
-# 資料庫連線設定：環境變數優先，沒有就用老師給的那組
+# 資料庫連線：共用 api/sql.py 的連線池，不再每次重新 psycopg2.connect
+# （user_loader 每個請求都會跑，省掉 TCP + 認證的握手時間）
 # ============================================================
 
-load_dotenv()
+from api.sql import DB, RefCache
+from api.cache import USER_CACHE, PAGE_CACHE, invalidate_user
 
-DB_USER = os.getenv("DB_USER", "project_7")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "i68g8q")
-DB_NAME = os.getenv("DB_NAME", "project_7")
-DB_HOST = os.getenv("DB_HOST", "140.117.68.66")
-DB_PORT = os.getenv("DB_PORT", "5432")
-
-
-def get_connection():
-    """
-    每次需要時建立一個新的連線（避免長時間連線被 Render 砍掉）。
-    """
-    conn = psycopg2.connect(
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-    )
-    conn.autocommit = True
-    return conn
+# 設為 1 時，登入後把 role / name 放進 Flask 的簽章 session cookie，
+# user_loader 直接從 session 還原，完全不查 DB（名字改了要重新登入才會更新）
+USER_SESSION_MODE = os.getenv("USER_SESSION_MODE", "0") == "1"
 
 
 # ============================================================
@@ -89,15 +73,9 @@ def get_member_by_account(account_id):
         FROM member
         WHERE "account" = %s
     """
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, (account_id,))
-            row = cur.fetchone()
-            if row:
-                return row[0], row[1]  # name, password
-    finally:
-        conn.close()
+    row = DB.fetchone(sql, (account_id,))
+    if row:
+        return row[0], row[1]  # name, password
     return None
 
 
@@ -115,15 +93,9 @@ def get_coach_by_id(coach_id):
         FROM coach
         WHERE "coachid" = %s
     """
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, (coach_id,))
-            row = cur.fetchone()
-            if row:
-                return row[0], row[1]  # name, password
-    finally:
-        conn.close()
+    row = DB.fetchone(sql, (coach_id,))
+    if row:
+        return row[0], row[1]  # name, password
     return None
 
 
@@ -132,25 +104,55 @@ def get_coach_by_id(coach_id):
 # user.id 會長這樣：'member_<帳號>' 或 'coach_<教練代碼>'
 # ------------------------------------------------------------
 
+def _load_role_and_name(userid: str):
+    """
+    查 DB 取得 (role, name)，找不到時回傳 (None, None)。
+    """
+    role, real_id = userid.split("_", 1)
+
+    if role == "member":
+        data = get_member_by_account(real_id)
+        if data:
+            return "member", data[0]
+
+    elif role == "coach":
+        data = get_coach_by_id(real_id)
+        if data:
+            return "coach", data[0]
+
+    return None, None
+
+
+def _remember_in_session(user):
+    if USER_SESSION_MODE:
+        session["user_role"] = user.role
+        session["user_name"] = user.name
+
+
 @login_manager.user_loader
 def user_loader(userid: str):
+    """
+    每個請求都會呼叫。依序嘗試：
+      1. 簽章 session（USER_SESSION_MODE=1 時）
+      2. USER_CACHE（LRU + TTL）
+      3. 查 DB，並放回快取
+    """
     user = User()
     user.id = userid
 
-    try:
-        role, real_id = userid.split("_", 1)
+    if USER_SESSION_MODE and session.get("_user_id") == userid and session.get("user_role"):
+        user.role = session["user_role"]
+        user.name = session.get("user_name")
+        return user
 
-        if role == "member":
-            data = get_member_by_account(real_id)
-            if data:
-                user.role = "member"
-                user.name = data[0]
+    cached = USER_CACHE.get(userid)
+    if cached is not None:
+        user.role, user.name = cached
+        return user
 
-        elif role == "coach":
-            data = get_coach_by_id(real_id)
-            if data:
-                user.role = "coach"
-                user.name = data[0]
+    try:
+        user.role, user.name = _load_role_and_name(userid)
+        USER_CACHE.set(userid, (user.role, user.name))
 
     except Exception as e:
         print(f"user_loader 錯誤: {e}")
@@ -178,6 +180,7 @@ def login():
                 user.role = "member"
                 user.name = name
                 login_user(user)
+                _remember_in_session(user)
                 # 登入成功，導向會員前台
                 return redirect(url_for("frontdesk.member_home"))
             else:
@@ -194,6 +197,7 @@ def login():
                 user.role = "coach"
                 user.name = name
                 login_user(user)
+                _remember_in_session(user)
                 # 登入成功，導向教練後台
                 return redirect(url_for("manager.courseManager"))
             else:
@@ -233,26 +237,25 @@ def register():
                 fname = request.form.get("fname", "")
                 lname = request.form.get("lname", "")
 
-                # 檢查是否已存在
-                conn = get_connection()
-                with conn.cursor() as cur:
+                # 檢查是否已存在，並在同一個交易中新增
+                with DB.transaction() as cur:
                     cur.execute(
                         'SELECT 1 FROM member WHERE "account" = %s',
                         (account,),
                     )
-                    if cur.fetchone():
-                        flash("此會員帳號已被註冊")
-                        conn.close()
-                        return redirect(url_for("api.register"))
-
-                    cur.execute(
-                        """
-                        INSERT INTO member("fname", "lname", "account", "password", "identity")
-                        VALUES (%s, %s, %s, %s, %s)
-                        """,
-                        (fname, lname, account, password, "member"),
-                    )
-                conn.close()
+                    exists = cur.fetchone()
+                    if not exists:
+                        cur.execute(
+                            """
+                            INSERT INTO member("fname", "lname", "account", "password", "identity")
+                            VALUES (%s, %s, %s, %s, %s)
+                            """,
+                            (fname, lname, account, password, "member"),
+                        )
+                if exists:
+                    flash("此會員帳號已被註冊")
+                    return redirect(url_for("api.register"))
+                invalidate_user(f"member_{account}")
                 flash("會員註冊成功！請登入")
 
             elif identity == "coach":
@@ -264,25 +267,29 @@ def register():
                 c_name = request.form["cName"]
                 coaching_type = request.form["coachingType"]
 
-                conn = get_connection()
-                with conn.cursor() as cur:
+                with DB.transaction() as cur:
                     cur.execute(
                         'SELECT 1 FROM coach WHERE "coachid" = %s',
                         (coach_id,),
                     )
-                    if cur.fetchone():
-                        flash("此教練代碼已被註冊")
-                        conn.close()
-                        return redirect(url_for("api.register"))
-
-                    cur.execute(
-                        """
-                        INSERT INTO coach("coachid", "cname", "coachingtype", "password")
-                        VALUES (%s, %s, %s, %s)
-                        """,
-                        (coach_id, c_name, coaching_type, password),
-                    )
-                conn.close()
+                    exists = cur.fetchone()
+                    if not exists:
+                        cur.execute(
+                            """
+                            INSERT INTO coach("coachid", "cname", "coachingtype", "password")
+                            VALUES (%s, %s, %s, %s)
+                            """,
+                            (coach_id, c_name, coaching_type, password),
+                        )
+                        # 教練名單在 RefCache 裡 (排程的下拉選單)，同一個交易中更新版本號
+                        RefCache.bump(cur, "coach")
+                if exists:
+                    flash("此教練代碼已被註冊")
+                    return redirect(url_for("api.register"))
+                RefCache.invalidate("coach")
+                # 排程頁的教練下拉選單
+                PAGE_CACHE.invalidate("manager.courseSchedule")
+                invalidate_user(f"coach_{coach_id}")
                 flash("教練註冊成功！請登入")
 
             else:
@@ -308,4 +315,6 @@ def register():
 @login_required
 def logout():
     logout_user()
+    session.pop("user_role", None)
+    session.pop("user_name", None)
     return redirect(url_for("index"))
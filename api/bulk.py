@@ -0,0 +1,245 @@
+import csv
+import io
+from datetime import date, datetime
+
+import psycopg2.extras
+
+from api.cache import PAGE_CACHE
+from api.sql import DB, RefCache, CourseSchedule
+from api.timeslot import TimeSlot
+
+# ------------------------------------------------------------
+# 大量匯入 / 匯出 (CSV + PostgreSQL COPY)
+#
+# 匯入：CSV 逐批讀入並在 Python 端驗證，合格的列以 COPY FROM STDIN
+#       寫進暫存表，最後一次 INSERT ... SELECT ... ON CONFLICT DO NOTHING 進正式表。
+#       整個檔案是一個交易，不合格的列不寫入，回報行號與原因。
+#       排程另外檢查同教練 / 同教室的時段重疊 (排序後掃描，不做兩兩比對)。
+# 匯出：COPY (SELECT ...) TO STDOUT，邊查邊寫，不會把整張表讀進記憶體。
+# ------------------------------------------------------------
+
+BATCH_SIZE = 5000
+
+
+def _required(value):
+    if value is None or value.strip() == "":
+        raise ValueError("不可為空")
+    return value.strip()
+
+
+def _optional(value):
+    return value.strip() if value and value.strip() else None
+
+
+def _max_len(n, required=True):
+    def check(value):
+        value = _required(value) if required else _optional(value)
+        if value is not None and len(value) > n:
+            raise ValueError(f"長度超過 {n}")
+        return value
+    return check
+
+
+def _date(value):
+    return datetime.strptime(_required(value), "%Y-%m-%d").date()
+
+
+def _optional_date(value):
+    return _date(value) if _optional(value) else None
+
+
+def _int(value):
+    return int(value) if _optional(value) else None
+
+
+def _gender(value):
+    value = _optional(value)
+    if value is not None and value not in ("M", "F"):
+        raise ValueError("gender 必須是 M 或 F")
+    return value
+
+
+def _course_exists(value):
+    value = _required(value)
+    if RefCache.by_id("course", value) is None:
+        raise ValueError(f"找不到課程 {value}")
+    return value
+
+
+def _coach_exists(value):
+    value = _required(value)
+    if RefCache.by_id("coach", value) is None:
+        raise ValueError(f"找不到教練 {value}")
+    return value
+
+
+def _member_row(row):
+    return (
+        _max_len(8)(row.get("memberid")),
+        _max_len(100)(row.get("mname")),
+        _date(row.get("birthdate")),
+        _gender(row.get("gender")),
+        _max_len(15)(row.get("phonenumber")),
+        _max_len(255)(row.get("password")),
+        _optional_date(row.get("registerdate")) or date.today(),
+        _optional(row.get("status")) or "無合約",
+    )
+
+
+def _course_row(row):
+    return (
+        _max_len(6)(row.get("courseid")),
+        _max_len(100)(row.get("coursename")),
+        _max_len(10, required=False)(row.get("classroom")),
+        _int(row.get("studentlimit")),
+    )
+
+
+def _schedule_row(row):
+    schedule_date = _date(row.get("scheduledate"))
+    return (
+        _course_exists(row.get("courseid")),
+        _coach_exists(row.get("coachid")),
+        schedule_date,
+        TimeSlot.parse(_max_len(20)(row.get("timeslot"))).text,
+        schedule_date.month,
+        schedule_date.isoweekday(),
+    )
+
+
+# 匯出時不輸出的欄位 (匯入時仍需要，所以匯出的會員檔不能直接再匯入)
+EXPORT_EXCLUDED = {"password"}
+
+# 匯入後要失效的後台頁面 (PAGE_CACHE 的 endpoint)
+PAGES = {
+    "members": (),
+    "courses": ("manager.courseManager", "manager.courseSchedule"),
+    "schedules": ("manager.courseSchedule",),
+}
+
+# 名稱 -> (資料表, 寫入欄位, 主鍵, 驗證函式, RefCache 名稱)
+TABLES = {
+    "members": (
+        "sportmember",
+        ("memberid", "mname", "birthdate", "gender", "phonenumber", "password", "registerdate", "status"),
+        ("memberid",),
+        _member_row,
+        None,
+    ),
+    "courses": (
+        "course",
+        ("courseid", "coursename", "classroom", "studentlimit"),
+        ("courseid",),
+        _course_row,
+        "course",
+    ),
+    "schedules": (
+        "courseschedule",
+        ("courseid", "coachid", "scheduledate", "timeslot", "month", "dayofweek"),
+        ("courseid", "scheduledate", "timeslot"),
+        _schedule_row,
+        None,
+    ),
+}
+
+
+def import_csv(name, stream, batch_size=BATCH_SIZE):
+    """
+    從 CSV (需有標題列，欄位名稱小寫) 匯入 TABLES[name]。
+    回傳 (新增筆數, 主鍵重複略過筆數, [(行號, 原因), ...])
+    """
+    table, columns, key, validate, ref_name = TABLES[name]
+    column_list = ", ".join(columns)
+    rejects = []
+    staged = 0
+    # 排程要在全部讀完後檢查時段重疊，先留一份驗證過的列 (行號, 值)
+    schedules = [] if name == "schedules" else None
+
+    with DB.transaction() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE import_stage (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+
+        reader = csv.DictReader(stream)
+        reader.fieldnames = [f.strip().lower() for f in reader.fieldnames or []]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        in_batch = 0
+
+        def flush():
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY import_stage ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+            buffer.seek(0)
+            buffer.truncate()
+
+        for row in reader:
+            try:
+                values = validate(row)
+            except (ValueError, TypeError) as e:
+                rejects.append((reader.line_num, str(e)))
+                continue
+            writer.writerow(values)
+            if schedules is not None:
+                schedules.append((reader.line_num, values))
+            staged += 1
+            in_batch += 1
+            if in_batch >= batch_size:
+                flush()
+                in_batch = 0
+        if in_batch:
+            flush()
+
+        if schedules:
+            # 同教練 / 同教室時段重疊的列 (與檔案內其他列或資料庫既有排程) 從暫存表移除
+            conflicts = CourseSchedule.find_conflicts(cursor, [v[:4] for _, v in schedules])
+            if conflicts:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    "DELETE FROM import_stage s USING (VALUES %s) AS v(courseid, scheduledate, timeslot) "
+                    "WHERE s.courseid = v.courseid AND s.scheduledate = v.scheduledate "
+                    "AND s.timeslot = v.timeslot",
+                    [(schedules[i][1][0], schedules[i][1][2], schedules[i][1][3]) for i in conflicts],
+                    template="(%s, %s::date, %s)",
+                    page_size=len(conflicts),
+                )
+                staged -= cursor.rowcount
+                rejects.extend((schedules[i][0], reason) for i, reason in conflicts.items())
+                rejects.sort()
+
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) "
+            f"SELECT DISTINCT ON ({', '.join(key)}) {column_list} FROM import_stage "
+            f"ON CONFLICT ({', '.join(key)}) DO NOTHING"
+        )
+        inserted = cursor.rowcount
+        if ref_name and inserted:
+            RefCache.bump(cursor, ref_name)
+
+    # 匯入在 CLI 行程執行，清不到網站 worker 的快取：plan / course / coach 與後台頁面 (PAGE_CACHE)
+    # 靠版本號通知，會員 (USER_CACHE) 與週課表 (WEEK_GRID_CACHE) 則在 TTL 內反映
+    if ref_name:
+        RefCache.invalidate(ref_name)
+    if inserted:
+        PAGE_CACHE.invalidate(*PAGES[name])
+    return inserted, staged - inserted, rejects
+
+
+def export_csv(name, stream):
+    """
+    以 COPY TO STDOUT 把 TABLES[name] 串流寫到 stream (含標題列)，不含 EXPORT_EXCLUDED 的欄位
+    """
+    table, columns, key, _, _ = TABLES[name]
+    columns = [c for c in columns if c not in EXPORT_EXCLUDED]
+    sql = (
+        f"COPY (SELECT {', '.join(columns)} FROM {table} ORDER BY {', '.join(key)}) "
+        "TO STDOUT WITH (FORMAT csv, HEADER)"
+    )
+    connection = DB.connect()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, stream)
+    finally:
+        connection.rollback()
+        DB.release(connection)
@@ -0,0 +1,362 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Hashable, Optional, Sequence
+
+from flask import request, session
+from flask_login import current_user
+
+# ------------------------------------------------------------
+# 行程內 (in-process) 快取：LRU + TTL，執行緒安全
+# ------------------------------------------------------------
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    容量有限的 LRU 快取，每筆資料超過 ttl 秒就失效。
+
+    - get / set / invalidate / clear 都有加鎖，可給多執行緒共用
+    - 超過 maxsize 時淘汰最久沒用到的那筆
+    - stats() 回傳 hits / misses / hit_ratio，方便確認快取有沒有發揮作用
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def peek(self, key: Hashable) -> Any:
+        """
+        取值但不計入 hits / misses，也不更新 LRU 順序（給失效通知使用）
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= time.monotonic():
+                return None
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
+
+
+# ------------------------------------------------------------
+# user_loader 用的快取：key 是 user.id（'member_<id>' / 'coach_<id>'），
+# value 是 (role, name)
+# ------------------------------------------------------------
+
+USER_CACHE = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
+
+
+def invalidate_user(userid: str) -> None:
+    """
+    會員 / 教練資料被修改（狀態、註冊、密碼…）時呼叫，讓下一次 user_loader 重新查 DB。
+    """
+    USER_CACHE.invalidate(userid)
+
+
+# ------------------------------------------------------------
+# 後台頁面快取 (server-side response cache)
+#
+# key = endpoint + 版本號 + 角色 + 使用者名稱 + query string
+# 寫入路徑呼叫 PAGE_CACHE.invalidate(endpoint) 把該頁面的版本號 +1，
+# 舊的 key 自然不會再被讀到，等 TTL / LRU 淘汰即可。
+# 版本號必須是所有 worker 共用的：Redis backend 存在 Redis 裡；
+# 行程內 backend 則由 api/sql.py 換成存在資料庫 ref_version 的 PageVersions，
+# 其他 worker (以及 flask import-csv 等 CLI) 的寫入最多 REF_CACHE_CHECK_INTERVAL 秒後生效。
+# ------------------------------------------------------------
+
+class LocalVersions:
+    """
+    只在這個行程內有效的版本號（單一行程 / 測試用）。
+    """
+
+    def __init__(self):
+        self._versions: dict = {}
+        self._lock = threading.Lock()
+
+    def version(self, name: str) -> int:
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def bump(self, name: str) -> None:
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class LocalBackend:
+    """
+    行程內 backend（預設；也是測試時的替身）。頁面存在行程內，版本號由 versions 提供。
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, versions=None):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.versions = versions if versions is not None else LocalVersions()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._cache.set(key, value, ttl)
+
+    def version(self, name: str) -> int:
+        return self.versions.version(name)
+
+    def bump(self, name: str) -> None:
+        self.versions.bump(name)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class RedisBackend:
+    """
+    多個 gunicorn worker 共用的 backend，需要另外安裝 redis 套件。
+    """
+
+    def __init__(self, url: str, prefix: str = "gym:page:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self._prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._client.set(self._prefix + key, value.encode("utf-8"), ex=max(1, int(ttl)))
+
+    def version(self, name: str) -> int:
+        value = self._client.get(self._prefix + "ver:" + name)
+        return int(value) if value is not None else 0
+
+    def bump(self, name: str) -> None:
+        self._client.incr(self._prefix + "ver:" + name)
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(self._prefix + "*"):
+            self._client.delete(key)
+
+
+class ResponseCache:
+    """
+    快取整頁 HTML。只快取 GET、只快取 view 回傳的字串（render_template 的結果），
+    redirect 之類的 Response 不會被存；有待顯示的 flash 訊息時直接略過快取。
+    """
+
+    def __init__(self, backend, ttl: float = 60.0, max_entry_bytes: int = 512 * 1024):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _key(self, endpoint: str) -> str:
+        args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        role = getattr(current_user, "role", None)
+        name = getattr(current_user, "name", None)
+        return f"{endpoint}:v{self.backend.version(endpoint)}:{role}:{name}:{args}"
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def cached(self, ttl: Optional[float] = None, bypass_args: Sequence[str] = ()):
+        """
+        view decorator。bypass_args 內的參數出現時（例如 ?delete=...）不使用快取。
+        """
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if (
+                    request.method != "GET"
+                    or session.get("_flashes")
+                    or any(a in request.args for a in bypass_args)
+                ):
+                    return view(*args, **kwargs)
+
+                key = self._key(request.endpoint)
+                body = self.backend.get(key)
+                if body is not None:
+                    self._count(True)
+                    return body
+
+                self._count(False)
+                result = view(*args, **kwargs)
+                if isinstance(result, str) and len(result) <= self.max_entry_bytes:
+                    self.backend.set(key, result, self.ttl if ttl is None else ttl)
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, *endpoints: str) -> None:
+        for endpoint in endpoints:
+            self.backend.bump(endpoint)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+            }
+
+
+def _page_backend():
+    url = os.getenv("PAGE_CACHE_URL")
+    if url:
+        return RedisBackend(url)
+    return LocalBackend(maxsize=int(os.getenv("PAGE_CACHE_SIZE", "256")))
+
+
+PAGE_CACHE = ResponseCache(
+    _page_backend(),
+    ttl=float(os.getenv("PAGE_CACHE_TTL", "60")),
+)
+
+
+# ------------------------------------------------------------
+# 會員課表的每週 grid 快取
+#
+# 同一週的課表對所有會員都一樣（時段、課程、教練、人數上限、已預約人數），
+# 只有「我是否已預約」因人而異，所以整週共用一份，會員自己的預約在 view 裡再疊上去。
+# 預約 / 取消直接把最新人數寫進那一格 (set_count)；
+# 排程新增 / 刪除會改變格子本身，讓整週失效。
+# 快取在各 worker 的記憶體中，其他 worker 的預約最多 WEEK_GRID_TTL 秒後才反映在人數上
+# （是否額滿仍由 Booking.book 在資料庫中判斷，不受影響）；
+# 有會員開著即時人數推播 (api/seats.py) 時，LISTEN 收到的變動會立即更新快取。
+# ------------------------------------------------------------
+
+class WeekGrid:
+    __slots__ = ("week_start", "time_slots", "cells")
+
+    def __init__(self, week_start, time_slots, cells):
+        self.week_start = week_start
+        self.time_slots = time_slots  # 排序好的時段
+        self.cells = cells            # (courseid, date, timeslot) -> cell dict
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+class WeekGridCache:
+    def __init__(self, maxsize: int = 16, ttl: float = 30.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def week_of(value) -> date:
+        d = _as_date(value)
+        return d - timedelta(days=d.weekday())
+
+    @staticmethod
+    def cell_key(course_id, schedule_date, time_slot):
+        return (str(course_id).rstrip(), _as_date(schedule_date), time_slot)
+
+    def get(self, week_start) -> Optional[WeekGrid]:
+        return self._cache.get(week_start)
+
+    def put(self, grid: WeekGrid) -> None:
+        self._cache.set(grid.week_start, grid)
+
+    def set_count(self, course_id, schedule_date, time_slot, count: int) -> None:
+        """
+        已經知道最新人數時（例如 Booking.book 的結果）直接更新該格，不用再查
+        """
+        key = self.cell_key(course_id, schedule_date, time_slot)
+        grid = self._cache.peek(self.week_of(key[1]))
+        if grid is None:
+            return
+        with self._lock:
+            cell = grid.cells.get(key)
+            if cell is not None:
+                grid.cells[key] = dict(cell, current_count=count, is_full=_is_full(count, cell["limit"]))
+
+    def invalidate_week(self, schedule_date) -> None:
+        self._cache.invalidate(self.week_of(schedule_date))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+def _is_full(count, limit) -> bool:
+    return limit is not None and count >= limit
+
+
+WEEK_GRID_CACHE = WeekGridCache(
+    ttl=float(os.getenv("WEEK_GRID_TTL", "30")),
+)
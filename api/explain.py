@@ -0,0 +1,299 @@
+import json
+import re
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from api.sql import (
+    DB, RefCache, Member, Coach, Plan, Course, CourseSchedule, Booking, Waitlist, ConfirmSQL, Analysis,
+)
+
+# ------------------------------------------------------------
+# 以 EXPLAIN ANALYZE 檢查 api/sql.py 的每一個查詢有沒有對大表做全表掃描。
+#
+# 做法：在一條連線、一個交易中依序呼叫 QUERIES 裡的 model 方法，
+# 期間把 DB.fetchall / fetchone / execute / execute_input / stream / transaction
+# 都換成走這條連線的版本，cursor 也包一層：每個指令先在 savepoint 裡
+# EXPLAIN (ANALYZE, FORMAT JSON) 一次再 rollback 回 savepoint，然後才真正執行，
+# 所以多指令的交易 (Booking.book / cancel、Waitlist.join ...) 每一步都有計畫，
+# 後面的方法也看得到前面寫入的資料。最後整個交易 rollback，不會留下任何資料。
+#
+# 請在已匯入測試資料的本機資料庫上執行：
+#   flask migrate && flask seed-data && flask explain-queries
+# 商城的表 (order_list / member ...) 不存在時，Analysis 的查詢列為略過。
+# Rollup.rebuild 本來就是整張表重算，不列入。
+# ------------------------------------------------------------
+
+# 寫入用的代號以 zz 開頭，與 tests/conftest.py 錯開
+NEW_MEMBER = "zz000998"
+NEW_COACH = "zz998"
+NEW_COURSE = "zz9998"
+NEW_SLOT = "05:00-05:30"
+
+
+def _new_schedule(s):
+    return (NEW_COURSE, s["far_date"], NEW_SLOT)
+
+
+def _add_then_delete_plan(s):
+    planid = Plan.get_next_planid()
+    Plan.add_plan({"planname": "explain", "period": 1, "monthlycharge": 1})
+    Plan.delete_plan(planid)
+
+
+# (名稱, 以樣本資料呼叫 model 方法的函式)；依序執行，寫入的會在後面被讀到或刪除
+QUERIES = [
+    # 讀取
+    ("Member.get_by_id", lambda s: Member.get_by_id(s["member"])),
+    ("Coach.get_by_id", lambda s: Coach.get_by_id(s["coach"])),
+    ("Coach.get_all_coach", lambda s: Coach.get_all_coach()),
+    ("Plan.get_next_planid", lambda s: Plan.get_next_planid()),
+    ("Plan.get_all_plan", lambda s: Plan.get_all_plan()),
+    ("Course.count", lambda s: Course.count()),
+    ("Course.get_all_course", lambda s: Course.get_all_course()),
+    ("Course.get_courseid", lambda s: Course.get_courseid()),
+    ("CourseSchedule.get_all_joined", lambda s: CourseSchedule.get_all_joined()),
+    ("CourseSchedule.get_schedules_by_week",
+     lambda s: CourseSchedule.get_schedules_by_week(s["week_start"], s["week_end"])),
+    ("CourseSchedule.list_window",
+     lambda s: CourseSchedule.list_window(s["week_start"], s["week_end"] + timedelta(days=21),
+                                          after=(s["slot"][1], s["slot"][2], s["slot"][0]))),
+    ("CourseSchedule.list_window(coach)",
+     lambda s: CourseSchedule.list_window(s["week_start"], s["week_end"] + timedelta(days=21),
+                                          coachid=s["coach"])),
+    ("CourseSchedule.check_course_in_use", lambda s: CourseSchedule.check_course_in_use(s["slot"][0])),
+    ("Booking.get_bookings_by_member", lambda s: Booking.get_bookings_by_member(s["member"])),
+    ("Booking.check_booking_exists", lambda s: Booking.check_booking_exists(*s["slot"], s["member"])),
+    ("Booking.count_bookings_for_schedule", lambda s: Booking.count_bookings_for_schedule(*s["slot"])),
+    ("Booking.counts_for_range", lambda s: Booking.counts_for_range(s["week_start"], s["week_end"])),
+    ("Booking.check_schedule_in_use", lambda s: Booking.check_schedule_in_use(*s["slot"])),
+    ("Booking.stream_history", lambda s: list(Booking.stream_history(s["week_start"], s["week_end"]))),
+    ("Waitlist.position", lambda s: Waitlist.position(*s["slot"], s["member"])),
+    ("Waitlist.get_by_member", lambda s: Waitlist.get_by_member(s["member"])),
+    ("ConfirmSQL.check_plan_in_use", lambda s: ConfirmSQL.check_plan_in_use(s["plan"])),
+    ("Analysis.monthly_summary", lambda s: Analysis.monthly_summary()),
+    ("Analysis.monthly_summary(year)", lambda s: Analysis.monthly_summary(year=s["week_start"].year)),
+    ("Analysis.month_price", lambda s: Analysis.month_price(s["week_start"].month)),
+    ("Analysis.month_count", lambda s: Analysis.month_count(s["week_start"].month)),
+    ("Analysis.category_sale", lambda s: Analysis.category_sale()),
+    ("Analysis.member_sale", lambda s: Analysis.member_sale()),
+    ("Analysis.member_sale_count", lambda s: Analysis.member_sale_count()),
+    ("Analysis.stream_orders", lambda s: list(Analysis.stream_orders(s["week_start"], s["week_end"]))),
+    # 寫入 (最後整個交易 rollback)
+    ("Member.create_member", lambda s: Member.create_member({
+        "memberId": NEW_MEMBER, "mName": "explain", "birthDate": "1990-01-01",
+        "gender": "M", "phoneNumber": "0900000000", "password": "x",
+    })),
+    ("Member.update_status_by_id", lambda s: Member.update_status_by_id(NEW_MEMBER, "有合約")),
+    ("Coach.create_coach", lambda s: Coach.create_coach({
+        "coachId": NEW_COACH, "cName": "explain", "coachingType": "explain", "password": "x",
+    })),
+    ("Plan.add_plan / delete_plan", _add_then_delete_plan),
+    ("Course.add_course", lambda s: Course.add_course({
+        "courseid": NEW_COURSE, "coursename": "explain", "classroom": "ZZ", "studentlimit": 1,
+    })),
+    ("Course.update_course", lambda s: Course.update_course({
+        "courseid": NEW_COURSE, "coursename": "explain", "classroom": "ZZ", "studentlimit": 1,
+    })),
+    ("Course.get_course", lambda s: Course.get_course(NEW_COURSE)),
+    ("CourseSchedule.create", lambda s: CourseSchedule.create({
+        "courseid": NEW_COURSE, "coachid": NEW_COACH, "scheduledate": s["far_date"],
+        "timeslot": NEW_SLOT, "month": s["far_date"].month, "dayofweek": s["far_date"].isoweekday(),
+    })),
+    ("CourseSchedule.create_recurring",
+     lambda s: CourseSchedule.create_recurring(NEW_COURSE, NEW_COACH, NEW_SLOT,
+                                               [s["far_date"] + timedelta(days=7 * i) for i in range(1, 5)])),
+    ("Booking.book", lambda s: Booking.book(*_new_schedule(s), NEW_MEMBER)),
+    ("Waitlist.join", lambda s: Waitlist.join(*_new_schedule(s), s["member"])),
+    ("Booking.cancel", lambda s: Booking.cancel(*_new_schedule(s), NEW_MEMBER)),
+    ("Waitlist.leave", lambda s: Waitlist.leave(*_new_schedule(s), NEW_MEMBER)),
+    ("Booking.delete_booking", lambda s: Booking.delete_booking(*_new_schedule(s), s["member"])),
+    ("ConfirmSQL.create_confirmation",
+     lambda s: ConfirmSQL.create_confirmation(NEW_MEMBER, s["plan"], "現金", 1)),
+    ("CourseSchedule.delete", lambda s: CourseSchedule.delete(*_new_schedule(s))),
+]
+
+# 本來就要讀整張表的查詢：{名稱: 允許 Seq Scan 的表}
+FULL_SCANS = {
+    # 列出全部排程 (後台已改用 list_window 分頁)
+    "CourseSchedule.get_all_joined": {"courseschedule", "course", "coach"},
+    # 彙總表一天一列，不分年份時每一天都要算進去
+    "Analysis.monthly_summary": {"rollup_daily_revenue"},
+    "Analysis.month_price": {"rollup_daily_revenue"},
+    "Analysis.month_count": {"rollup_daily_revenue"},
+    # 排行榜列出所有會員
+    "Analysis.member_sale": {"rollup_member_sales", "member"},
+    "Analysis.member_sale_count": {"rollup_member_sales", "member"},
+}
+
+# 只有這些指令能 EXPLAIN，其他 (DDL、LOCK ...) 直接執行
+_EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES"}
+
+
+class CheckResult(NamedTuple):
+    """
+    failures: [(查詢名稱, 資料表, 估計列數)]，對超過 min_rows 列的表做 Seq Scan
+    skipped:  [(查詢名稱, 原因)]，資料表不存在 (例如沒有商城的表)
+    errors:   [(查詢名稱, 錯誤訊息)]，呼叫失敗 (多半是沒有先 flask seed-data)
+    """
+    failures: list
+    skipped: list
+    errors: list
+
+
+class _ExplainingCursor:
+    """
+    包住真正的 cursor：每個指令先在 savepoint 裡 EXPLAIN ANALYZE (計畫存進 plans)，
+    rollback 回 savepoint 後再真正執行，所以 fetchone / rowcount 等結果與原本相同。
+    一次送出多個指令時以行尾的 ; 切開逐一處理 (此時參數需為 dict)。
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.plans = []
+
+    def execute(self, sql, params=None):
+        if isinstance(sql, bytes):
+            sql = sql.decode(psycopg2.extensions.encodings[self._cursor.connection.encoding])
+        for statement in _statements(sql):
+            if statement.split(None, 1)[0].upper() in _EXPLAINABLE:
+                self._cursor.execute("SAVEPOINT explain_statement")
+                try:
+                    self._cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + statement, params)
+                    result = self._cursor.fetchone()[0]
+                finally:
+                    self._cursor.execute("ROLLBACK TO SAVEPOINT explain_statement")
+                    self._cursor.execute("RELEASE SAVEPOINT explain_statement")
+                self.plans.append((json.loads(result) if isinstance(result, str) else result)[0]["Plan"])
+            self._cursor.execute(statement, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _statements(sql):
+    return [s.strip() for s in re.split(r";\s*(?:\n|$)", sql) if s.strip()]
+
+
+@contextmanager
+def _explaining(cursor):
+    """
+    期間 DB 的所有方法都走 cursor 所在的連線，並經過 _ExplainingCursor
+    """
+    wrapped = _ExplainingCursor(cursor)
+
+    def execute(sql, input_params=None):
+        wrapped.execute(sql, input_params)
+
+    def fetchall(sql, input_params=None):
+        wrapped.execute(sql, input_params)
+        return wrapped.fetchall()
+
+    def fetchone(sql, input_params=None):
+        wrapped.execute(sql, input_params)
+        return wrapped.fetchone()
+
+    def stream(sql, input_params=None, batch_size=2000):
+        wrapped.execute(sql, input_params)
+        yield from wrapped.fetchall()
+
+    @contextmanager
+    def transaction():
+        yield wrapped
+
+    replaced = {
+        "execute": execute,
+        "execute_input": execute,
+        "fetchall": fetchall,
+        "fetchone": fetchone,
+        "stream": stream,
+        "transaction": transaction,
+    }
+    originals = {name: DB.__dict__[name] for name in replaced}
+    for name, fn in replaced.items():
+        setattr(DB, name, staticmethod(fn))
+    # 快取清空，讓 plan / course / coach 的讀取也真的送出查詢
+    RefCache.invalidate(*RefCache.TABLES)
+    try:
+        yield wrapped
+    finally:
+        for name, original in originals.items():
+            setattr(DB, name, original)
+        # 快取可能讀到這個 (會被 rollback 的) 交易寫入的資料
+        RefCache.invalidate(*RefCache.TABLES)
+
+
+def _samples():
+    """
+    從資料庫挑一筆實際存在的資料當參數，讓計畫接近真實情況
+    """
+    slot = DB.fetchone(
+        "SELECT courseid, scheduledate, timeslot, coachid FROM courseschedule "
+        "ORDER BY scheduledate DESC LIMIT 1"
+    ) or ("co0001", date.today(), "07:15-08:15", "c0001")
+    member = DB.fetchone("SELECT memberid FROM sportmember LIMIT 1")
+    plan = DB.fetchone("SELECT planid FROM plan LIMIT 1")
+    week_start = slot[1] - timedelta(days=slot[1].weekday())
+    return {
+        "slot": tuple(slot[:3]),
+        "coach": slot[3],
+        "member": member[0] if member else "m0000001",
+        "plan": plan[0] if plan else "p0001",
+        "week_start": week_start,
+        "week_end": week_start + timedelta(days=6),
+        # 新增排程用：比所有既有排程都晚，不會撞堂
+        "far_date": max(slot[1], date.today()) + timedelta(days=400),
+    }
+
+
+def _seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from _seq_scans(child)
+
+
+def _table_rows(cursor, table):
+    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def check(min_rows=1000):
+    """
+    依序執行 QUERIES，回傳 CheckResult。
+    failures 與 errors 都是空列表代表全部通過。
+    """
+    samples = _samples()
+    result = CheckResult([], [], [])
+    connection = DB.connect()
+    try:
+        with connection.cursor() as cursor, _explaining(cursor) as wrapped:
+            for name, call in QUERIES:
+                wrapped.plans.clear()
+                cursor.execute("SAVEPOINT explain_call")
+                try:
+                    call(samples)
+                except psycopg2.errors.UndefinedTable as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT explain_call")
+                    result.skipped.append((name, str(e).splitlines()[0]))
+                    continue
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT explain_call")
+                    result.errors.append((name, str(e).splitlines()[0] if str(e) else repr(e)))
+                    continue
+                allowed = FULL_SCANS.get(name, set())
+                tables = {t for plan in wrapped.plans for t in _seq_scans(plan)} - allowed
+                for table in sorted(tables):
+                    rows = _table_rows(cursor, table)
+                    if rows > min_rows:
+                        result.failures.append((name, table, rows))
+    finally:
+        # EXPLAIN ANALYZE 與寫入都真的執行過，一律 rollback
+        connection.rollback()
+        DB.release(connection)
+    return result
@@ -0,0 +1,62 @@
+import os
+import re
+
+from api.sql import DB
+
+# ------------------------------------------------------------
+# 資料庫 migration：依檔名順序執行 migrations/NNN_*.sql，
+# 執行過的版本記錄在 schema_migrations，不會重複執行
+# ------------------------------------------------------------
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+_FILENAME = re.compile(r"^(\d+)_.+\.sql$")
+
+
+def available():
+    """
+    回傳 [(version, filename), ...]，依版本排序
+    """
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME.match(filename)
+        if match:
+            found.append((match.group(1), filename))
+    return sorted(found, key=lambda item: int(item[0]))
+
+
+def applied():
+    DB.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            filename VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+    return {row[0] for row in DB.fetchall("SELECT version FROM schema_migrations")}
+
+
+def pending():
+    done = applied()
+    return [(version, filename) for version, filename in available() if version not in done]
+
+
+def migrate():
+    """
+    執行所有尚未執行的 migration，每個檔案一個交易。
+    回傳這次執行的檔名列表。
+    """
+    ran = []
+    for version, filename in pending():
+        with open(os.path.join(MIGRATIONS_DIR, filename), encoding="utf-8") as f:
+            script = f.read()
+        with DB.transaction() as cursor:
+            cursor.execute(script)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, filename) VALUES (%s, %s)",
+                (version, filename),
+            )
+        ran.append(filename)
+    return ran
@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from datetime import date
+from typing import Optional
+
+from api.sql import DB
+from api.cache import WEEK_GRID_CACHE
+
+# ------------------------------------------------------------
+# 預約人數即時推播 (Postgres LISTEN/NOTIFY -> Server-Sent Events)
+#
+# booking 表的 trigger (migrations/004) 在人數變動時 NOTIFY seat_changes。
+# 每個 worker 只開一條 LISTEN 連線 (背景執行緒)，收到通知後：
+#   1. 更新本 worker 的 WEEK_GRID_CACHE，其他 worker 的預約也會立即反映在人數上
+#   2. 分送給訂閱同一週的 SSE 連線 (每條連線一個 queue)
+# SSE 連線會長時間佔住一個執行緒，gunicorn 需使用 gthread / gevent worker
+# (見 gunicorn.conf.py)；只能用 sync worker 時設 SEAT_STREAM_ENABLED=0，
+# 頁面改為每 SEAT_POLL_SECONDS 秒向 /api/seats 重抓一次人數。
+# 每個 worker 最多 SEAT_STREAM_MAX_SUBSCRIBERS 條 SSE 連線，其餘執行緒留給一般請求
+# (預約、取消…)；超過時串流回傳 503，該頁面改為輪詢。
+# ------------------------------------------------------------
+
+CHANNEL = "seat_changes"
+
+STREAM_ENABLED = os.getenv("SEAT_STREAM_ENABLED", "1") == "1"
+POLL_SECONDS = float(os.getenv("SEAT_POLL_SECONDS", "30"))
+# 每個 worker 同時開著的 SSE 連線上限，必須小於 gunicorn 的 threads
+MAX_SUBSCRIBERS = int(os.getenv("SEAT_STREAM_MAX_SUBSCRIBERS", "32"))
+
+# 每條 SSE 連線最多累積幾筆未送出的變動；超過時改送 resync 讓瀏覽器重新抓整週人數
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SEAT_STREAM_QUEUE_SIZE", "256"))
+# 沒有變動時每隔幾秒送一次註解行，避免 proxy 把連線當成閒置切斷
+KEEPALIVE_SECONDS = float(os.getenv("SEAT_STREAM_KEEPALIVE", "15"))
+# LISTEN 連線中斷後等幾秒重連
+RECONNECT_SECONDS = 5.0
+
+RESYNC = object()
+
+
+class Subscription:
+    __slots__ = ("week_start", "queue")
+
+    def __init__(self, week_start: date):
+        self.week_start = week_start
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, item) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # 瀏覽器跟不上：丟掉累積的變動，改成要求整週重抓
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(RESYNC)
+
+    def drain(self, timeout: float):
+        """
+        等待第一筆變動 (最多 timeout 秒)，再把已排隊的一次取完；
+        回傳 (變動列表, 是否需要 resync)。
+        """
+        try:
+            items = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return [], False
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if any(item is RESYNC for item in items):
+            return [], True
+        return items, False
+
+
+class SeatFeed:
+    """
+    一個 worker 一個實例 (SEAT_FEED)。第一次有人訂閱時才啟動 LISTEN 執行緒。
+    """
+
+    def __init__(self, max_subscribers: int = MAX_SUBSCRIBERS):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self.max_subscribers = max_subscribers
+
+    def subscribe(self, week_start: date) -> Optional[Subscription]:
+        """
+        已達 max_subscribers 條連線時回傳 None (呼叫端回 503)
+        """
+        subscription = Subscription(week_start)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="seat-feed", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "listening": self._thread is not None and self._thread.is_alive(),
+            }
+
+    def publish(self, payload: str) -> None:
+        """
+        處理一則 NOTIFY：更新本 worker 的週課表快取，並分送給訂閱該週的連線
+        """
+        try:
+            data = json.loads(payload)
+            course_id, schedule_date, time_slot = data["k"].split("|", 2)
+            count, limit = data["n"], data.get("l")
+        except (ValueError, KeyError, TypeError):
+            logging.warning(f"無法解析 {CHANNEL} 通知: {payload!r}")
+            return
+
+        key = WEEK_GRID_CACHE.cell_key(course_id, schedule_date, time_slot)
+        WEEK_GRID_CACHE.set_count(course_id, key[1], time_slot, count)
+
+        week_start = WEEK_GRID_CACHE.week_of(key[1])
+        full = limit is not None and count >= limit
+        with self._lock:
+            targets = [s for s in self._subscribers if s.week_start == week_start]
+        for subscription in targets:
+            subscription.push([data["k"], count, full])
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # 沒有人在看了，結束執行緒並關掉 LISTEN 連線；下次訂閱再重開
+                    self._thread = None
+                    return
+            try:
+                self._listen()
+            except Exception as e:
+                logging.error(f"{CHANNEL} LISTEN 連線中斷，{RECONNECT_SECONDS} 秒後重連: {e}")
+                # 重連期間可能漏掉通知，請所有訂閱者重抓整週人數
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for subscription in subscribers:
+                    subscription.push(RESYNC)
+                time.sleep(RECONNECT_SECONDS)
+
+    def _listen(self) -> None:
+        connection = DB.listen_connection(CHANNEL)
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        return
+                if select.select([connection], [], [], KEEPALIVE_SECONDS) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    self.publish(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+
+SEAT_FEED = SeatFeed()
+
+
+def event_stream(subscription: Subscription):
+    """
+    SSE 產生器 (subscription 由 SEAT_FEED.subscribe 取得，結束時退訂)：
+    先送 retry 設定，之後每批變動送一個 event：
+        data: {"seats": [["courseId|YYYY-MM-DD|timeSlot", 人數, 是否額滿], ...]}
+    需要重抓整週時送 "event: resync"，閒置時送註解行保持連線。
+    """
+    try:
+        yield f"retry: {int(RECONNECT_SECONDS * 1000)}\n\n"
+        while True:
+            seats, resync = subscription.drain(KEEPALIVE_SECONDS)
+            if resync:
+                yield "event: resync\ndata: {}\n\n"
+            elif seats:
+                yield f"data: {json.dumps({'seats': seats}, ensure_ascii=False)}\n\n"
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        SEAT_FEED.unsubscribe(subscription)
@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+
+from api.sql import DB, RefCache
+
+# ------------------------------------------------------------
+# 匯入大量測試資料，給 flask explain-queries 與效能量測使用。
+#
+# 全部以 generate_series 在資料庫端產生，代號以 x 開頭 (會員 x0000001、教練 x0001、
+# 課程 xc0001、方案 x0001)，不會與正式資料或 tests/ 的 zz 代號衝突；
+# 主鍵重複時略過，所以可以重複執行。最後 ANALYZE，讓計畫依實際列數估算。
+# 請只在本機 / 測試資料庫執行 (flask seed-data)。
+# ------------------------------------------------------------
+
+TIME_SLOTS = [
+    "06:00-07:00", "07:15-08:15", "08:30-09:30", "10:00-11:00",
+    "12:00-13:00", "14:00-15:00", "18:00-19:00", "19:30-20:30",
+]
+
+SEED_SQL = """
+    INSERT INTO plan (planid, planname, period, monthlycharge)
+    SELECT 'x' || lpad(g::text, 4, '0'), '測試方案 ' || g, g * 3, 500 + g * 100
+    FROM generate_series(1, 4) g
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO sportmember (memberid, mname, birthdate, gender, phonenumber, password, registerdate, status)
+    SELECT 'x' || lpad(g::text, 7, '0'), '測試會員 ' || g,
+           DATE '1970-01-01' + (g %% 12000), CASE WHEN g %% 2 = 0 THEN 'M' ELSE 'F' END,
+           '09' || lpad(g::text, 8, '0'), 'x', CURRENT_DATE - (g %% 1000), '有合約'
+    FROM generate_series(1, %(members)s) g
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO confirm (planid, memberid, startdate, enddate, paymenttype)
+    SELECT 'x' || lpad((1 + g %% 4)::text, 4, '0'), 'x' || lpad(g::text, 7, '0'),
+           CURRENT_DATE - (g %% 300), CURRENT_DATE - (g %% 300) + 365, '現金'
+    FROM generate_series(1, %(members)s) g
+    WHERE NOT EXISTS (SELECT 1 FROM confirm WHERE memberid = 'x' || lpad(g::text, 7, '0'));
+
+    INSERT INTO coach (coachid, cname, coachingtype, password)
+    SELECT 'x' || lpad(g::text, 4, '0'), '測試教練 ' || g, '測試', 'x'
+    FROM generate_series(1, %(coaches)s) g
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO course (courseid, coursename, classroom, studentlimit)
+    SELECT 'xc' || lpad(g::text, 4, '0'), '測試課程 ' || g, 'X' || (g %% %(per_slot)s), 20
+    FROM generate_series(1, %(courses)s) g
+    ON CONFLICT DO NOTHING;
+
+    -- 每天每個時段 per_slot 堂課，同一時段的課輪流分配教練與教室，不會撞堂
+    INSERT INTO courseschedule (courseid, coachid, scheduledate, timeslot, month, dayofweek)
+    SELECT 'xc' || lpad((1 + (d * %(slots)s * %(per_slot)s + s * %(per_slot)s + k) %% %(courses)s)::text, 4, '0'),
+           'x' || lpad((1 + (s * %(per_slot)s + k) %% %(coaches)s)::text, 4, '0'),
+           day, (%(time_slots)s::text[])[s + 1],
+           EXTRACT(MONTH FROM day), EXTRACT(ISODOW FROM day)
+    FROM generate_series(0, %(days)s - 1) d
+    CROSS JOIN LATERAL (SELECT %(start)s::date + d AS day) AS days
+    CROSS JOIN generate_series(0, %(slots)s - 1) s
+    CROSS JOIN generate_series(0, %(per_slot)s - 1) k
+    ON CONFLICT DO NOTHING;
+
+    -- 每個時段 bookings 位會員預約 (隨機，重複的略過)
+    INSERT INTO booking (courseid, scheduledate, timeslot, memberid)
+    SELECT cs.courseid, cs.scheduledate, cs.timeslot,
+           'x' || lpad((1 + (random() * (%(members)s - 1))::int)::text, 7, '0')
+    FROM courseschedule cs
+    CROSS JOIN generate_series(1, %(bookings)s)
+    WHERE cs.courseid LIKE 'xc%%' AND cs.scheduledate BETWEEN %(start)s AND %(start)s::date + %(days)s - 1
+    ON CONFLICT DO NOTHING;
+
+    ANALYZE plan, sportmember, confirm, coach, course, courseschedule, booking;
+"""
+
+
+def seed(members=5000, coaches=40, courses=120, weeks=26, per_slot=10, bookings=15):
+    """
+    以今天為中心、前後各 weeks / 2 週產生課表與預約。
+    per_slot 不可超過 coaches (同一時段每堂課要不同教練)。
+    回傳各表目前的列數 {表名: 列數}。
+    """
+    if per_slot > coaches:
+        raise ValueError("per_slot 不可超過 coaches")
+    start = date.today() - timedelta(weeks=weeks // 2)
+    DB.execute(
+        SEED_SQL,
+        {
+            "members": members,
+            "coaches": coaches,
+            "courses": courses,
+            "per_slot": per_slot,
+            "bookings": bookings,
+            "slots": len(TIME_SLOTS),
+            "time_slots": TIME_SLOTS,
+            "days": weeks * 7,
+            "start": start,
+        },
+    )
+    # 直接寫入 plan / course / coach，沒有經過 RefCache.write
+    with DB.transaction() as cursor:
+        for name in RefCache.TABLES:
+            RefCache.bump(cursor, name)
+    RefCache.invalidate(*RefCache.TABLES)
+
+    tables = ["sportmember", "confirm", "coach", "course", "courseschedule", "booking"]
+    return {table: DB.fetchone(f"SELECT COUNT(*) FROM {table}")[0] for table in tables}
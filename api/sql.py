@@ -1,9 +1,21 @@
 import os
-from typing import Optional, Sequence, Any
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from contextlib import contextmanager
+from typing import Optional, Sequence, Any, NamedTuple
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
 from psycopg2 import pool
 from dotenv import load_dotenv
 
+from api.cache import invalidate_user, WEEK_GRID_CACHE, PAGE_CACHE, LocalBackend
+from api.timeslot import TimeSlot, find_overlaps
+
 # ------------------------------------------------------------
 # 讀取 .env（在本機用），Render 上則用 Environment 裡的變數
 # ------------------------------------------------------------
@@ -15,37 +27,298 @@ DB_NAME = os.getenv("DB_NAME", "project_7")
 DB_HOST = os.getenv("DB_HOST", "140.117.68.66")
 DB_PORT = os.getenv("DB_PORT", "5432")
 
+# 連線池設定（可由環境變數調整）
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+# 連線都被借走時，最多等待幾秒才放棄
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# 閒置超過幾秒的連線，借出前先 SELECT 1 確認還活著
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+# 閒置超過幾秒就關掉（避免被伺服器 / Render 靜默切斷）
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+# 連線最長使用壽命（秒），超過就換新的
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+
+
+class PoolTimeout(pool.PoolError):
+    """
+    等待連線超過 DB_POOL_TIMEOUT 秒仍借不到。
+    """
+
+
+class _PooledConnection:
+    __slots__ = ("connection", "created_at", "last_used")
+
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+
+
+class BoundedConnectionPool:
+    """
+    執行緒安全、有上限的連線池（取代 SimpleConnectionPool）。
+
+    - 連線全部借出時，getconn 會排隊等待，最多 timeout 秒，逾時丟出 PoolTimeout
+    - 借出前檢查連線是否已關閉；閒置較久的連線會先 SELECT 1
+    - 閒置太久或使用太久的連線會被關掉重開
+    - stats() 回傳借出次數、等待時間、逾時次數、壞掉的連線數等計數
+    """
+
+    def __init__(self, minconn, maxconn, timeout=DB_POOL_TIMEOUT,
+                 ping_after=DB_POOL_PING_AFTER, max_idle=DB_POOL_MAX_IDLE,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, **dsn):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self._dsn = dsn
+
+        self._cond = threading.Condition()
+        self._idle = deque()   # 可借出的 _PooledConnection（後進先出）
+        self._used = {}        # id(connection) -> _PooledConnection
+        self._opening = 0      # 正在建立中的連線數
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._broken = 0
+        self._recycled = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+
+        for _ in range(minconn):
+            self._idle.append(self._open())
+
+    def _open(self):
+        return _PooledConnection(psycopg2.connect(**self._dsn))
+
+    def _size(self):
+        return len(self._idle) + len(self._used) + self._opening
+
+    def _expired(self, item, now):
+        return (now - item.last_used > self.max_idle
+                or now - item.created_at > self.max_lifetime)
+
+    def _healthy(self, item, now):
+        """
+        便宜的檢查：已關閉就丟掉；閒置超過 ping_after 秒才真的打一次 SELECT 1。
+        """
+        conn = item.connection
+        if conn.closed:
+            return False
+        if now - item.last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            item = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise pool.PoolError("connection pool is closed")
+                    if self._idle:
+                        item = self._idle.pop()
+                        break
+                    if self._size() < self.maxconn:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"no connection available within {self.timeout}s "
+                            f"(maxconn={self.maxconn})"
+                        )
+                    self._cond.wait(remaining)
+
+            now = time.monotonic()
+            if item is None:
+                # 在鎖外建立新連線，避免卡住其他執行緒
+                try:
+                    item = self._open()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        if item is None:
+                            self._cond.notify()
+            else:
+                expired = self._expired(item, now)
+                if expired or not self._healthy(item, now):
+                    with self._cond:
+                        if expired:
+                            self._recycled += 1
+                        else:
+                            self._broken += 1
+                        self._cond.notify()
+                    self._close_quietly(item.connection)
+                    continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._used[id(item.connection)] = item
+                self._checkouts += 1
+                self._wait_time += waited
+                self._max_wait = max(self._max_wait, waited)
+            return item.connection
+
+    def putconn(self, conn, close=False):
+        with self._cond:
+            item = self._used.pop(id(conn), None)
+        if item is None:
+            raise pool.PoolError("trying to put unkeyed connection")
+
+        keep = not close and not self._closed and not conn.closed
+        if keep:
+            try:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    keep = False
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                keep = False
+
+        with self._cond:
+            if keep:
+                item.last_used = time.monotonic()
+                self._idle.append(item)
+            elif not close and not self._closed:
+                self._broken += 1
+            self._cond.notify()
+        if not keep:
+            self._close_quietly(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            items = list(self._idle) + list(self._used.values())
+            self._idle.clear()
+            self._used.clear()
+            self._cond.notify_all()
+        for item in items:
+            self._close_quietly(item.connection)
+
+    def available(self):
+        """
+        不用等待就借得到的連線數：閒置的 + 還能新開的
+        """
+        with self._cond:
+            return len(self._idle) + self.maxconn - self._size()
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self._size(),
+                "idle": len(self._idle),
+                "in_use": len(self._used),
+                "maxconn": self.maxconn,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "broken": self._broken,
+                "recycled": self._recycled,
+                "wait_time_total": self._wait_time,
+                "wait_time_avg": self._wait_time / checkouts if checkouts else 0.0,
+                "wait_time_max": self._max_wait,
+            }
+
+
 # 全域連線池（lazy 建立）
-_DB_POOL: Optional[pool.SimpleConnectionPool] = None
+_DB_POOL: Optional[BoundedConnectionPool] = None
+_DB_POOL_LOCK = threading.Lock()
+
 
+def _dsn() -> dict:
+    return {
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "dbname": DB_NAME,
+    }
 
-def _get_pool() -> pool.SimpleConnectionPool:
+
+def _get_pool() -> BoundedConnectionPool:
     """
     第一次呼叫時建立連線池，之後重複使用。
     """
     global _DB_POOL
     if _DB_POOL is None:
-        dsn = {
-            "user": DB_USER,
-            "password": DB_PASSWORD,
-            "host": DB_HOST,
-            "port": DB_PORT,
-            "dbname": DB_NAME,
-        }
-        # 你可以依需求調整 maxconn
-        _DB_POOL = pool.SimpleConnectionPool(1, 20, **dsn)
+        with _DB_POOL_LOCK:
+            if _DB_POOL is None:
+                _DB_POOL = BoundedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **_dsn())
     return _DB_POOL
 
 
+# DB.gather 用的執行緒池（lazy 建立，整個 worker 共用）。
+# 每個執行緒同時只借一條連線，所以大小與連線池上限相同：連線池借得到的，執行緒池就排得進去。
+_GATHER_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _get_gather_executor() -> ThreadPoolExecutor:
+    global _GATHER_EXECUTOR
+    if _GATHER_EXECUTOR is None:
+        with _DB_POOL_LOCK:
+            if _GATHER_EXECUTOR is None:
+                _GATHER_EXECUTOR = ThreadPoolExecutor(
+                    max_workers=max(1, DB_POOL_MAX),
+                    thread_name_prefix="db-gather",
+                )
+    return _GATHER_EXECUTOR
+
+
 class DB:
     @staticmethod
     def connect():
+        """
+        從連線池借一條連線；池子滿了會等待，最多 DB_POOL_TIMEOUT 秒。
+        """
         return _get_pool().getconn()
 
     @staticmethod
     def release(connection):
         _get_pool().putconn(connection)
 
+    @staticmethod
+    def listen_connection(*channels):
+        """
+        開一條不屬於連線池的 autocommit 連線並 LISTEN 指定的 channel。
+        給長時間等待 NOTIFY 的背景執行緒使用，用完請自行 close()。
+        """
+        connection = psycopg2.connect(**_dsn())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            for channel in channels:
+                cursor.execute(f"LISTEN {channel}")
+        return connection
+
+    @staticmethod
+    def pool_stats():
+        """
+        連線池的計數（借出次數、等待時間、逾時、壞掉的連線…），用於監控。
+        """
+        return _get_pool().stats()
+
     @staticmethod
     def execute_input(sql: str, input_params: Sequence[Any]):
         """
@@ -126,6 +399,203 @@ class DB:
         finally:
             DB.release(connection)
 
+    @staticmethod
+    def stream(sql: str, input_params: Optional[Sequence[Any]] = None, batch_size: int = 2000):
+        """
+        以 server-side (named) cursor 逐批取回資料的 generator，
+        每次只有 batch_size 筆在記憶體裡，適合大量匯出。
+        連線會一直借用到 generator 結束（或被關閉）為止。
+        """
+        connection = DB.connect()
+        try:
+            with connection.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(sql, input_params)
+                for row in cursor:
+                    yield row
+        except psycopg2.Error as e:
+            print(f"Error fetching data: {e}")
+            raise e
+        finally:
+            connection.rollback()
+            DB.release(connection)
+
+    @staticmethod
+    def gather(*calls):
+        """
+        同時執行多個彼此獨立的讀取查詢，依傳入順序回傳結果。
+        每個 call 是不帶參數的函式（需要參數時用 functools.partial），
+        各自在執行緒池中向連線池借一條連線，總耗時約等於最慢的那一個。
+        任何一個丟出例外時，等全部結束後丟出第一個 (依傳入順序) 的例外。
+        用法：
+            a, b = DB.gather(Analysis.category_sale, partial(Member.get_by_id, mid))
+        只給一個 call，或連線池中不用等待就借得到的連線少於 call 數時
+        (其他請求正在用)，直接在目前的執行緒依序執行，一次只佔一條連線，
+        不在尖峰時一個請求同時拿走好幾條。
+        """
+        if len(calls) <= 1 or _get_pool().available() < len(calls):
+            return [call() for call in calls]
+        executor = _get_gather_executor()
+        futures = [executor.submit(call) for call in calls]
+        errors = [f.exception() for f in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [f.result() for f in futures]
+
+    @staticmethod
+    @contextmanager
+    def transaction():
+        """
+        在同一條連線上執行多個指令，全部成功才 commit，任何錯誤都 rollback。
+        用法：
+            with DB.transaction() as cursor:
+                cursor.execute(...)
+        """
+        connection = DB.connect()
+        try:
+            with connection.cursor() as cursor:
+                yield cursor
+            connection.commit()
+        except psycopg2.Error as e:
+            print(f"Error executing SQL: {e}")
+            connection.rollback()
+            raise e
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            DB.release(connection)
+
+
+# 參考資料快取：每隔幾秒才向 DB 確認一次版本號
+REF_CACHE_CHECK_INTERVAL = float(os.getenv("REF_CACHE_CHECK_INTERVAL", "5"))
+
+
+class RefCache:
+    """
+    plan / course / coach 這種很少變動的小表，整張表放在記憶體裡。
+
+    - rows(name) 回傳整張表；by_id(name, id) 以 dict 做 O(1) 查詢
+    - 每張表在 ref_version 有一個版本號，寫入時在同一個交易中 +1（見 write）
+    - 每隔 REF_CACHE_CHECK_INTERVAL 秒才用一個查詢讀回所有版本號，
+      版本變了就重新載入，所以其他 gunicorn worker 的修改也會在幾秒內生效；
+      同一個 worker 自己寫入時則立刻失效
+    """
+
+    TABLES = {
+        "plan": "SELECT * FROM plan ORDER BY planid",
+        "course": "SELECT * FROM course ORDER BY courseid",
+        "coach": "SELECT * FROM coach ORDER BY cname",
+    }
+
+    _lock = threading.RLock()
+    _data = {}          # name -> (version, rows, by_id)
+    _db_versions = {}   # 最近一次從 DB 讀到的版本號
+    _checked_at = float("-inf")
+
+    @staticmethod
+    def _key(value):
+        # CHAR(n) 欄位會補空白，SQL 比對時會忽略，這裡也一樣去掉
+        return str(value).rstrip()
+
+    @staticmethod
+    def _check_versions():
+        now = time.monotonic()
+        if now - RefCache._checked_at < REF_CACHE_CHECK_INTERVAL:
+            return
+        versions = dict(DB.fetchall("SELECT name, version FROM ref_version"))
+        RefCache._db_versions = versions
+        RefCache._checked_at = now
+        for name, (version, _, _) in list(RefCache._data.items()):
+            if versions.get(name, 0) != version:
+                del RefCache._data[name]
+
+    @staticmethod
+    def _load(name):
+        with RefCache._lock:
+            RefCache._check_versions()
+            entry = RefCache._data.get(name)
+            if entry is None:
+                # 先記下版本號再讀資料：中間若有人寫入，下次檢查時版本不同會再重讀
+                version = RefCache._db_versions.get(name, 0)
+                rows = DB.fetchall(RefCache.TABLES[name])
+                by_id = {RefCache._key(row[0]): row for row in rows}
+                entry = (version, rows, by_id)
+                RefCache._data[name] = entry
+            return entry
+
+    @staticmethod
+    def rows(name):
+        return list(RefCache._load(name)[1])
+
+    @staticmethod
+    def version(name):
+        """
+        ref_version 中 name 的版本號 (與資料表共用同一次檢查，最多慢 REF_CACHE_CHECK_INTERVAL 秒)
+        """
+        with RefCache._lock:
+            RefCache._check_versions()
+            return RefCache._db_versions.get(name, 0)
+
+    @staticmethod
+    def by_id(name, key):
+        if key is None:
+            return None
+        return RefCache._load(name)[2].get(RefCache._key(key))
+
+    @staticmethod
+    def invalidate(*names):
+        with RefCache._lock:
+            for name in names:
+                RefCache._data.pop(name, None)
+            RefCache._checked_at = float("-inf")
+
+    @staticmethod
+    def write(name, sql: str, input_params: Sequence[Any]):
+        """
+        執行寫入，並在同一個交易中把 ref_version 的版本號 +1
+        """
+        with DB.transaction() as cursor:
+            cursor.execute(sql, input_params)
+            RefCache.bump(cursor, name)
+        RefCache.invalidate(name)
+
+    @staticmethod
+    def bump(cursor, name):
+        """
+        在呼叫端的交易中把 name 的版本號 +1（交易 commit 後請再呼叫 invalidate）
+        """
+        cursor.execute(
+            "INSERT INTO ref_version (name, version) VALUES (%s, 1) "
+            "ON CONFLICT (name) DO UPDATE SET version = ref_version.version + 1",
+            (name,),
+        )
+
+
+class PageVersions:
+    """
+    後台頁面快取 (PAGE_CACHE) 的版本號，存在 ref_version (name 為 "page:" + endpoint)，
+    所有 gunicorn worker 共用；沒有設定 PAGE_CACHE_URL (Redis) 時使用。
+    """
+
+    PREFIX = "page:"
+
+    @staticmethod
+    def version(endpoint):
+        return RefCache.version(PageVersions.PREFIX + endpoint)
+
+    @staticmethod
+    def bump(endpoint):
+        with DB.transaction() as cursor:
+            RefCache.bump(cursor, PageVersions.PREFIX + endpoint)
+        # 這個 worker 下一次讀取就重新檢查版本號
+        RefCache.invalidate()
+
+
+if isinstance(PAGE_CACHE.backend, LocalBackend):
+    PAGE_CACHE.backend.versions = PageVersions
+
 
 # ==================== 以下是你原本的各種 Model ====================
 
@@ -154,6 +624,7 @@ class Member:
                 "無合約",
             ),
         )
+        invalidate_user(f"member_{input_data['memberId']}")
 
     @staticmethod
     def update_status_by_id(memberId, new_status):
@@ -161,7 +632,9 @@ class Member:
         會員簽署合約後，更新其狀態。
         """
         sql = "UPDATE sportMember SET Status = %s WHERE MemberID = %s"
-        return DB.execute_input(sql, (new_status, memberId))
+        result = DB.execute_input(sql, (new_status, memberId))
+        invalidate_user(f"member_{memberId}")
+        return result
 
 
 class Coach:
@@ -173,7 +646,8 @@ class Coach:
     @staticmethod
     def create_coach(input_data):
         sql = "INSERT INTO coach(coachId, cName, coachingType, password) VALUES (%s, %s, %s, %s)"
-        DB.execute_input(
+        RefCache.write(
+            "coach",
             sql,
             (
                 input_data["coachId"],
@@ -182,14 +656,14 @@ class Coach:
                 input_data["password"],
             ),
         )
+        invalidate_user(f"coach_{input_data['coachId']}")
 
     @staticmethod
     def get_all_coach():
         """
         查詢所有教練 (用於下拉選單)
         """
-        sql = "SELECT * FROM coach ORDER BY cname"
-        return DB.fetchall(sql)
+        return RefCache.rows("coach")
 
 
 class Plan:
@@ -218,16 +692,15 @@ class Plan:
         """
         查詢所有合約方案
         """
-        sql = "SELECT * FROM plan ORDER BY planid"
-        return DB.fetchall(sql)
+        return RefCache.rows("plan")
 
     @staticmethod
     def get_period_by_id(planId):
         """
         根據 PlanID 獲取方案的 'period' (週期，單位：月)
         """
-        sql = "SELECT period FROM plan WHERE planid = %s"
-        return DB.fetchone(sql, (planId,))
+        row = RefCache.by_id("plan", planId)
+        return (row[2],) if row else None
 
     @staticmethod
     def add_plan(input_data):
@@ -241,7 +714,8 @@ class Plan:
             INSERT INTO plan (planid, planname, period, monthlycharge) 
             VALUES (%s, %s, %s, %s)
         """
-        DB.execute_input(
+        RefCache.write(
+            "plan",
             sql,
             (
                 new_planid,
@@ -257,7 +731,7 @@ class Plan:
         根據 planId 刪除一筆合約方案
         """
         sql = "DELETE FROM plan WHERE planid = %s"
-        DB.execute_input(sql, (planid,))
+        RefCache.write("plan", sql, (planid,))
 
 
 class Course:
@@ -268,18 +742,15 @@ class Course:
 
     @staticmethod
     def get_course(courseid):
-        sql = "SELECT * FROM course WHERE courseid = %s"
-        return DB.fetchone(sql, (courseid,))
+        return RefCache.by_id("course", courseid)
 
     @staticmethod
     def get_all_course():
-        sql = "SELECT * FROM course"
-        return DB.fetchall(sql)
+        return RefCache.rows("course")
 
     @staticmethod
     def get_name(courseid):
-        sql = "SELECT coursename FROM course WHERE courseid = %s"
-        return DB.fetchone(sql, (courseid,))[0]
+        return RefCache.by_id("course", courseid)[1]
 
     @staticmethod
     def add_course(input_data):
@@ -287,7 +758,8 @@ class Course:
             "INSERT INTO course (courseid, coursename, classroom, studentlimit) "
             "VALUES (%s, %s, %s, %s)"
         )
-        DB.execute_input(
+        RefCache.write(
+            "course",
             sql,
             (
                 input_data["courseid"],
@@ -300,7 +772,7 @@ class Course:
     @staticmethod
     def delete_course(courseid):
         sql = "DELETE FROM course WHERE courseid = %s"
-        DB.execute_input(sql, (courseid,))
+        RefCache.write("course", sql, (courseid,))
 
     @staticmethod
     def update_course(input_data):
@@ -308,7 +780,8 @@ class Course:
             "UPDATE course SET coursename = %s, classroom = %s, studentlimit = %s "
             "WHERE courseid = %s"
         )
-        DB.execute_input(
+        RefCache.write(
+            "course",
             sql,
             (
                 input_data["coursename"],
@@ -317,6 +790,8 @@ class Course:
                 input_data["courseid"],
             ),
         )
+        # 課程名稱 / 人數上限會出現在每一週的課表上
+        WEEK_GRID_CACHE.clear()
 
     @staticmethod
     def get_courseid():
@@ -324,28 +799,204 @@ class Course:
         return DB.fetchone(sql)
 
 
+class ScheduleConflict(ValueError):
+    """
+    新排程與同一位教練或同一間教室的既有排程時段重疊。
+    """
+
+
+# 會員首頁、預約與候補路徑的 SQL 寫成模組層級的常數，api/aiosql.py (asyncio 版) 共用同一份
+SCHEDULES_BY_WEEK_SQL = """
+    SELECT 
+        cs.courseid, 
+        cs.scheduledate, 
+        cs.timeslot, 
+        cs.coachid, 
+        c.coursename, 
+        co.cname,
+        c.studentlimit 
+    FROM courseschedule cs
+    JOIN course c ON cs.courseid = c.courseid
+    JOIN coach co ON cs.coachid = co.coachid
+    WHERE cs.scheduledate BETWEEN %s AND %s
+    ORDER BY cs.scheduledate, cs.timeslot;
+"""
+
+
 class CourseSchedule:
     @staticmethod
     def create(input_data):
         """
-        新增一筆課程時段紀錄
+        新增一筆課程時段紀錄；與同教練 / 同教室的排程重疊時丟出 ScheduleConflict
         """
         sql = (
             "INSERT INTO courseschedule "
             "(courseid, coachid, scheduledate, timeslot, month, dayofweek) "
             "VALUES (%s, %s, %s, %s, %s, %s)"
         )
-        DB.execute_input(
-            sql,
-            (
-                input_data["courseid"],
-                input_data["coachid"],
-                input_data["scheduledate"],
-                input_data["timeslot"],
-                input_data["month"],
-                input_data["dayofweek"],
-            ),
+        with DB.transaction() as cursor:
+            conflicts = CourseSchedule.find_conflicts(
+                cursor,
+                [(input_data["courseid"], input_data["coachid"],
+                  input_data["scheduledate"], input_data["timeslot"])],
+            )
+            if conflicts:
+                raise ScheduleConflict(conflicts[0])
+            cursor.execute(
+                sql,
+                (
+                    input_data["courseid"],
+                    input_data["coachid"],
+                    input_data["scheduledate"],
+                    input_data["timeslot"],
+                    input_data["month"],
+                    input_data["dayofweek"],
+                ),
+            )
+        WEEK_GRID_CACHE.invalidate_week(input_data["scheduledate"])
+
+    @staticmethod
+    def find_conflicts(cursor, proposed):
+        """
+        proposed: [(courseid, coachid, scheduledate, timeslot), ...]
+        檢查這些排程彼此之間、以及與資料庫中同一天的排程，
+        是否有同一位教練或同一間教室時段重疊。回傳 {proposed 的索引: 原因}。
+
+        - 需在寫入的交易中呼叫：會以 advisory lock 鎖住涉及的日期，
+          同一天的排程寫入排隊進行，檢查完到 commit 之前不會有別人插進來
+        - 主鍵已存在的列不算衝突 (寫入時由 ON CONFLICT / 主鍵另外處理)
+        - 每一天每個教練 / 教室排序後掃一次 (api.timeslot.find_overlaps)，不做兩兩比對
+        """
+        if not proposed:
+            return {}
+
+        days = sorted({CourseSchedule._as_date(p[2]) for p in proposed})
+        cursor.execute(
+            """
+            SELECT pg_advisory_xact_lock(hashtext('courseschedule'), d)
+            FROM (SELECT unnest(%s::int[]) AS d ORDER BY 1) AS days
+            """,
+            ([d.toordinal() for d in days],),
+        )
+        cursor.execute(
+            """
+            SELECT cs.courseid, cs.coachid, cs.scheduledate, cs.timeslot, c.classroom
+            FROM courseschedule cs
+            JOIN course c ON cs.courseid = c.courseid
+            WHERE cs.scheduledate = ANY(%s)
+            """,
+            (days,),
         )
+        existing = cursor.fetchall()
+
+        items = []
+        labels = {}
+        seen = set()
+
+        def add(tag, courseid, coachid, day, timeslot, classroom):
+            try:
+                slot = TimeSlot.parse(timeslot)
+            except ValueError:
+                return
+            labels[tag] = f"{day} {timeslot} 課程 {courseid}"
+            items.append((("教練", coachid), day, slot, tag))
+            if classroom:
+                items.append((("教室", classroom), day, slot, tag))
+
+        for i, (courseid, coachid, day, timeslot, classroom) in enumerate(existing):
+            courseid = RefCache._key(courseid)
+            seen.add((courseid, day, timeslot))
+            add(("db", i), courseid, RefCache._key(coachid), day, timeslot, (classroom or "").strip())
+
+        for i, (courseid, coachid, day, timeslot) in enumerate(proposed):
+            courseid, day = RefCache._key(courseid), CourseSchedule._as_date(day)
+            if (courseid, day, timeslot) in seen:
+                continue
+            seen.add((courseid, day, timeslot))
+            course = RefCache.by_id("course", courseid)
+            classroom = (course[2] or "").strip() if course else ""
+            add(("new", i), courseid, RefCache._key(coachid), day, timeslot, classroom)
+
+        resource_of = {}
+        for resource, _, _, tag in items:
+            resource_of.setdefault(tag, []).append(resource)
+
+        conflicts = {}
+        for first, second in find_overlaps(items):
+            # 兩筆都是新的時，擋下後開始的那一筆
+            tag, other = (second, first) if second[0] == "new" else (first, second)
+            if tag[0] != "new" or tag[1] in conflicts:
+                continue
+            shared = next(r for r in resource_of[tag] if r in resource_of[other])
+            conflicts[tag[1]] = f"{labels[tag]} 與 {labels[other]} 的{shared[0]} {shared[1]} 時段重疊"
+        return conflicts
+
+    @staticmethod
+    def _as_date(value):
+        return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+    @staticmethod
+    def expand_recurring(start_date, end_date, weekdays, skip_dates=()):
+        """
+        展開重複規則：start_date ~ end_date（含）之間，星期幾在 weekdays 內
+        (1=週一 ... 7=週日)、且不在 skip_dates 的所有日期，依日期排序。
+        每個星期幾直接以 7 天為間隔跳著算，不逐日檢查。
+        weekdays 有 1 ~ 7 以外的值時丟出 ValueError。
+        """
+        weekdays = set(int(w) for w in weekdays)
+        invalid = sorted(w for w in weekdays if not 1 <= w <= 7)
+        if invalid:
+            raise ValueError(f"星期必須是 1 (週一) ~ 7 (週日)：{invalid}")
+
+        skip = set(skip_dates)
+        dates = []
+        for weekday in weekdays:
+            first = start_date + timedelta(days=(weekday - 1 - start_date.weekday()) % 7)
+            d = first
+            while d <= end_date:
+                if d not in skip:
+                    dates.append(d)
+                d += timedelta(days=7)
+        return sorted(dates)
+
+    @staticmethod
+    def create_recurring(courseid, coachid, timeslot, dates):
+        """
+        以一個 INSERT ... VALUES (多筆) 一次新增所有日期的時段，
+        month / dayofweek 由資料庫一併算出；已存在的時段 (主鍵衝突)、
+        與同教練 / 同教室排程重疊的日期都略過。
+        回傳 (新增的日期列表, 略過的日期列表)。
+        """
+        if not dates:
+            return [], []
+
+        sql = """
+            INSERT INTO courseschedule
+                (courseid, coachid, scheduledate, timeslot, month, dayofweek)
+            SELECT v.courseid, v.coachid, v.scheduledate, v.timeslot,
+                   EXTRACT(MONTH FROM v.scheduledate), EXTRACT(ISODOW FROM v.scheduledate)
+            FROM (VALUES %s) AS v(courseid, coachid, scheduledate, timeslot)
+            ON CONFLICT (courseid, scheduledate, timeslot) DO NOTHING
+            RETURNING scheduledate
+        """
+        rows = [(courseid, coachid, d, timeslot) for d in dates]
+        with DB.transaction() as cursor:
+            overlapping = CourseSchedule.find_conflicts(cursor, rows)
+            rows = [row for i, row in enumerate(rows) if i not in overlapping]
+            if not rows:
+                return [], list(dates)
+            inserted = psycopg2.extras.execute_values(
+                cursor, sql, rows,
+                template="(%s, %s, %s::date, %s)",
+                page_size=len(rows),
+                fetch=True,
+            )
+        created = sorted(r[0] for r in inserted)
+        for week_start in {WEEK_GRID_CACHE.week_of(d) for d in created}:
+            WEEK_GRID_CACHE.invalidate_week(week_start)
+        created_set = set(created)
+        conflicts = [d for d in dates if d not in created_set]
+        return created, conflicts
 
     @staticmethod
     def delete(courseid, scheduledate, timeslot):
@@ -357,6 +1008,7 @@ class CourseSchedule:
             "WHERE courseid = %s AND scheduledate = %s AND timeslot = %s"
         )
         DB.execute_input(sql, (courseid, scheduledate, timeslot))
+        WEEK_GRID_CACHE.invalidate_week(scheduledate)
 
     @staticmethod
     def get_all_joined():
@@ -380,26 +1032,48 @@ class CourseSchedule:
         return DB.fetchall(sql)
 
     @staticmethod
-    def get_schedules_by_week(start_date, end_date):
+    def list_window(start_date, end_date, coachid=None, courseid=None, after=None, limit=50):
         """
-        獲取特定日期範圍內的所有排程，並 JOIN 課程、教練名稱、人數限制
+        後台排程列表：只查 start_date ~ end_date (含) 之間，可依教練 / 課程篩選，
+        依 (scheduledate, timeslot, courseid) 排序做 keyset 分頁。
+        after 是上一頁最後一筆的 (scheduledate, timeslot, courseid)，None 表示第一頁。
+        多取一筆判斷是否還有下一頁，回傳 (rows, 下一頁的 after 或 None)；
+        rows 的欄位順序與 get_all_joined 相同 (courseid, scheduledate, timeslot, coursename, cname)。
         """
-        sql = """
-            SELECT 
-                cs.courseid, 
-                cs.scheduledate, 
-                cs.timeslot, 
-                cs.coachid, 
-                c.coursename, 
-                co.cname,
-                c.studentlimit 
+        conditions = ["cs.scheduledate BETWEEN %s AND %s"]
+        params = [start_date, end_date]
+        if coachid:
+            conditions.append("cs.coachid = %s")
+            params.append(coachid)
+        if courseid:
+            conditions.append("cs.courseid = %s")
+            params.append(courseid)
+        if after:
+            conditions.append("(cs.scheduledate, cs.timeslot, cs.courseid) > (%s, %s, %s)")
+            params.extend(after)
+
+        sql = f"""
+            SELECT cs.courseid, cs.scheduledate, cs.timeslot, c.coursename, co.cname
             FROM courseschedule cs
             JOIN course c ON cs.courseid = c.courseid
             JOIN coach co ON cs.coachid = co.coachid
-            WHERE cs.scheduledate BETWEEN %s AND %s
-            ORDER BY cs.scheduledate, cs.timeslot;
+            WHERE {" AND ".join(conditions)}
+            ORDER BY cs.scheduledate, cs.timeslot, cs.courseid
+            LIMIT %s
         """
-        return DB.fetchall(sql, (start_date, end_date))
+        rows = DB.fetchall(sql, tuple(params) + (limit + 1,))
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, (last[1], last[2], RefCache._key(last[0]))
+
+    @staticmethod
+    def get_schedules_by_week(start_date, end_date):
+        """
+        獲取特定日期範圍內的所有排程，並 JOIN 課程、教練名稱、人數限制
+        """
+        return DB.fetchall(SCHEDULES_BY_WEEK_SQL, (start_date, end_date))
 
     @staticmethod
     def check_course_in_use(courseid):
@@ -410,33 +1084,146 @@ class CourseSchedule:
         return DB.fetchone(sql, (courseid,))
 
 
+class BookingResult(NamedTuple):
+    """
+    Booking.book / Booking.cancel 的回傳結果。
+    status 為 Booking.BOOKED / ALREADY_BOOKED / FULL / NOT_FOUND / CANCELLED / NOT_BOOKED 其中之一，
+    current_count 是處理完後該時段的預約人數，
+    promoted 是這次從候補名單補上的會員 ID (只有取消時會有)。
+    """
+    status: str
+    current_count: int
+    limit: Optional[int]
+    promoted: tuple = ()
+
+
+# 鎖住一個課程時段 (courseschedule 那一列)。同一時段的預約、取消、候補都先取得這個鎖，
+# 所以彼此依序進行，候補名單的順序不會被同時發生的取消 / 加入打亂。
+LOCK_SCHEDULE_SQL = """
+    SELECT c.studentlimit
+    FROM courseschedule cs
+    JOIN course c ON cs.courseid = c.courseid
+    WHERE cs.courseid = %(courseid)s AND cs.scheduledate = %(scheduledate)s
+      AND cs.timeslot = %(timeslot)s
+    FOR UPDATE OF cs;
+"""
+
+# 依加入順序 (seq) 把候補名單的前幾位補進空出來的名額，回傳被補上的會員 ID。
+# 需在已取得 LOCK_SCHEDULE_SQL 的交易中執行。studentlimit 為 NULL (不限人數) 時全部補上。
+PROMOTE_WAITLIST_SQL = """
+    WITH nxt AS (
+        DELETE FROM waitlist
+        WHERE seq IN (
+            SELECT seq FROM waitlist
+            WHERE courseid = %(courseid)s AND scheduledate = %(scheduledate)s
+              AND timeslot = %(timeslot)s
+            ORDER BY seq
+            LIMIT (
+                SELECT CASE WHEN c.studentlimit IS NULL THEN NULL
+                            ELSE GREATEST(c.studentlimit - (
+                                SELECT COUNT(*) FROM booking
+                                WHERE courseid = %(courseid)s AND scheduledate = %(scheduledate)s
+                                  AND timeslot = %(timeslot)s
+                            ), 0)
+                       END
+                FROM course c
+                WHERE c.courseid = %(courseid)s
+            )
+        )
+        RETURNING memberid, seq
+    )
+    INSERT INTO booking (courseid, scheduledate, timeslot, memberid)
+    SELECT %(courseid)s, %(scheduledate)s::date, %(timeslot)s, memberid
+    FROM nxt
+    ORDER BY seq
+    ON CONFLICT DO NOTHING
+    RETURNING memberid;
+"""
+
+COUNT_BOOKINGS_SQL = """
+    SELECT COUNT(*) FROM booking
+    WHERE courseid = %(courseid)s AND scheduledate = %(scheduledate)s
+      AND timeslot = %(timeslot)s;
+"""
+
+# 只在未預約且未額滿時寫入，回傳 (人數上限, 寫入前人數, 是否已預約, 是否寫入)。
+# 需在已取得 LOCK_SCHEDULE_SQL 並執行過 PROMOTE_WAITLIST_SQL 的交易中執行。
+BOOK_SQL = """
+    WITH slot AS (
+        SELECT c.studentlimit
+        FROM courseschedule cs
+        JOIN course c ON cs.courseid = c.courseid
+        WHERE cs.courseid = %(courseid)s AND cs.scheduledate = %(scheduledate)s
+          AND cs.timeslot = %(timeslot)s
+    ),
+    taken AS (
+        SELECT COUNT(*) AS n,
+               COALESCE(BOOL_OR(memberid = %(memberid)s), FALSE) AS mine
+        FROM booking
+        WHERE courseid = %(courseid)s AND scheduledate = %(scheduledate)s
+          AND timeslot = %(timeslot)s
+    ),
+    ins AS (
+        INSERT INTO booking (courseid, scheduledate, timeslot, memberid)
+        SELECT %(courseid)s, %(scheduledate)s::date, %(timeslot)s, %(memberid)s
+        FROM slot, taken
+        WHERE NOT taken.mine
+          AND (slot.studentlimit IS NULL OR taken.n < slot.studentlimit)
+        RETURNING 1
+    )
+    SELECT slot.studentlimit, taken.n, taken.mine, EXISTS (SELECT 1 FROM ins)
+    FROM slot, taken;
+"""
+
+CANCEL_BOOKING_SQL = """
+    DELETE FROM booking
+    WHERE courseid = %(courseid)s AND scheduledate = %(scheduledate)s
+      AND timeslot = %(timeslot)s AND memberid = %(memberid)s;
+"""
+
+BOOKINGS_BY_MEMBER_SQL = """
+    SELECT 
+        b.courseid, 
+        b.scheduledate, 
+        b.timeslot, 
+        c.coursename, 
+        co.cname
+    FROM booking b
+    JOIN courseschedule cs ON b.courseid = cs.courseid 
+                          AND b.scheduledate = cs.scheduledate 
+                          AND b.timeslot = cs.timeslot
+    JOIN course c ON b.courseid = c.courseid
+    JOIN coach co ON cs.coachid = co.coachid
+    WHERE b.memberid = %s AND b.scheduledate >= CURRENT_DATE
+    ORDER BY b.scheduledate ASC, b.timeslot ASC;
+"""
+
+COUNTS_FOR_RANGE_SQL = """
+    SELECT courseid, scheduledate, timeslot, COUNT(*)
+    FROM booking
+    WHERE scheduledate BETWEEN %s AND %s
+    GROUP BY courseid, scheduledate, timeslot;
+"""
+
+
 class Booking:
     """
     管理與 Booking (預約) 相關的 SQL 查詢
     """
 
+    BOOKED = "booked"
+    ALREADY_BOOKED = "already_booked"
+    FULL = "full"
+    NOT_FOUND = "not_found"
+    CANCELLED = "cancelled"
+    NOT_BOOKED = "not_booked"
+
     @staticmethod
     def get_bookings_by_member(memberId):
         """
         查詢特定會員的所有預約紀錄 (未來的)，並 JOIN 課程資訊
         """
-        sql = """
-            SELECT 
-                b.courseid, 
-                b.scheduledate, 
-                b.timeslot, 
-                c.coursename, 
-                co.cname
-            FROM booking b
-            JOIN courseschedule cs ON b.courseid = cs.courseid 
-                                  AND b.scheduledate = cs.scheduledate 
-                                  AND b.timeslot = cs.timeslot
-            JOIN course c ON b.courseid = c.courseid
-            JOIN coach co ON cs.coachid = co.coachid
-            WHERE b.memberid = %s AND b.scheduledate >= CURRENT_DATE
-            ORDER BY b.scheduledate ASC, b.timeslot ASC;
-        """
-        return DB.fetchall(sql, (memberId,))
+        return DB.fetchall(BOOKINGS_BY_MEMBER_SQL, (memberId,))
 
     @staticmethod
     def check_booking_exists(courseId, scheduleDate, timeSlot, memberId):
@@ -461,26 +1248,113 @@ class Booking:
         return DB.fetchone(sql, (courseId, scheduleDate, timeSlot))
 
     @staticmethod
-    def create_booking(courseId, scheduleDate, timeSlot, memberId):
+    def counts_for_range(start_date, end_date):
         """
-        新增一筆預約紀錄
+        一次計算日期範圍內每個課程時段的預約人數 (GROUP BY)，
+        取代對每個時段各呼叫一次 count_bookings_for_schedule。
+        回傳 (courseid, scheduledate, timeslot, count)，沒有人預約的時段不會出現。
         """
-        sql = """
-            INSERT INTO booking (courseid, scheduledate, timeslot, memberid)
-            VALUES (%s, %s, %s, %s);
+        return DB.fetchall(COUNTS_FOR_RANGE_SQL, (start_date, end_date))
+
+    @staticmethod
+    def book(courseId, scheduleDate, timeSlot, memberId):
+        """
+        在單一交易中完成「檢查是否已預約 + 檢查額滿 + 新增預約」。
+
+        先以 FOR UPDATE 鎖住 courseschedule 的那一列，讓同一時段的預約排隊進行；
+        若有空位且候補名單有人 (例如人數上限被調高)，先依序補上候補的會員，
+        接著用條件式 INSERT ... SELECT 只在未預約且未額滿時寫入，
+        所以有人候補時不會被新的預約插隊。
+        所有指令一次送出，只需要一次來回。
+        studentlimit 為 NULL 視為不限人數。
         """
-        return DB.execute_input(sql, (courseId, scheduleDate, timeSlot, memberId))
+        sql = LOCK_SCHEDULE_SQL + PROMOTE_WAITLIST_SQL + BOOK_SQL
+        params = {
+            "courseid": courseId,
+            "scheduledate": scheduleDate,
+            "timeslot": timeSlot,
+            "memberid": memberId,
+        }
+        with DB.transaction() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is None:
+            return BookingResult(Booking.NOT_FOUND, 0, None)
+
+        limit, count, mine, inserted = row
+        if inserted:
+            result = BookingResult(Booking.BOOKED, count + 1, limit)
+        elif mine:
+            result = BookingResult(Booking.ALREADY_BOOKED, count, limit)
+        else:
+            result = BookingResult(Booking.FULL, count, limit)
+        WEEK_GRID_CACHE.set_count(courseId, scheduleDate, timeSlot, result.current_count)
+        return result
 
     @staticmethod
     def delete_booking(courseId, scheduleDate, timeSlot, memberId):
         """
-        刪除一筆預約紀錄
+        刪除一筆預約紀錄 (與 cancel 相同，空出的名額會補給候補名單的下一位)
+        """
+        return Booking.cancel(courseId, scheduleDate, timeSlot, memberId)
+
+    @staticmethod
+    def cancel(courseId, scheduleDate, timeSlot, memberId):
+        """
+        取消預約，並在同一個交易中把空出的名額依序補給候補名單的下一位。
+        回傳 BookingResult (CANCELLED / NOT_BOOKED / NOT_FOUND)，
+        current_count 為補位後的人數，promoted 為補上的會員 ID。
+        """
+        params = {
+            "courseid": courseId,
+            "scheduledate": scheduleDate,
+            "timeslot": timeSlot,
+            "memberid": memberId,
+        }
+        with DB.transaction() as cursor:
+            cursor.execute(LOCK_SCHEDULE_SQL, params)
+            row = cursor.fetchone()
+            if row is None:
+                return BookingResult(Booking.NOT_FOUND, 0, None)
+            limit = row[0]
+
+            cursor.execute(CANCEL_BOOKING_SQL, params)
+            deleted = cursor.rowcount > 0
+
+            promoted = ()
+            if deleted:
+                cursor.execute(PROMOTE_WAITLIST_SQL, params)
+                promoted = tuple(r[0] for r in cursor.fetchall())
+
+            cursor.execute(COUNT_BOOKINGS_SQL, params)
+            count = cursor.fetchone()[0]
+
+        status = Booking.CANCELLED if deleted else Booking.NOT_BOOKED
+        WEEK_GRID_CACHE.set_count(courseId, scheduleDate, timeSlot, count)
+        return BookingResult(status, count, limit, promoted)
+
+    @staticmethod
+    def stream_history(start_date=None, end_date=None):
+        """
+        匯出用：逐批回傳所有預約紀錄 (可限定日期區間)，並 JOIN 課程、教練、會員名稱
         """
         sql = """
-            DELETE FROM booking
-            WHERE courseid = %s AND scheduledate = %s AND timeslot = %s AND memberid = %s;
+            SELECT
+                b.scheduledate, b.timeslot, b.courseid, c.coursename,
+                cs.coachid, co.cname, b.memberid, m.mname
+            FROM booking b
+            JOIN courseschedule cs ON b.courseid = cs.courseid
+                                  AND b.scheduledate = cs.scheduledate
+                                  AND b.timeslot = cs.timeslot
+            JOIN course c ON b.courseid = c.courseid
+            JOIN coach co ON cs.coachid = co.coachid
+            JOIN sportmember m ON b.memberid = m.memberid
+            WHERE (%(start)s::date IS NULL OR b.scheduledate >= %(start)s::date)
+              AND (%(end)s::date IS NULL OR b.scheduledate <= %(end)s::date)
+            ORDER BY b.scheduledate, b.timeslot, b.courseid, b.memberid
         """
-        return DB.execute_input(sql, (courseId, scheduleDate, timeSlot, memberId))
+        return DB.stream(sql, {"start": start_date, "end": end_date})
 
     @staticmethod
     def check_schedule_in_use(courseid, scheduledate, timeslot):
@@ -494,6 +1368,144 @@ class Booking:
         return DB.fetchone(sql, (courseid, scheduledate, timeslot))
 
 
+class WaitlistResult(NamedTuple):
+    """
+    Waitlist.join 的回傳結果。
+    status 為 Booking.BOOKED (有空位，直接預約成功) / Booking.ALREADY_BOOKED / Booking.NOT_FOUND /
+    Waitlist.WAITLISTED / Waitlist.ALREADY_WAITLISTED 其中之一，
+    position 為在候補名單中的順位 (1 起算，沒有在候補時為 None)。
+    """
+    status: str
+    position: Optional[int]
+    current_count: int
+    limit: Optional[int]
+
+
+# 目前人數與會員是否已預約 (Waitlist.join 補位後使用)
+BOOKING_STATE_SQL = """
+    SELECT COUNT(*), COALESCE(BOOL_OR(memberid = %(memberid)s), FALSE)
+    FROM booking
+    WHERE courseid = %(courseid)s AND scheduledate = %(scheduledate)s
+      AND timeslot = %(timeslot)s;
+"""
+
+INSERT_BOOKING_SQL = (
+    "INSERT INTO booking (courseid, scheduledate, timeslot, memberid) "
+    "VALUES (%(courseid)s, %(scheduledate)s, %(timeslot)s, %(memberid)s);"
+)
+
+JOIN_WAITLIST_SQL = """
+    INSERT INTO waitlist (courseid, scheduledate, timeslot, memberid)
+    VALUES (%(courseid)s, %(scheduledate)s, %(timeslot)s, %(memberid)s)
+    ON CONFLICT DO NOTHING;
+"""
+
+LEAVE_WAITLIST_SQL = """
+    DELETE FROM waitlist
+    WHERE courseid = %s AND scheduledate = %s AND timeslot = %s AND memberid = %s
+    RETURNING 1;
+"""
+
+WAITLIST_BY_MEMBER_SQL = """
+    SELECT me.courseid, me.scheduledate, me.timeslot, COUNT(*)
+    FROM waitlist me
+    JOIN waitlist w ON w.courseid = me.courseid AND w.scheduledate = me.scheduledate
+                   AND w.timeslot = me.timeslot AND w.seq <= me.seq
+    WHERE me.memberid = %s AND me.scheduledate >= CURRENT_DATE
+    GROUP BY me.courseid, me.scheduledate, me.timeslot
+    ORDER BY me.scheduledate, me.timeslot;
+"""
+
+
+class Waitlist:
+    """
+    額滿課程時段的候補名單。依 seq (加入順序) 排隊，
+    有人取消時 Booking.cancel 在同一個交易中把名額補給下一位。
+    waitlist 表由 migrations/005_waitlist.sql 建立 (flask migrate)。
+    """
+
+    WAITLISTED = "waitlisted"
+    ALREADY_WAITLISTED = "already_waitlisted"
+    LEFT = "left"
+    NOT_WAITLISTED = "not_waitlisted"
+
+    @staticmethod
+    def join(courseId, scheduleDate, timeSlot, memberId):
+        """
+        加入候補。與 Booking.book 一樣先鎖住該時段並補上空位；
+        補完仍有空位 (候補名單已空) 時直接預約，否則排到候補名單最後。
+        """
+        params = {
+            "courseid": courseId,
+            "scheduledate": scheduleDate,
+            "timeslot": timeSlot,
+            "memberid": memberId,
+        }
+        with DB.transaction() as cursor:
+            cursor.execute(LOCK_SCHEDULE_SQL, params)
+            row = cursor.fetchone()
+            if row is None:
+                return WaitlistResult(Booking.NOT_FOUND, None, 0, None)
+            limit = row[0]
+
+            cursor.execute(PROMOTE_WAITLIST_SQL, params)
+            cursor.execute(BOOKING_STATE_SQL, params)
+            count, mine = cursor.fetchone()
+
+            if mine:
+                result = WaitlistResult(Booking.ALREADY_BOOKED, None, count, limit)
+            elif limit is None or count < limit:
+                cursor.execute(INSERT_BOOKING_SQL, params)
+                result = WaitlistResult(Booking.BOOKED, None, count + 1, limit)
+            else:
+                cursor.execute(JOIN_WAITLIST_SQL, params)
+                status = Waitlist.WAITLISTED if cursor.rowcount else Waitlist.ALREADY_WAITLISTED
+                cursor.execute(Waitlist.POSITION_SQL, params)
+                result = WaitlistResult(status, cursor.fetchone()[0], count, limit)
+
+        WEEK_GRID_CACHE.set_count(courseId, scheduleDate, timeSlot, result.current_count)
+        return result
+
+    POSITION_SQL = """
+        SELECT COUNT(*)
+        FROM waitlist w
+        JOIN waitlist me ON me.courseid = w.courseid AND me.scheduledate = w.scheduledate
+                        AND me.timeslot = w.timeslot AND w.seq <= me.seq
+        WHERE me.courseid = %(courseid)s AND me.scheduledate = %(scheduledate)s
+          AND me.timeslot = %(timeslot)s AND me.memberid = %(memberid)s;
+    """
+
+    @staticmethod
+    def leave(courseId, scheduleDate, timeSlot, memberId):
+        """
+        退出候補，回傳 Waitlist.LEFT / NOT_WAITLISTED
+        """
+        with DB.transaction() as cursor:
+            cursor.execute(LEAVE_WAITLIST_SQL, (courseId, scheduleDate, timeSlot, memberId))
+            left = cursor.fetchone() is not None
+        return Waitlist.LEFT if left else Waitlist.NOT_WAITLISTED
+
+    @staticmethod
+    def position(courseId, scheduleDate, timeSlot, memberId):
+        """
+        會員在該時段候補名單中的順位 (1 起算)；不在名單中回傳 0
+        """
+        params = {
+            "courseid": courseId,
+            "scheduledate": scheduleDate,
+            "timeslot": timeSlot,
+            "memberid": memberId,
+        }
+        return DB.fetchone(Waitlist.POSITION_SQL, params)[0]
+
+    @staticmethod
+    def get_by_member(memberId):
+        """
+        會員目前 (未來時段) 的所有候補與順位：(courseid, scheduledate, timeslot, position)
+        """
+        return DB.fetchall(WAITLIST_BY_MEMBER_SQL, (memberId,))
+
+
 class ConfirmSQL:
     """
     管理與 Confirm (合約確認) 資料表相關的 SQL 查詢
@@ -504,13 +1516,17 @@ class ConfirmSQL:
         """
         在 Confirm 表中新增一筆紀錄。
         startDate 設為 NOW()。
-        endDate 設為 NOW() + 'X months'。
+        endDate 設為 NOW() + 'X months'，X 必須是整數月 ('12' 這樣的字串也可以)，
+        否則丟出 ValueError 而不寫入 (1.5 * INTERVAL '1 month' 會變成 1 個月又 15 天)。
         """
+        months = int(period_months)
+        if months != float(period_months):
+            raise ValueError(f"方案週期必須是整數月: {period_months!r}")
         sql = """
             INSERT INTO Confirm (planId, memberId, startDate, endDate, paymentType)
-            VALUES (%s, %s, NOW(), NOW() + (%s * INTERVAL '1 month'), %s)
+            VALUES (%s, %s, NOW(), NOW() + make_interval(months => %s), %s)
         """
-        params = (planId, memberId, period_months, paymentType)
+        params = (planId, memberId, months, paymentType)
         return DB.execute_input(sql, params)
 
     @staticmethod
@@ -522,55 +1538,128 @@ class ConfirmSQL:
         return DB.fetchone(sql, (planId,))
 
 
+class Rollup:
+    """
+    後台儀表板用的彙總表 (rollup)，由 migrations/006_dashboard_rollups.sql 建立：
+      rollup_daily_revenue   每日營收 / 訂單數
+      rollup_member_sales    每位會員的消費總額 / 訂單數
+      rollup_category_sales  每個商品類別的銷售額（只計已成立訂單的 record）
+
+    order_list / record 上的 trigger 在寫入訂單的同一個交易中增減彙總值，
+    新增、修改、刪除訂單都會反映，讀取前不需要再 refresh。
+    """
+
+    @staticmethod
+    def rebuild():
+        """
+        清空彙總表並從頭重算（資料修正、商品改類別時使用），回傳訂單數。
+        重算期間訂單寫入會等待。
+        """
+        with DB.transaction() as cursor:
+            cursor.execute("SELECT rollup_rebuild()")
+            count = cursor.fetchone()[0]
+        PAGE_CACHE.invalidate("analysis.dashboard")
+        return count
+
+
 class Analysis:
+    """
+    儀表板查詢，全部讀 Rollup 的彙總表，延遲不會隨訂單歷史增加而變長。
+    """
+
+    @staticmethod
+    def monthly_summary(year=None, start_date=None, end_date=None):
+        """
+        一次 GROUP BY 算出 1~12 月的營收與訂單數，沒有訂單的月份補 0。
+        回傳 12 筆 (month, revenue, count)，依月份排序。
+
+        year 指定某一年；或用 start_date / end_date（含頭不含尾）指定區間。
+        都不給時維持舊行為：所有年份的同一個月份合併計算。
+        """
+        if year is not None:
+            start_date = date(int(year), 1, 1)
+            end_date = date(int(year) + 1, 1, 1)
+
+        conditions = []
+        params = []
+        if start_date is not None:
+            conditions.append("day >= %s")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("day < %s")
+            params.append(end_date)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        sql = f"""
+            SELECT m.month, COALESCE(r.revenue, 0), COALESCE(r.cnt, 0)
+            FROM generate_series(1, 12) AS m(month)
+            LEFT JOIN (
+                SELECT EXTRACT(MONTH FROM day)::int AS month,
+                       SUM(revenue) AS revenue,
+                       SUM(order_count) AS cnt
+                FROM rollup_daily_revenue
+                {where}
+                GROUP BY 1
+            ) r ON r.month = m.month
+            ORDER BY m.month
+        """
+        return DB.fetchall(sql, params)
+
+    @staticmethod
+    def stream_orders(start_date=None, end_date=None):
+        """
+        匯出用：逐批回傳 order_list (可限定日期區間，含頭尾兩天)
+        """
+        sql = """
+            SELECT oid, mid, ordertime, price
+            FROM order_list
+            WHERE (%(start)s::date IS NULL OR ordertime >= %(start)s::date)
+              AND (%(end)s::date IS NULL OR ordertime < %(end)s::date + 1)
+            ORDER BY ordertime, oid
+        """
+        return DB.stream(sql, {"start": start_date, "end": end_date})
+
     @staticmethod
     def month_price(i):
         sql = (
-            "SELECT EXTRACT(MONTH FROM ordertime), SUM(price) "
-            "FROM order_list "
-            "WHERE EXTRACT(MONTH FROM ordertime) = %s "
-            "GROUP BY EXTRACT(MONTH FROM ordertime)"
+            "SELECT EXTRACT(MONTH FROM day), SUM(revenue) "
+            "FROM rollup_daily_revenue "
+            "WHERE EXTRACT(MONTH FROM day) = %s "
+            "GROUP BY EXTRACT(MONTH FROM day)"
         )
         return DB.fetchall(sql, (i,))
 
     @staticmethod
     def month_count(i):
         sql = (
-            "SELECT EXTRACT(MONTH FROM ordertime), COUNT(oid) "
-            "FROM order_list "
-            "WHERE EXTRACT(MONTH FROM ordertime) = %s "
-            "GROUP BY EXTRACT(MONTH FROM ordertime)"
+            "SELECT EXTRACT(MONTH FROM day), SUM(order_count) "
+            "FROM rollup_daily_revenue "
+            "WHERE EXTRACT(MONTH FROM day) = %s "
+            "GROUP BY EXTRACT(MONTH FROM day)"
         )
         return DB.fetchall(sql, (i,))
 
     @staticmethod
     def category_sale():
-        sql = (
-            "SELECT SUM(total), category "
-            "FROM product, record "
-            "WHERE product.pid = record.pid "
-            "GROUP BY category"
-        )
+        sql = "SELECT total, category FROM rollup_category_sales"
         return DB.fetchall(sql)
 
     @staticmethod
     def member_sale():
         sql = (
-            "SELECT SUM(price), member.mid, member.name "
-            "FROM order_list, member "
-            "WHERE order_list.mid = member.mid AND member.identity = %s "
-            "GROUP BY member.mid, member.name "
-            "ORDER BY SUM(price) DESC"
+            "SELECT r.revenue, member.mid, member.name "
+            "FROM rollup_member_sales r, member "
+            "WHERE r.mid = member.mid AND member.identity = %s "
+            "ORDER BY r.revenue DESC"
         )
         return DB.fetchall(sql, ("user",))
 
     @staticmethod
     def member_sale_count():
         sql = (
-            "SELECT COUNT(*), member.mid, member.name "
-            "FROM order_list, member "
-            "WHERE order_list.mid = member.mid AND member.identity = %s "
-            "GROUP BY member.mid, member.name "
-            "ORDER BY COUNT(*) DESC"
+            "SELECT r.order_count, member.mid, member.name "
+            "FROM rollup_member_sales r, member "
+            "WHERE r.mid = member.mid AND member.identity = %s "
+            "ORDER BY r.order_count DESC"
         )
         return DB.fetchall(sql, ("user",))
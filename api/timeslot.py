@@ -0,0 +1,109 @@
+from datetime import date, datetime, time
+from functools import lru_cache, total_ordering
+
+# ------------------------------------------------------------
+# 課程時段 (timeSlot) 的結構化表示
+#
+# 資料庫中 timeSlot 是 "07:15-08:15" 這樣的字串；這裡解析成開始 / 結束時間，
+# 排序、判斷是否已過、判斷是否重疊都用解析後的值，不再每次切字串或 strptime。
+# 同樣的字串只會解析一次（lru_cache），回傳的是不可變的共用物件。
+# ------------------------------------------------------------
+
+
+@total_ordering
+class TimeSlot:
+    __slots__ = ("text", "start", "end")
+
+    def __init__(self, text: str, start: time, end: time):
+        self.text = text
+        self.start = start
+        self.end = end
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def parse(text: str) -> "TimeSlot":
+        """
+        解析 "HH:MM-HH:MM"；格式錯誤或結束時間不晚於開始時間時丟出 ValueError
+        """
+        try:
+            start_text, end_text = text.split("-")
+            start = _parse_time(start_text)
+            end = _parse_time(end_text)
+        except (AttributeError, ValueError):
+            raise ValueError(f"時段格式錯誤 '{text}'，應為 HH:MM-HH:MM") from None
+        if end <= start:
+            raise ValueError(f"時段 '{text}' 的結束時間必須晚於開始時間")
+        return TimeSlot(text, start, end)
+
+    def start_on(self, day: date) -> datetime:
+        return datetime.combine(day, self.start)
+
+    def is_past(self, day: date, now: datetime) -> bool:
+        """
+        該日的這個時段是否已開始（已開始就不能再預約）
+        """
+        return now > self.start_on(day)
+
+    def overlaps(self, other: "TimeSlot") -> bool:
+        return self.start < other.end and other.start < self.end
+
+    def _key(self):
+        return (self.start, self.end)
+
+    def __eq__(self, other):
+        if not isinstance(other, TimeSlot):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __lt__(self, other):
+        if not isinstance(other, TimeSlot):
+            return NotImplemented
+        return self._key() < other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"TimeSlot({self.text!r})"
+
+
+def _parse_time(text: str) -> time:
+    hour, minute = text.strip().split(":")
+    return time(int(hour), int(minute))
+
+
+def slot_sort_key(text: str):
+    """
+    時段字串的排序鍵：依實際開始 / 結束時間排序；無法解析的排在最後 (依字串)
+    """
+    try:
+        slot = TimeSlot.parse(text)
+        return (0, slot.start, slot.end, text)
+    except ValueError:
+        return (1, time.min, time.min, text)
+
+
+def find_overlaps(items):
+    """
+    items: [(resource, day, TimeSlot, tag), ...]，resource 例如 ('coach', 'c0001')
+    找出同一個 resource 同一天時段重疊的課，回傳 [(先開始的 tag, 後開始的 tag), ...]。
+
+    依 (resource, day, 開始時間) 排序後掃一次，只記住目前結束得最晚的那一堂：
+    下一堂的開始時間早於它的結束時間就是重疊。排序 O(n log n)，掃描 O(n)，
+    每一堂與前面任何一堂重疊都會被找出來（配對對象是結束最晚的那一堂）。
+    """
+    pairs = []
+    group = None
+    latest = None  # (TimeSlot, tag)
+    for resource, day, slot, tag in sorted(items, key=lambda i: (i[0], i[1], i[2].start, i[2].end)):
+        if (resource, day) != group:
+            group = (resource, day)
+            latest = None
+        elif slot.overlaps(latest[0]):
+            pairs.append((latest[1], tag))
+        if latest is None or slot.end > latest[0].end:
+            latest = (slot, tag)
+    return pairs
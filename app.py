@@ -1,4 +1,5 @@
 import re, os, random, string
+import click
 from typing_extensions import Self
 from flask import Flask, request, template_rendered, Blueprint, url_for, redirect, flash, render_template
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
@@ -7,6 +8,7 @@ from datetime import datetime
 from sqlalchemy import null
 from api.api import *
 from api.sql import *
+from api import bulk, explain, migrate, seed
 from backstage.views.analysis import *
 from backstage.views.manager import *
 from booking.views.frontdesk import *
@@ -30,6 +32,75 @@ def index():
     return render_template('index.html')
 
 
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups():
+    """清空後台儀表板的彙總表並從頭重算（平常由 trigger 即時更新，不需要排程）"""
+    count = Rollup.rebuild()
+    click.echo(f'已重算 {count} 筆訂單')
+
+
+@app.cli.command('migrate')
+def run_migrations():
+    """依序執行 migrations/ 內尚未執行的 SQL 檔"""
+    ran = migrate.migrate()
+    for filename in ran:
+        click.echo(f'已執行 {filename}')
+    if not ran:
+        click.echo('資料庫已是最新版本')
+
+
+@app.cli.command('seed-data')
+@click.option('--members', default=5000, show_default=True)
+@click.option('--coaches', default=40, show_default=True)
+@click.option('--courses', default=120, show_default=True)
+@click.option('--weeks', default=26, show_default=True, help='以今天為中心產生幾週的課表')
+@click.option('--bookings', default=15, show_default=True, help='每個時段的預約數')
+def seed_data(members, coaches, courses, weeks, bookings):
+    """匯入大量測試資料（只在本機 / 測試資料庫使用），可重複執行"""
+    counts = seed.seed(members=members, coaches=coaches, courses=courses, weeks=weeks, bookings=bookings)
+    for table, count in counts.items():
+        click.echo(f'{table}: {count} 列')
+
+
+@app.cli.command('explain-queries')
+@click.option('--min-rows', default=1000, show_default=True, help='超過此列數的表不允許 Seq Scan')
+def explain_queries(min_rows):
+    """以 EXPLAIN ANALYZE 檢查 api/sql.py 的所有查詢，有大表全表掃描或呼叫失敗時以非 0 結束"""
+    result = explain.check(min_rows)
+    for name, reason in result.skipped:
+        click.echo(f'{name}: 略過 ({reason})')
+    for name, message in result.errors:
+        click.echo(f'{name}: 執行失敗 ({message})', err=True)
+    for name, table, rows in result.failures:
+        click.echo(f'{name}: Seq Scan on {table} (約 {rows} 列)')
+    if result.failures or result.errors:
+        raise SystemExit(1)
+    checked = len(explain.QUERIES) - len(result.skipped)
+    click.echo(f'{checked} 個查詢皆未對大表做全表掃描')
+
+
+@app.cli.command('import-csv')
+@click.argument('table', type=click.Choice(sorted(bulk.TABLES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=bulk.BATCH_SIZE, show_default=True)
+def import_csv(table, path, batch_size):
+    """以 COPY 大量匯入會員 / 課程 / 課程時段 CSV（需有標題列）"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        inserted, duplicates, rejects = bulk.import_csv(table, f, batch_size)
+    for line, reason in rejects:
+        click.echo(f'第 {line} 行：{reason}', err=True)
+    click.echo(f'新增 {inserted} 筆，主鍵重複略過 {duplicates} 筆，格式錯誤 {len(rejects)} 筆')
+
+
+@app.cli.command('export-csv')
+@click.argument('table', type=click.Choice(sorted(bulk.TABLES)))
+@click.option('-o', '--output', default='-', help='輸出檔案，預設為標準輸出')
+def export_csv(table, output):
+    """以 COPY TO 串流匯出會員 / 課程 / 課程時段 CSV"""
+    with click.open_file(output, 'w', encoding='utf-8', newline='') as f:
+        bulk.export_csv(table, f)
+
+
 if __name__ == '__main__':
     app.debug = True
     app.secret_key = "Your Key"
@@ -1,33 +1,35 @@
-from flask import render_template, Blueprint
+from functools import partial
+from flask import render_template, Blueprint, request
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from link import *
-from api.sql import Analysis
+from api.sql import DB, Analysis
+from api.cache import PAGE_CACHE
 
 analysis = Blueprint('analysis', __name__, template_folder='../templates')
 
 @analysis.route('/dashboard')
 @login_required
+@PAGE_CACHE.cached()
 def dashboard():
+    # ?year=2024 只看某一年；不指定則所有年份依月份合併（與原本相同）
+    year = request.args.get('year', type=int)
+
+    # 四個查詢彼此獨立，同時送出（各用一條連線），頁面等待時間約等於最慢的那個；
+    # 連線池忙碌時 DB.gather 改為依序執行
+    summary, category, member, member_count = DB.gather(
+        partial(Analysis.monthly_summary, year=year),
+        Analysis.category_sale,
+        Analysis.member_sale,
+        Analysis.member_sale_count,
+    )
+
     revenue = []
     dataa = []
-    for i in range(1,13):
-        row = Analysis.month_price(i)
-
-        if not row:
-            revenue.append(0)
-        else:
-            for j in row:
-                revenue.append(j[1])
-        
-        row = Analysis.month_count(i)
-        
-        if not row:
-            dataa.append(0)
-        else:
-            for k in row:
-                dataa.append(k[1])
+    for month, total, count in summary:
+        revenue.append(total)
+        dataa.append(count)
         
-    row = Analysis.category_sale()
+    row = category
     datab = []
     for i in row:
         temp = {
@@ -36,7 +38,7 @@ def dashboard():
         }
         datab.append(temp)
     
-    row = Analysis.member_sale()
+    row = member
     
     datac = []
     nameList = []
@@ -50,7 +52,7 @@ def dashboard():
     
     counter = counter - 1
     
-    row = Analysis.member_sale_count()
+    row = member_count
     countList = []
     
     for i in row:
@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template, request, url_for, redirect, flash
+from flask import Blueprint, render_template, request, url_for, redirect, flash, jsonify, Response, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from link import *
 from api.sql import *
+from api.cache import PAGE_CACHE, USER_CACHE, WEEK_GRID_CACHE
+from api.timeslot import TimeSlot
+from api.seats import SEAT_FEED
 from werkzeug.utils import secure_filename
 from flask import current_app
-from datetime import datetime
+from datetime import datetime, timedelta
+import csv
+import io
 
 UPLOAD_FOLDER = 'static/product'
 ALLOWED_EXTENSIONS = set(['png', 'jpg', 'jpeg'])
@@ -23,6 +28,7 @@ def home():
 
 @manager.route('/courseManager', methods=['GET', 'POST'])
 @login_required
+@PAGE_CACHE.cached(bypass_args=('delete', 'edit'))
 def courseManager():
     if request.method == 'GET':
         if(current_user.role == 'user'):
@@ -39,6 +45,7 @@ def courseManager():
             return redirect(url_for('manager.courseManager'))
         try:
             Course.delete_course(courseid)
+            PAGE_CACHE.invalidate('manager.courseManager', 'manager.courseSchedule')
             flash('課程已成功刪除', 'success')
         except Exception as e:
             # 捕捉其他可能的資料庫錯誤
@@ -97,6 +104,7 @@ def add():
              'studentlimit' : qtylimit
             }
         )
+        PAGE_CACHE.invalidate('manager.courseManager', 'manager.courseSchedule')
 
         return redirect(url_for('manager.courseManager'))
 
@@ -114,6 +122,7 @@ def edit():
                 'studentlimit' : request.values.get('qtylimit')
             }
         )
+        PAGE_CACHE.invalidate('manager.courseManager', 'manager.courseSchedule')
         return redirect(url_for('manager.courseManager'))
     
     if request.method == 'GET':
@@ -159,6 +168,7 @@ def show_info(courseid):
 
 @manager.route('/courseSchedule', methods=['GET', 'POST'])
 @login_required 
+@PAGE_CACHE.cached()
 def courseSchedule():
     
     # --- 處理 POST 請求 (新增排程) ---
@@ -173,7 +183,7 @@ def courseSchedule():
             course_id = request.values.get('courseid')
             coach_id = request.values.get('coachid')
             schedule_date_str = request.values.get('scheduledate')
-            time_slot = request.values.get('timeslot')
+            time_slot = TimeSlot.parse(request.values.get('timeslot')).text # 格式錯誤會丟出 ValueError
 
             # 2. 轉換 DDL 需要的欄位
             date_obj = datetime.strptime(schedule_date_str, '%Y-%m-%d')
@@ -192,6 +202,7 @@ def courseSchedule():
             
             # 4. 呼叫 sql.py 的方法
             CourseSchedule.create(schedule_data)
+            PAGE_CACHE.invalidate('manager.courseSchedule')
             flash('課程時段新增成功！', 'success')
 
         except Exception as e:
@@ -209,17 +220,65 @@ def courseSchedule():
         # 1. 呼叫輔助函式來獲取格式化後的資料
         courses_list = get_all_courses_for_dropdown()
         coaches_list = get_all_coaches_for_dropdown()
-        schedules_list = get_all_schedules_list()
+        schedules_list, filters, next_page = get_schedules_page(request.args)
             
         # 2. 渲染模板
         return render_template(
             'courseSchedule.html', 
             courses=courses_list, 
             coaches=coaches_list, 
-            schedules=schedules_list
+            schedules=schedules_list,
+            filters=filters,
+            next_page=next_page
         )
 
 
+@manager.route('/courseSchedule/recurring', methods=['POST'])
+@login_required
+def courseSchedule_recurring():
+    """
+    一次排定整期的重複課程：課程、教練、星期幾 (可複選)、時段、起訖日期、略過日期
+    """
+    if current_user.role not in ('coach', 'manager'):
+        flash('No permission')
+        return redirect(url_for('manager.courseSchedule'))
+
+    try:
+        course_id = request.values.get('courseid')
+        coach_id = request.values.get('coachid')
+        time_slot = TimeSlot.parse(request.values.get('timeslot')).text
+        weekdays = request.form.getlist('weekdays')  # 1=週一 ... 7=週日
+        start_date = datetime.strptime(request.values.get('startdate'), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.values.get('enddate'), '%Y-%m-%d').date()
+
+        # 略過日期：以逗號或換行分隔，例如 "2025-01-01, 2025-02-28"
+        skip_text = request.values.get('skipdates', '').replace('\n', ',')
+        skip_dates = [
+            datetime.strptime(d.strip(), '%Y-%m-%d').date()
+            for d in skip_text.split(',') if d.strip()
+        ]
+
+        if not weekdays:
+            flash('請至少選擇一個星期', 'error')
+            return redirect(url_for('manager.courseSchedule'))
+        if end_date < start_date or (end_date - start_date).days > 366:
+            flash('日期區間錯誤（結束日需在開始日之後，且不超過一年）', 'error')
+            return redirect(url_for('manager.courseSchedule'))
+
+        dates = CourseSchedule.expand_recurring(start_date, end_date, weekdays, skip_dates)
+        created, conflicts = CourseSchedule.create_recurring(course_id, coach_id, time_slot, dates)
+        PAGE_CACHE.invalidate('manager.courseSchedule')
+
+        flash(f'已新增 {len(created)} 個課程時段', 'success')
+        if conflicts:
+            flash('以下日期該時段已存在，或與同教練 / 同教室的課程重疊，已略過：' + ', '.join(d.isoformat() for d in conflicts), 'warning')
+
+    except Exception as e:
+        flash(f'新增失敗：{e}', 'error')
+
+    return redirect(url_for('manager.courseSchedule'))
+
+
 @manager.route('/courseSchedule/delete', methods=['POST'])
 @login_required 
 def delete_courseSchedule():         
@@ -237,6 +296,7 @@ def delete_courseSchedule():
 
         # 23. 呼叫 sql.py 的方法
         CourseSchedule.delete(course_id, schedule_date, time_slot)
+        PAGE_CACHE.invalidate('manager.courseSchedule')
         flash('課程時段已刪除')
         
     except Exception as e:
@@ -247,6 +307,7 @@ def delete_courseSchedule():
 
 @manager.route('/plan', methods=['GET', 'POST'])
 @login_required 
+@PAGE_CACHE.cached()
 def plan():
     if request.method == 'POST':
         # 權限檢查 (範例：假設 'coach' 或 'manager' 才能新增)
@@ -264,6 +325,7 @@ def plan():
             
             # 2. 呼叫修改過的 sql.py 方法ㄗㄣ
             Plan.add_plan(input_data)
+            PAGE_CACHE.invalidate('manager.plan')
             flash('合約方案新增成功！', 'success')
 
         except Exception as e:
@@ -302,6 +364,7 @@ def delete_plan():
         
         # 2. 呼叫 sql.py 的方法
         Plan.delete_plan(plan_id)
+        PAGE_CACHE.invalidate('manager.plan')
         flash('合約方案已刪除', 'success')
         
     except Exception as e:
@@ -310,22 +373,157 @@ def delete_plan():
 
     return redirect(url_for('manager.plan'))
 
+@manager.route('/export/bookings', methods=['GET'])
+@login_required
+def export_bookings():
+    """
+    串流匯出預約紀錄 CSV，可加 ?start=YYYY-MM-DD&end=YYYY-MM-DD
+    """
+    if current_user.role not in ('coach', 'manager'):
+        flash('No permission')
+        return redirect(url_for('index'))
+
+    try:
+        start, end = parse_export_range(request.args)
+    except ValueError as e:
+        return str(e), 400
+
+    rows = Booking.stream_history(start, end)
+    header = ['scheduledate', 'timeslot', 'courseid', 'coursename', 'coachid', 'cname', 'memberid', 'mname']
+    return csv_response('bookings.csv', header, rows)
+
+
+@manager.route('/export/orders', methods=['GET'])
+@login_required
+def export_orders():
+    """
+    串流匯出 order_list CSV，可加 ?start=YYYY-MM-DD&end=YYYY-MM-DD
+    """
+    if current_user.role not in ('coach', 'manager'):
+        flash('No permission')
+        return redirect(url_for('index'))
+
+    try:
+        start, end = parse_export_range(request.args)
+    except ValueError as e:
+        return str(e), 400
+
+    rows = Analysis.stream_orders(start, end)
+    return csv_response('orders.csv', ['oid', 'mid', 'ordertime', 'price'], rows)
+
+
+def parse_export_range(args):
+    """
+    匯出的 ?start / ?end (YYYY-MM-DD，可省略) 轉成 date。
+    必須在開始串流前檢查：回應標頭送出後就無法再回傳錯誤狀態。
+    格式錯誤或 start 晚於 end 時丟出 ValueError
+    """
+    dates = []
+    for name in ('start', 'end'):
+        value = args.get(name)
+        try:
+            dates.append(datetime.strptime(value, '%Y-%m-%d').date() if value else None)
+        except ValueError:
+            raise ValueError(f'{name} 日期格式錯誤，請使用 YYYY-MM-DD') from None
+    start, end = dates
+    if start and end and start > end:
+        raise ValueError('start 不可晚於 end')
+    return start, end
+
+
+def csv_response(filename, header, rows, chunk_rows=1000):
+    """
+    把 rows (generator) 轉成分段送出的 CSV 回應，每 chunk_rows 筆送出一次，
+    第一段 (標題列) 會立刻送出，不必等查詢全部跑完
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if count % chunk_rows == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@manager.route('/cacheStats', methods=['GET'])
+@login_required
+def cache_stats():
+    """
+    快取命中率（頁面快取 / user_loader 快取），用於監控
+    """
+    if current_user.role not in ('coach', 'manager'):
+        flash('No permission')
+        return redirect(url_for('index'))
+
+    return jsonify({
+        'page_cache': PAGE_CACHE.stats(),
+        'user_cache': USER_CACHE.stats(),
+        'week_grid_cache': WEEK_GRID_CACHE.stats(),
+        'seat_feed': SEAT_FEED.stats()
+    })
+
 # ==========================================================
 # 輔助函式 (View Helpers)
 # (依照您的 show_info 風格，用來格式化從 sql.py 取得的資料)
 # ==========================================================
 
-def get_all_schedules_list():
+SCHEDULE_PAGE_SIZE = 50
+SCHEDULE_DEFAULT_WEEKS = 4
+
+def get_schedules_page(args):
     """
-    獲取並格式化所有排程，用於模板
+    依 query string 查一頁排程 (預設：今天起 SCHEDULE_DEFAULT_WEEKS 週)，用於模板。
+    參數：start / end (YYYY-MM-DD)、coachid、courseid、
+          after_date / after_slot / after_course (上一頁最後一筆，keyset 分頁)
+    回傳 (排程列表, 目前的篩選條件, 下一頁的 query 參數或 None)
     """
-    raw_data = CourseSchedule.get_all_joined() # 呼叫 sql.py 的方法
+    today = datetime.now().date()
+    try:
+        start_date = datetime.strptime(args.get('start'), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        start_date = today
+    try:
+        end_date = datetime.strptime(args.get('end'), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        end_date = start_date + timedelta(weeks=SCHEDULE_DEFAULT_WEEKS)
+    start, end = start_date.isoformat(), end_date.isoformat()
+    filters = {
+        'start': start,
+        'end': end,
+        'coachid': args.get('coachid', ''),
+        'courseid': args.get('courseid', '')
+    }
+
+    after = parse_page_cursor(args)
+
+    raw_data, last = CourseSchedule.list_window(
+        start_date,
+        end_date,
+        coachid=filters['coachid'] or None,
+        courseid=filters['courseid'] or None,
+        after=after,
+        limit=SCHEDULE_PAGE_SIZE
+    )
+
     schedules = []
-    if not raw_data:
-        return []
-    
     for row in raw_data:
-        # 索引對應 get_all_joined() 的 SELECT 順序
+        # 索引對應 list_window() 的 SELECT 順序
         schedules.append({
             'courseid': row[0],
             'scheduledate': row[1],
@@ -333,7 +531,28 @@ def get_all_schedules_list():
             'coursename': row[3],
             'cname': row[4]
         })
-    return schedules
+
+    next_page = None
+    if last:
+        next_page = dict(filters, after_date=last[0].isoformat(), after_slot=last[1], after_course=last[2])
+    return schedules, filters, next_page
+
+def parse_page_cursor(args):
+    """
+    after_date / after_slot / after_course 轉成 list_window 的 after；
+    缺少或格式不對 (不是 get_schedules_page 產生的連結) 時回傳 None，從第一頁開始
+    """
+    after_slot = args.get('after_slot')
+    after_course = args.get('after_course')
+    try:
+        after_date = datetime.strptime(args.get('after_date'), '%Y-%m-%d').date()
+        TimeSlot.parse(after_slot)
+    except (TypeError, ValueError):
+        return None
+    # courseid 是 CHAR(6)
+    if not after_course or len(after_course) > 6:
+        return None
+    return (after_date, after_slot, after_course)
 
 def get_all_courses_for_dropdown():
     """
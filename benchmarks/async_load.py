@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from api import aiosql
+from api.sql import DB, DB_POOL_MAX, CourseSchedule, Booking, Waitlist
+from benchmarks.common import report
+
+# ------------------------------------------------------------
+# 500 位會員同時打開預約首頁：同步 (psycopg2 + 執行緒) vs asyncio (asyncpg)
+#
+# 每位會員要 4 個查詢：一週排程、每格人數、自己的預約、自己的候補
+# (不經過 WEEK_GRID_CACHE，量的是資料庫存取本身)。
+#
+#   sync threads   每位會員一個執行緒，依序送出 4 個查詢 (gthread worker 的情況)
+#   async gather   每位會員一個 task，aiosql.load_member_week 同時送出 4 個查詢
+#
+# 兩邊的連線池上限相同 (DB_POOL_MAX)，比較的是同樣連線數下的吞吐量與延遲。
+# 需要 asyncpg，並請先 flask seed-data (會員數至少 --users 位比較接近真實)：
+#   python -m benchmarks.async_load --users 500 --rounds 3
+# ------------------------------------------------------------
+
+
+def sync_member_week(member_id, week_start):
+    week_end = week_start + timedelta(days=6)
+    return (
+        CourseSchedule.get_schedules_by_week(week_start, week_end),
+        Booking.counts_for_range(week_start, week_end),
+        Booking.get_bookings_by_member(member_id),
+        Waitlist.get_by_member(member_id),
+    )
+
+
+def run_sync(members, week_start):
+    """
+    回傳 (每位會員的延遲 ms, 失敗數, 總耗時秒)
+    """
+    def one(member_id):
+        start = time.perf_counter()
+        try:
+            sync_member_week(member_id, week_start)
+        except Exception:
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(members)) as executor:
+        results = list(executor.map(one, members))
+    elapsed = time.perf_counter() - started
+    samples = [r for r in results if r is not None]
+    return samples, len(results) - len(samples), elapsed
+
+
+async def run_async(members, week_start):
+    async def one(member_id):
+        start = time.perf_counter()
+        try:
+            await aiosql.load_member_week(member_id, week_start)
+        except Exception:
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(m) for m in members))
+    elapsed = time.perf_counter() - started
+    samples = [r for r in results if r is not None]
+    return samples, len(results) - len(samples), elapsed
+
+
+def print_round(name, samples, failures, elapsed):
+    if samples:
+        report(name, samples)
+    print(f"{'':<28} {len(samples) / elapsed:8.1f} 位會員/秒  失敗 {failures}  總耗時 {elapsed:.2f}s")
+
+
+async def async_rounds(members, week_start, rounds):
+    try:
+        # 第一輪先建立連線池，不計
+        await run_async(members[:DB_POOL_MAX], week_start)
+        for _ in range(rounds):
+            print_round("async gather", *await run_async(members, week_start))
+    finally:
+        await aiosql.DB.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同時載入會員首頁：同步執行緒 vs asyncio")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--week-start", help="YYYY-MM-DD，預設為本週一")
+    args = parser.parse_args()
+
+    try:
+        import asyncpg  # noqa: F401
+    except ImportError:
+        raise SystemExit("需要 asyncpg：pip install -r requirements.txt")
+
+    if args.week_start:
+        week_start = date.fromisoformat(args.week_start)
+    else:
+        week_start = date.today() - timedelta(days=date.today().weekday())
+    rows = DB.fetchall("SELECT memberid FROM sportmember ORDER BY memberid LIMIT %s", (args.users,))
+    if not rows:
+        raise SystemExit("sportmember 沒有資料，請先執行 flask seed-data")
+    members = [rows[i % len(rows)][0] for i in range(args.users)]
+    print(f"{args.users} 位會員同時載入 {week_start} 這一週，連線池上限 {DB_POOL_MAX}")
+
+    run_sync(members[:DB_POOL_MAX], week_start)
+    for _ in range(args.rounds):
+        print_round("sync threads", *run_sync(members, week_start))
+
+    asyncio.run(async_rounds(members, week_start, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+
+import psycopg2
+
+from api.api import get_member_by_account, user_loader
+from api.cache import USER_CACHE
+from api.sql import DB, _dsn
+from app import app
+from benchmarks.common import measure, report
+
+# ------------------------------------------------------------
+# 每個請求的登入驗證 (user_loader) 延遲：改用連線池前後比較
+#
+#   connect-per-call   舊做法：每次 psycopg2.connect -> 查詢 -> close
+#   pool               get_member_by_account (DB 連線池)
+#   user_loader        實際每個請求執行的路徑 (USER_CACHE 命中時不查 DB)
+#
+# 請對本機 Postgres 執行 (.env 的連線資訊)，member 表需有 --account 這個帳號：
+#   python -m benchmarks.auth_latency --account demo --iterations 2000
+# ------------------------------------------------------------
+
+LOOKUP_SQL = 'SELECT "fname", "password" FROM member WHERE "account" = %s'
+
+
+def connect_per_call(account):
+    connection = psycopg2.connect(**_dsn())
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(LOOKUP_SQL, (account,))
+            return cursor.fetchone()
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登入驗證延遲：每次連線 vs 連線池")
+    parser.add_argument("--account", help="要查詢的會員帳號，預設取 member 表第一筆")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    account = args.account
+    if account is None:
+        row = DB.fetchone('SELECT "account" FROM member LIMIT 1')
+        if row is None:
+            raise SystemExit("member 表沒有資料，請用 --account 指定或先匯入會員")
+        account = row[0]
+    userid = f"member_{account}"
+
+    # 舊做法每次都要握手，次數少一點就夠看出差距
+    report("connect-per-call", measure(lambda: connect_per_call(account), max(1, args.iterations // 10)))
+    report("pool", measure(lambda: get_member_by_account(account), args.iterations))
+
+    def uncached_loader():
+        USER_CACHE.invalidate(userid)
+        user_loader(userid)
+
+    # user_loader 可能讀 session，需要 request context
+    with app.test_request_context():
+        report("user_loader (cache miss)", measure(uncached_loader, args.iterations))
+        report("user_loader (cache hit)", measure(lambda: user_loader(userid), args.iterations))
+
+
+if __name__ == "__main__":
+    main()
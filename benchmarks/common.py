@@ -0,0 +1,36 @@
+import statistics
+import time
+
+# ------------------------------------------------------------
+# 效能量測共用的小工具 (從專案根目錄以 python -m benchmarks.<名稱> 執行)
+# ------------------------------------------------------------
+
+
+def measure(call, iterations: int, warmup: int = 10):
+    """
+    呼叫 call() iterations 次，回傳每次耗時 (毫秒) 的列表；前 warmup 次不計
+    """
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples, p: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(name: str, samples) -> None:
+    print(
+        f"{name:<28} n={len(samples):<6} "
+        f"mean={statistics.mean(samples):8.3f}ms  "
+        f"p50={percentile(samples, 50):8.3f}ms  "
+        f"p95={percentile(samples, 95):8.3f}ms  "
+        f"p99={percentile(samples, 99):8.3f}ms"
+    )
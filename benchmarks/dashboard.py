@@ -0,0 +1,205 @@
+import argparse
+import os
+import re
+import time
+
+from psycopg2.sql import SQL, Identifier
+
+from api import migrate
+from api.sql import DB, Analysis
+from benchmarks.common import measure, report
+
+# ------------------------------------------------------------
+# 後台儀表板的查詢，在 100 萬筆訂單上比較：
+#
+#   24 queries         最初的做法：1~12 月各查一次營收、一次筆數 (整張 order_list 掃 24 次)
+#   one GROUP BY       一次 GROUP BY 算 12 個月 (直接讀 order_list)
+#   monthly_summary    目前的 Analysis.monthly_summary (讀 trigger 維護的彙總表)
+#   dashboard          儀表板的 4 個查詢：依序執行 vs DB.gather 同時執行
+#   order insert       寫入一筆訂單 + 兩筆明細 (含 rollup trigger 的成本，最後 rollback)
+#
+# 資料放在獨立的 schema (預設 bench_dashboard)，以 PGOPTIONS 設定 search_path，
+# 不會碰到 public 裡的資料。重新匯入時會 DROP SCHEMA ... CASCADE，
+# 所以 --schema 只接受 bench_ 開頭的名稱。第一次執行會建立並匯入資料 (數分鐘)，之後重複使用：
+#   python -m benchmarks.dashboard --orders 1000000 --iterations 5
+# ------------------------------------------------------------
+
+SCHEMA_NAME = re.compile(r"^bench_[a-z0-9_]+$")
+
+MEMBERS = 20000
+PRODUCTS = 500
+CATEGORIES = 12
+
+SCHEMA_SQL = """
+    CREATE TABLE member (
+        mid VARCHAR(50) PRIMARY KEY,
+        name VARCHAR(100),
+        account VARCHAR(50),
+        password VARCHAR(255),
+        identity VARCHAR(20)
+    );
+    CREATE TABLE product (
+        pid VARCHAR(50) PRIMARY KEY,
+        pname VARCHAR(100),
+        category VARCHAR(100),
+        price INT
+    );
+    CREATE TABLE order_list (
+        oid BIGINT PRIMARY KEY,
+        mid VARCHAR(50),
+        ordertime TIMESTAMP,
+        price NUMERIC,
+        tno BIGINT
+    );
+    CREATE TABLE record (
+        tno BIGINT,
+        pid VARCHAR(50),
+        amount INT,
+        saleprice INT,
+        total NUMERIC
+    );
+"""
+
+SEED_SQL = """
+    INSERT INTO member (mid, name, account, password, identity)
+    SELECT 'm' || g, 'member ' || g, 'account' || g, 'x', 'user'
+    FROM generate_series(1, %(members)s) g;
+
+    INSERT INTO product (pid, pname, category, price)
+    SELECT 'p' || g, 'product ' || g, 'category ' || (g %% %(categories)s), 100 + g %% 900
+    FROM generate_series(1, %(products)s) g;
+
+    INSERT INTO order_list (oid, mid, ordertime, price, tno)
+    SELECT g, 'm' || (1 + (random() * (%(members)s - 1))::int),
+           NOW() - random() * INTERVAL '3 years', (100 + random() * 2000)::int, g
+    FROM generate_series(1, %(orders)s) g;
+
+    INSERT INTO record (tno, pid, amount, saleprice, total)
+    SELECT o.tno, 'p' || (1 + (random() * (%(products)s - 1))::int), 1, 0, (100 + random() * 900)::int
+    FROM order_list o, generate_series(1, 2);
+
+    ANALYZE member, product, order_list, record;
+"""
+
+# 最初每個月各查一次的寫法 (改寫前的 Analysis.month_price / month_count)
+MONTH_PRICE_SQL = (
+    "SELECT EXTRACT(MONTH FROM ordertime), SUM(price) FROM order_list "
+    "WHERE EXTRACT(MONTH FROM ordertime) = %s GROUP BY EXTRACT(MONTH FROM ordertime)"
+)
+MONTH_COUNT_SQL = (
+    "SELECT EXTRACT(MONTH FROM ordertime), COUNT(oid) FROM order_list "
+    "WHERE EXTRACT(MONTH FROM ordertime) = %s GROUP BY EXTRACT(MONTH FROM ordertime)"
+)
+
+# 一次 GROUP BY 直接讀 order_list (還沒有彙總表時的 monthly_summary)
+GROUP_BY_SQL = """
+    SELECT m.month, COALESCE(o.revenue, 0), COALESCE(o.cnt, 0)
+    FROM generate_series(1, 12) AS m(month)
+    LEFT JOIN (
+        SELECT EXTRACT(MONTH FROM ordertime)::int AS month, SUM(price) AS revenue, COUNT(oid) AS cnt
+        FROM order_list
+        GROUP BY 1
+    ) o ON o.month = m.month
+    ORDER BY m.month
+"""
+
+
+def schema_name(value):
+    """
+    argparse 的 type：只接受 bench_ 開頭、小寫英數字與底線的 schema 名稱
+    """
+    if not SCHEMA_NAME.match(value):
+        raise argparse.ArgumentTypeError(f"schema 必須以 bench_ 開頭，且只含小寫英數字與底線: {value!r}")
+    return value
+
+
+def _run_migration(prefix):
+    for version, filename in migrate.available():
+        if filename.startswith(prefix):
+            with open(os.path.join(migrate.MIGRATIONS_DIR, filename), encoding="utf-8") as f:
+                DB.execute(f.read())
+            return
+    raise SystemExit(f"找不到 migrations/{prefix}_*.sql")
+
+
+def seed(schema, orders, reseed):
+    existing = DB.fetchone("SELECT to_regclass('order_list') IS NOT NULL")[0]
+    if existing and not reseed:
+        count = DB.fetchone("SELECT COUNT(*) FROM order_list")[0]
+        if count == orders:
+            print(f"沿用 {schema} 內的 {count} 筆訂單")
+            return
+    print(f"在 {schema} 建立 {orders} 筆訂單 ...")
+    started = time.perf_counter()
+    DB.execute(SQL("DROP SCHEMA IF EXISTS {0} CASCADE; CREATE SCHEMA {0};").format(Identifier(schema)))
+    DB.execute(SCHEMA_SQL)
+    # 先匯入再建索引與 trigger，比逐筆觸發 trigger 快很多
+    DB.execute(
+        SEED_SQL,
+        {"members": MEMBERS, "products": PRODUCTS, "categories": CATEGORIES, "orders": orders},
+    )
+    _run_migration("002")
+    _run_migration("006")
+    print(f"匯入完成，{time.perf_counter() - started:.1f} 秒")
+
+
+def twenty_four_queries():
+    for month in range(1, 13):
+        DB.fetchall(MONTH_PRICE_SQL, (month,))
+        DB.fetchall(MONTH_COUNT_SQL, (month,))
+
+
+def dashboard_queries():
+    return [
+        Analysis.monthly_summary,
+        Analysis.category_sale,
+        Analysis.member_sale,
+        Analysis.member_sale_count,
+    ]
+
+
+def insert_order_rolled_back():
+    connection = DB.connect()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO order_list (oid, mid, ordertime, price, tno) "
+                "VALUES (-1, 'm1', NOW(), 500, -1)"
+            )
+            cursor.execute(
+                "INSERT INTO record (tno, pid, amount, saleprice, total) "
+                "VALUES (-1, 'p1', 1, 0, 250), (-1, 'p2', 1, 0, 250)"
+            )
+    finally:
+        connection.rollback()
+        DB.release(connection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="儀表板查詢在大量訂單上的效能")
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--schema", type=schema_name, default="bench_dashboard")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--reseed", action="store_true", help="刪除 schema 重新匯入")
+    args = parser.parse_args()
+
+    # 必須在第一次連線前設定：所有連線 (包括連線池) 只看得到 benchmark 的 schema
+    os.environ["PGOPTIONS"] = f"{os.environ.get('PGOPTIONS', '')} -c search_path={args.schema}".strip()
+    DB.execute(SQL("CREATE SCHEMA IF NOT EXISTS {}").format(Identifier(args.schema)))
+    seed(args.schema, args.orders, args.reseed)
+
+    n = args.iterations
+    report("24 queries", measure(twenty_four_queries, n, warmup=1))
+    report("one GROUP BY", measure(lambda: DB.fetchall(GROUP_BY_SQL), n, warmup=1))
+    report("monthly_summary", measure(Analysis.monthly_summary, n * 20))
+    year = time.localtime().tm_year
+    report("monthly_summary (year)", measure(lambda: Analysis.monthly_summary(year=year), n * 20))
+
+    calls = dashboard_queries()
+    report("dashboard sequential", measure(lambda: [call() for call in calls], n * 4))
+    report("dashboard DB.gather", measure(lambda: DB.gather(*calls), n * 4))
+    report("order insert (trigger)", measure(insert_order_rolled_back, n * 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 # \booking\views\frontdesk.py
 
 from datetime import date, timedelta, datetime
-from flask import Blueprint, render_template, request, url_for, redirect, flash
+from flask import Blueprint, render_template, request, url_for, redirect, flash, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 import logging 
 from link import *
 from api.sql import *
+from api.cache import WEEK_GRID_CACHE, WeekGrid
+from api.timeslot import TimeSlot, slot_sort_key
+from api.seats import SEAT_FEED, event_stream, STREAM_ENABLED, POLL_SECONDS
 
 # 仿照 manager.py 建立 Blueprint，變數名稱改為 'frontdesk'
 frontdesk = Blueprint('frontdesk', 
@@ -68,13 +71,13 @@ def member_home():
                 
                 # --- 日期導覽邏輯 ---
                 week_start_str = request.args.get('week_start')
+                # 一律對齊到週一：快取與人數更新 (set_count / invalidate_week) 都以該週週一為 key
                 if week_start_str:
-                    week_start = datetime.strptime(week_start_str, '%Y-%m-%d').date()
+                    week_start = WEEK_GRID_CACHE.week_of(datetime.strptime(week_start_str, '%Y-%m-%d').date())
                 else:
                     # 預設為本週 (週一為 0, 週日為 6)
-                    week_start = today - timedelta(days=today.weekday())
+                    week_start = WEEK_GRID_CACHE.week_of(today)
                 
-                week_end = week_start + timedelta(days=6)
                 prev_week = (week_start - timedelta(days=7)).isoformat()
                 next_week = (week_start + timedelta(days=7)).isoformat()
 
@@ -84,62 +87,37 @@ def member_home():
                 # 產生 7 天的日期物件列表，用於表頭
                 week_dates = [week_start + timedelta(days=i) for i in range(7)]
 
-                # --- 獲取 [課程日曆] 資料 ---
-                schedules_raw = CourseSchedule.get_schedules_by_week(week_start, week_end)
+                # --- 獲取 [課程日曆] 資料 (全體會員共用的每週快取) ---
+                grid = get_week_grid(week_start)
                 
                 # --- 獲取 [我的課程] 資料 ---
                 my_bookings_raw = Booking.get_bookings_by_member(member_id)
                 
                 # 建立一個 Set (集合) 以便快速查找: (courseId, date, timeSlot)
-                my_booked_set = set( (b[0], b[1], b[2]) for b in my_bookings_raw )
+                my_booked_set = set( WEEK_GRID_CACHE.cell_key(b[0], b[1], b[2]) for b in my_bookings_raw )
 
-                # --- 資料重組：將課程資料填入 [時段][日期] 的網格中 ---
-                time_slots = sorted(list(set(s[2] for s in schedules_raw))) # 獲取所有不重複的時段
+                # 候補中的時段與順位: (courseId, date, timeSlot) -> 第幾位
+                my_waiting = { WEEK_GRID_CACHE.cell_key(w[0], w[1], w[2]): w[3] for w in Waitlist.get_by_member(member_id) }
+
+                # --- 資料重組：把共用的格子複製一份，疊上會員自己的預約與「時段已過」 ---
+                time_slots = grid.time_slots
                 calendar_grid = {slot: {day: None for day in week_dates} for slot in time_slots}
                 
-                for s in schedules_raw:
-                    # 索引對應 get_schedules_by_week 的 SELECT
-                    # (courseid, scheduledate, timeslot, coachid, coursename, cname, studentlimit)
-                    course_id, date_obj, time_slot, coach_id, course_name, coach_name, student_limit = s
-                    
-                    # 檢查是否已被該會員預約
-                    is_booked_by_me = (course_id, date_obj, time_slot) in my_booked_set
-                    
-                    # 檢查是否已額滿
-                    current_count = Booking.count_bookings_for_schedule(course_id, date_obj, time_slot)[0]
-                    is_full = (current_count >= student_limit)
-
-                    # 檢查時段是否已過
-                    is_in_past = False
-                    if date_obj < today:
-                        is_in_past = True
-
-                    elif date_obj == today:
-                        try:
-                            # 取得時段的開始時間 (例如 "07:15-08:15" -> "07:15")
-                            course_start_time_str = time_slot.split('-')[0]
-                            # 結合 '今天' 和 '課程開始時間'
-                            course_start_datetime = datetime.combine(today, datetime.strptime(course_start_time_str, '%H:%M').time())
-                            
-                            # 如果 '現在' 晚於 '課程開始時間'
-                            if now > course_start_datetime:
-                                is_in_past = True
-                        except Exception as time_e:
-                            logging.warning(f"解析時段格式錯誤 '{time_slot}': {time_e}")
+                for key, cell in list(grid.cells.items()):
+                    course_id, date_obj, time_slot = key
+
+                    # 檢查時段是否已過 (時段在建立快取時就已解析好)
+                    is_in_past = date_obj < today or (
+                        cell['slot'] is not None and cell['slot'].is_past(date_obj, now)
+                    )
 
                     if time_slot in calendar_grid and date_obj in calendar_grid[time_slot]:
-                        calendar_grid[time_slot][date_obj] = {
-                            'courseId': course_id,
-                            'date': date_obj,
-                            'timeSlot': time_slot,
-                            'courseName': course_name,
-                            'coachName': coach_name,
-                            'is_booked_by_me': is_booked_by_me,
-                            'is_full': is_full,
-                            'current_count': current_count,
-                            'limit': student_limit,
-                            'is_in_past': is_in_past
-                        }
+                        calendar_grid[time_slot][date_obj] = dict(
+                            cell,
+                            is_booked_by_me=key in my_booked_set,
+                            waitlist_position=my_waiting.get(key, 0),
+                            is_in_past=is_in_past
+                        )
                 
                 # --- 格式化 [我的課程] 資料 (用於模板) ---
                 my_bookings_list = []
@@ -163,7 +141,9 @@ def member_home():
                     prev_week=prev_week,
                     next_week=next_week,
                     current_week_start=week_start.isoformat(), # 用於預約/取消後跳轉
-                    current_week_start_date=current_week_start_date
+                    current_week_start_date=current_week_start_date,
+                    seat_stream=STREAM_ENABLED,
+                    seat_poll_seconds=POLL_SECONDS
                 )
 
             except Exception as e:
@@ -182,6 +162,60 @@ def member_home():
         return redirect(url_for('api.login'))
 
 
+def load_week_grid(week_start):
+    """
+    從資料庫建立一週的共用課表 (不含任何會員個人資料)：
+    2 個查詢 (排程 + 每格人數)，時段字串在這裡解析好。
+    """
+    week_end = week_start + timedelta(days=6)
+    schedules_raw = CourseSchedule.get_schedules_by_week(week_start, week_end)
+    booking_counts = {
+        WEEK_GRID_CACHE.cell_key(r[0], r[1], r[2]): r[3]
+        for r in Booking.counts_for_range(week_start, week_end)
+    }
+
+    cells = {}
+    for s in schedules_raw:
+        # 索引對應 get_schedules_by_week 的 SELECT
+        # (courseid, scheduledate, timeslot, coachid, coursename, cname, studentlimit)
+        course_id, date_obj, time_slot, coach_id, course_name, coach_name, student_limit = s
+        key = WEEK_GRID_CACHE.cell_key(course_id, date_obj, time_slot)
+        current_count = booking_counts.get(key, 0)
+
+        slot = None
+        try:
+            # 時段字串只解析一次 (例如 "07:15-08:15")，同一字串共用同一個 TimeSlot
+            slot = TimeSlot.parse(time_slot)
+        except ValueError as time_e:
+            logging.warning(f"解析時段格式錯誤 '{time_slot}': {time_e}")
+
+        cells[key] = {
+            'courseId': key[0],
+            'date': date_obj,
+            'timeSlot': time_slot,
+            'courseName': course_name,
+            'coachName': coach_name,
+            'is_full': student_limit is not None and current_count >= student_limit,
+            'current_count': current_count,
+            'limit': student_limit,
+            'slot': slot
+        }
+
+    time_slots = sorted(set(key[2] for key in cells), key=slot_sort_key) # 依實際開始時間排序，不是字串順序
+    return WeekGrid(week_start, time_slots, cells)
+
+
+def get_week_grid(week_start):
+    """
+    取得一週的共用課表 (week_start 必須是週一)；人數由預約 / 取消與 LISTEN 通知直接更新。
+    """
+    grid = WEEK_GRID_CACHE.get(week_start)
+    if grid is None:
+        grid = load_week_grid(week_start)
+        WEEK_GRID_CACHE.put(grid)
+    return grid
+
+
 @frontdesk.route('/select_plan', methods=['POST']) 
 @login_required
 def select_plan():
@@ -228,6 +262,29 @@ def select_plan():
     return redirect(url_for('frontdesk.member_home'))
 
 
+# Booking.book / Booking.cancel 的結果 -> (訊息, flash 類別)
+BOOKING_MESSAGES = {
+    Booking.BOOKED: ('預約成功！', 'success'),
+    Booking.ALREADY_BOOKED: ('您已預約過此時段', 'warning'),
+    Booking.FULL: ('此課程時段已額滿，可加入候補', 'danger'),
+    Booking.NOT_FOUND: ('找不到此課程時段', 'danger'),
+    Booking.CANCELLED: ('已取消預約', 'success'),
+    Booking.NOT_BOOKED: ('您沒有預約此時段', 'warning'),
+    Waitlist.WAITLISTED: ('已加入候補', 'success'),
+    Waitlist.ALREADY_WAITLISTED: ('您已在候補名單中', 'warning'),
+    Waitlist.LEFT: ('已退出候補', 'success'),
+    Waitlist.NOT_WAITLISTED: ('您不在此時段的候補名單中', 'warning'),
+}
+
+
+def booking_message(status, position=None):
+    """ BOOKING_MESSAGES 的訊息，候補時加上順位 """
+    message, category = BOOKING_MESSAGES[status]
+    if position:
+        message = f'{message} (候補第 {position} 位)'
+    return message, category
+
+
 @frontdesk.route('/book', methods=['POST'])
 @login_required
 def book_course():
@@ -239,24 +296,9 @@ def book_course():
         scheduleDate = request.form.get('scheduleDate')
         timeSlot = request.form.get('timeSlot')
 
-        # --- 驗證 ---
-        # 1. 檢查是否已預約
-        if Booking.check_booking_exists(courseId, scheduleDate, timeSlot, member_id):
-            flash('您已預約過此時段', 'warning')
-            return redirect(url_for('frontdesk.member_home', week_start=week_start))
-
-        # 2. 檢查是否額滿
-        # (使用 sql.py 的 get_course，索引 [3] 是 studentlimit)
-        limit = Course.get_course(courseId)[3] 
-        current_count = Booking.count_bookings_for_schedule(courseId, scheduleDate, timeSlot)[0]
-        
-        if current_count >= limit:
-            flash('此課程時段已額滿', 'danger')
-            return redirect(url_for('frontdesk.member_home', week_start=week_start))
-        
-        # 3. 執行預約
-        Booking.create_booking(courseId, scheduleDate, timeSlot, member_id)
-        flash('預約成功！', 'success')
+        # --- 檢查是否已預約、是否額滿並寫入，在同一個交易中完成 ---
+        result = Booking.book(courseId, scheduleDate, timeSlot, member_id)
+        flash(*BOOKING_MESSAGES[result.status])
 
     except Exception as e:
         logging.error(f"預約失敗: {e}")
@@ -276,8 +318,8 @@ def cancel_booking():
         scheduleDate = request.form.get('scheduleDate')
         timeSlot = request.form.get('timeSlot')
 
-        Booking.delete_booking(courseId, scheduleDate, timeSlot, member_id)
-        flash('已取消預約', 'success')
+        result = Booking.cancel(courseId, scheduleDate, timeSlot, member_id)
+        flash(*BOOKING_MESSAGES[result.status])
 
     except Exception as e:
         logging.error(f"取消預約失敗: {e}")
@@ -287,4 +329,244 @@ def cancel_booking():
         return redirect(url_for('frontdesk.member_home', week_start=week_start))
     else:
         # 如果是從 "我的課程" 列表取消，week_start 為 None，直接重載
-        return redirect(url_for('frontdesk.member_home'))
\ No newline at end of file
+        return redirect(url_for('frontdesk.member_home'))
+
+
+@frontdesk.route('/waitlist/join', methods=['POST'])
+@login_required
+def join_waitlist():
+    """ 額滿時段加入候補 (有空位時直接預約) """
+    week_start = request.form.get('week_start')
+    try:
+        member_id = current_user.id.split('_', 1)[1]
+        result = Waitlist.join(
+            request.form.get('courseId'),
+            request.form.get('scheduleDate'),
+            request.form.get('timeSlot'),
+            member_id
+        )
+        flash(*booking_message(result.status, result.position))
+
+    except Exception as e:
+        logging.error(f"加入候補失敗: {e}")
+        flash('加入候補時發生錯誤', 'danger')
+
+    return redirect(url_for('frontdesk.member_home', week_start=week_start))
+
+
+@frontdesk.route('/waitlist/leave', methods=['POST'])
+@login_required
+def leave_waitlist():
+    """ 退出候補 """
+    week_start = request.form.get('week_start')
+    try:
+        member_id = current_user.id.split('_', 1)[1]
+        status = Waitlist.leave(
+            request.form.get('courseId'),
+            request.form.get('scheduleDate'),
+            request.form.get('timeSlot'),
+            member_id
+        )
+        flash(*booking_message(status))
+
+    except Exception as e:
+        logging.error(f"退出候補失敗: {e}")
+        flash('退出候補時發生錯誤', 'danger')
+
+    return redirect(url_for('frontdesk.member_home', week_start=week_start))
+
+
+# ==========================================================
+# JSON API：課程日曆在頁面上直接更新，不必每次預約 / 取消都重新載入整頁
+# 格子以 "courseId|YYYY-MM-DD|timeSlot" 當 key，回傳的都是單一格的最新人數 (delta)
+# ==========================================================
+
+def cell_key_str(key):
+    return f"{key[0]}|{key[1].isoformat()}|{key[2]}"
+
+
+def seat_json(key, count, limit, mine):
+    return {
+        'key': cell_key_str(key),
+        'count': count,
+        'limit': limit,
+        'full': limit is not None and count >= limit,
+        'mine': mine
+    }
+
+
+def api_member_id():
+    """
+    目前登入的會員 ID；管理者 / 教練帳號回傳 None
+    """
+    if current_user.role in ('manager', 'coach'):
+        return None
+    return current_user.id.split('_', 1)[1]
+
+
+def api_week_start():
+    week_start_str = request.args.get('week_start')
+    if week_start_str:
+        return WEEK_GRID_CACHE.week_of(datetime.strptime(week_start_str, '%Y-%m-%d').date())
+    return WEEK_GRID_CACHE.week_of(date.today())
+
+
+def api_booking_action(action):
+    member_id = api_member_id()
+    if member_id is None:
+        return jsonify({'error': '僅限會員帳號'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    courseId = data.get('courseId')
+    scheduleDate = data.get('scheduleDate')
+    timeSlot = data.get('timeSlot')
+    if not (courseId and scheduleDate and timeSlot):
+        return jsonify({'error': '缺少 courseId / scheduleDate / timeSlot'}), 400
+
+    try:
+        key = WEEK_GRID_CACHE.cell_key(courseId, scheduleDate, timeSlot)
+        result = action(courseId, key[1], timeSlot, member_id)
+    except ValueError:
+        return jsonify({'error': '日期格式錯誤'}), 400
+    except Exception as e:
+        logging.error(f"預約 API 失敗: {e}")
+        return jsonify({'error': '系統發生錯誤，請稍後再試'}), 500
+
+    # Waitlist.leave 只回傳狀態字串，不含人數
+    status = result if isinstance(result, str) else result.status
+    position = getattr(result, 'position', None)
+    message, category = booking_message(status, position)
+    body = {'status': status, 'message': message, 'category': category}
+    if status != Booking.NOT_FOUND:
+        if isinstance(result, str):
+            cell = {'key': cell_key_str(key)}
+        else:
+            mine = status in (Booking.BOOKED, Booking.ALREADY_BOOKED)
+            cell = seat_json(key, result.current_count, result.limit, mine)
+        if isinstance(result, (str, WaitlistResult)):
+            cell['waiting'] = position or 0
+        body['cell'] = cell
+    return jsonify(body)
+
+
+@frontdesk.route('/api/book', methods=['POST'])
+@login_required
+def api_book():
+    """ 預約 (JSON)：回傳該格最新的人數與狀態 """
+    return api_booking_action(Booking.book)
+
+
+@frontdesk.route('/api/cancel', methods=['POST'])
+@login_required
+def api_cancel():
+    """ 取消預約 (JSON)：回傳該格最新的人數與狀態 """
+    return api_booking_action(Booking.cancel)
+
+
+@frontdesk.route('/api/waitlist/join', methods=['POST'])
+@login_required
+def api_waitlist_join():
+    """ 加入候補 (JSON)：回傳該格人數與候補順位 (cell.waiting) """
+    return api_booking_action(Waitlist.join)
+
+
+@frontdesk.route('/api/waitlist/leave', methods=['POST'])
+@login_required
+def api_waitlist_leave():
+    """ 退出候補 (JSON) """
+    return api_booking_action(Waitlist.leave)
+
+
+@frontdesk.route('/api/week', methods=['GET'])
+@login_required
+def api_week():
+    """
+    一週課表 (JSON)：?week_start=YYYY-MM-DD，預設本週。
+    共用的格子來自 get_week_grid 的快取，只多查會員自己的預約與候補。
+    """
+    member_id = api_member_id()
+    if member_id is None:
+        return jsonify({'error': '僅限會員帳號'}), 403
+    try:
+        week_start = api_week_start()
+    except ValueError:
+        return jsonify({'error': '日期格式錯誤'}), 400
+
+    grid = get_week_grid(week_start)
+    my_booked_set = set(
+        WEEK_GRID_CACHE.cell_key(b[0], b[1], b[2]) for b in Booking.get_bookings_by_member(member_id)
+    )
+    my_waiting = {
+        WEEK_GRID_CACHE.cell_key(w[0], w[1], w[2]): w[3] for w in Waitlist.get_by_member(member_id)
+    }
+    now = datetime.now()
+
+    cells = []
+    for key, cell in list(grid.cells.items()):
+        item = seat_json(key, cell['current_count'], cell['limit'], key in my_booked_set)
+        item.update(
+            courseName=cell['courseName'],
+            coachName=cell['coachName'],
+            waiting=my_waiting.get(key, 0),
+            past=cell['slot'] is not None and cell['slot'].is_past(cell['date'], now)
+        )
+        cells.append(item)
+
+    return jsonify({
+        'week_start': week_start.isoformat(),
+        'slots': grid.time_slots,
+        'cells': cells
+    })
+
+
+@frontdesk.route('/api/seats', methods=['GET'])
+@login_required
+def api_seats():
+    """
+    一週各格的人數 (JSON)：{"week_start": ..., "seats": {key: [人數, 是否額滿]}}
+    只有人數，給頁面定期更新用，不含課程名稱等不會變的資料。
+    """
+    try:
+        week_start = api_week_start()
+    except ValueError:
+        return jsonify({'error': '日期格式錯誤'}), 400
+
+    grid = get_week_grid(week_start)
+    return jsonify({
+        'week_start': week_start.isoformat(),
+        'seats': {
+            cell_key_str(key): [cell['current_count'], cell['is_full']]
+            for key, cell in list(grid.cells.items())
+        }
+    })
+
+
+@frontdesk.route('/api/seats/stream', methods=['GET'])
+@login_required
+def api_seats_stream():
+    """
+    一週各格人數的即時推播 (Server-Sent Events)：?week_start=YYYY-MM-DD。
+    同一個 worker 的所有連線共用一條 LISTEN 連線 (api/seats.py)。
+    SEAT_STREAM_ENABLED=0 時關閉 (回傳 404)，連線數已達上限時回傳 503，頁面改用 /api/seats 輪詢。
+    """
+    if not STREAM_ENABLED:
+        return jsonify({'error': '即時推播未開啟'}), 404
+
+    try:
+        week_start = api_week_start()
+    except ValueError:
+        return jsonify({'error': '日期格式錯誤'}), 400
+
+    # 先佔位再開始串流，額滿時才能回 503 而不是卡住一個執行緒
+    subscription = SEAT_FEED.subscribe(week_start)
+    if subscription is None:
+        return jsonify({'error': '即時推播連線已滿，請稍後再試'}), 503
+
+    response = Response(
+        stream_with_context(event_stream(subscription)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # 產生器還沒開始就斷線時 finally 不會執行，由回應關閉時釋放 (重複 unsubscribe 無妨)
+    response.call_on_close(lambda: SEAT_FEED.unsubscribe(subscription))
+    return response
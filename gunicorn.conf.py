@@ -0,0 +1,28 @@
+import os
+
+# ------------------------------------------------------------
+# gunicorn 設定：gunicorn app:app (會自動讀取目前目錄的 gunicorn.conf.py)
+#
+# 預約頁的即時人數推播 (/member/api/seats/stream，SSE) 每條連線會一直佔住
+# 一個執行緒，所以使用 gthread worker：每個 worker 有 GUNICORN_THREADS 個執行緒，
+# 同時能服務的 (開著預約頁的會員 + 一般請求) 約為 workers x threads。
+# 預設 sync worker 一個 worker 只有一個執行緒，第一個 SSE 連線就會把它卡住。
+# 每個 worker 最多 SEAT_STREAM_MAX_SUBSCRIBERS (預設 32) 條 SSE 連線，其餘執行緒
+# 保留給預約 / 取消等一般請求；超過的頁面收到 503 後改為定期輪詢。
+# 調整 GUNICORN_THREADS 時請讓 SEAT_STREAM_MAX_SUBSCRIBERS 明顯小於 threads。
+# 不能用 gthread 時請改設 SEAT_STREAM_ENABLED=0 (頁面改為定期輪詢)。
+#
+# SSE 執行緒不佔資料庫連線 (每個 worker 共用一條 LISTEN 連線)，
+# 一般請求才向連線池借，DB_POOL_MAX 不需要跟著 threads 調大。
+# ------------------------------------------------------------
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "64"))
+
+# gthread 的 worker 由主迴圈回報心跳，長時間的 SSE 回應不會觸發 timeout
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+# 瀏覽器 EventSource 斷線會自動重連；關閉 worker 時不必等所有 SSE 連線結束
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "10"))
+keepalive = 5
@@ -0,0 +1,31 @@
+-- 001: booking / courseschedule / confirm 的次要索引
+-- gymSql.sql 只有主鍵，以下查詢都無法用主鍵（主鍵都以 courseId 開頭）
+
+-- Booking.get_bookings_by_member: WHERE memberid = ? AND scheduledate >= CURRENT_DATE
+-- INCLUDE 讓 index-only scan 就能取得 courseid / timeslot
+CREATE INDEX IF NOT EXISTS booking_member_date_idx
+    ON booking (memberId, scheduleDate)
+    INCLUDE (courseId, timeSlot);
+
+-- Booking.counts_for_range: WHERE scheduledate BETWEEN ? AND ? GROUP BY courseid, scheduledate, timeslot
+CREATE INDEX IF NOT EXISTS booking_date_idx
+    ON booking (scheduleDate)
+    INCLUDE (courseId, timeSlot);
+
+-- CourseSchedule.get_schedules_by_week: WHERE scheduledate BETWEEN ? AND ? ORDER BY scheduledate, timeslot
+-- CourseSchedule.list_window (後台排程列表的 keyset 分頁):
+--   WHERE (scheduledate, timeslot, courseid) > (?, ?, ?) ORDER BY scheduledate, timeslot, courseid
+CREATE INDEX IF NOT EXISTS courseschedule_date_slot_course_idx
+    ON courseSchedule (scheduleDate, timeSlot, courseId);
+
+-- 依教練查排程（教練課表、衝堂檢查）以及 coachId 外鍵
+CREATE INDEX IF NOT EXISTS courseschedule_coach_date_idx
+    ON courseSchedule (coachId, scheduleDate);
+
+-- ConfirmSQL.check_plan_in_use: WHERE planid = ? LIMIT 1
+CREATE INDEX IF NOT EXISTS confirm_plan_idx
+    ON confirm (planId);
+
+-- 會員的合約紀錄 (memberId 外鍵)
+CREATE INDEX IF NOT EXISTS confirm_member_idx
+    ON confirm (memberId);
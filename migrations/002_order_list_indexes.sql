@@ -0,0 +1,17 @@
+-- 002: 商城訂單表的索引（order_list / record 不在 gymSql.sql 內，存在時才建立）
+
+DO $$
+BEGIN
+    IF to_regclass('order_list') IS NOT NULL THEN
+        -- Analysis.stream_orders (後台匯出訂單): WHERE ordertime >= ? AND ordertime < ? ORDER BY ordertime
+        CREATE INDEX IF NOT EXISTS order_list_ordertime_idx ON order_list (ordertime);
+        -- 006 的 rollup_record_change trigger: 每筆明細以 tno 找所屬訂單
+        CREATE INDEX IF NOT EXISTS order_list_tno_idx ON order_list (tno);
+    END IF;
+
+    -- 006 的 rollup_order_change trigger: 每筆訂單以 tno 找明細 (rollup_rebuild 的 JOIN 也用得到)
+    IF to_regclass('record') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS record_tno_idx ON record (tno);
+    END IF;
+END
+$$;
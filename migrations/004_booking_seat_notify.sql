@@ -0,0 +1,42 @@
+-- 004: 預約人數變動時 NOTIFY seat_changes (api/seats.py 的 SSE 推播)
+-- 以 trigger 發送，所有寫入 booking 的路徑 (預約、取消、後台、匯入) 都會通知。
+-- payload: {"k": "courseId|YYYY-MM-DD|timeSlot", "n": 目前人數, "l": 人數上限}
+-- NOTIFY 在 commit 時才送出，rollback 的交易不會通知。
+CREATE OR REPLACE FUNCTION booking_notify_seat_change() RETURNS trigger AS $$
+DECLARE
+    changed booking%ROWTYPE;
+    seats BIGINT;
+    seat_limit INT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    SELECT COUNT(*) INTO seats
+    FROM booking
+    WHERE courseId = changed.courseId
+      AND scheduleDate = changed.scheduleDate
+      AND timeSlot = changed.timeSlot;
+
+    SELECT studentLimit INTO seat_limit
+    FROM course
+    WHERE courseId = changed.courseId;
+
+    PERFORM pg_notify(
+        'seat_changes',
+        json_build_object(
+            'k', rtrim(changed.courseId) || '|' || to_char(changed.scheduleDate, 'YYYY-MM-DD') || '|' || changed.timeSlot,
+            'n', seats,
+            'l', seat_limit
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS booking_seat_notify ON booking;
+CREATE TRIGGER booking_seat_notify
+    AFTER INSERT OR DELETE ON booking
+    FOR EACH ROW EXECUTE FUNCTION booking_notify_seat_change();
@@ -0,0 +1,23 @@
+-- 005: 額滿時段的候補名單 (api/sql.py Waitlist)
+-- 依 seq (加入順序) 排隊，取消預約時 Booking.cancel 在同一個交易中依序補位。
+-- 之前的版本在第一次使用時才建立這張表，所以一律 IF NOT EXISTS。
+CREATE TABLE IF NOT EXISTS waitlist (
+    courseId CHAR(6) NOT NULL,
+    scheduleDate DATE NOT NULL,
+    timeSlot VARCHAR(20) NOT NULL,
+    memberId VARCHAR(8) NOT NULL,
+    seq BIGSERIAL NOT NULL UNIQUE,
+    joinedAt TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (courseId, scheduleDate, timeSlot, memberId),
+    FOREIGN KEY (courseId, scheduleDate, timeSlot)
+        REFERENCES courseSchedule (courseId, scheduleDate, timeSlot) ON DELETE CASCADE,
+    FOREIGN KEY (memberId) REFERENCES sportMember (memberId)
+);
+
+-- 補位時依 seq 取同一時段的下一位 (PROMOTE_WAITLIST_SQL / POSITION_SQL)
+CREATE INDEX IF NOT EXISTS waitlist_slot_seq_idx
+    ON waitlist (courseId, scheduleDate, timeSlot, seq);
+
+-- 會員首頁列出自己的候補 (Waitlist.get_by_member)
+CREATE INDEX IF NOT EXISTS waitlist_member_idx
+    ON waitlist (memberId, scheduleDate);
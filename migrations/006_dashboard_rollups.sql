@@ -0,0 +1,153 @@
+-- 006: 後台儀表板的彙總表 (api/sql.py Rollup / Analysis)
+-- 由 order_list / record 上的 trigger 在同一個交易中增減，新增、修改、刪除訂單都會反映，
+-- 不會因為交易較晚 commit 而漏算。取代之前依 ordertime watermark 增量累加的做法。
+-- 商品改類別不會觸發重算，請執行 flask rebuild-rollups。
+
+CREATE TABLE IF NOT EXISTS rollup_daily_revenue (
+    day DATE PRIMARY KEY,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    order_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rollup_member_sales (
+    mid VARCHAR(50) PRIMARY KEY,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    order_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rollup_category_sales (
+    category VARCHAR(100) PRIMARY KEY,
+    total NUMERIC NOT NULL DEFAULT 0
+);
+
+DROP TABLE IF EXISTS rollup_watermark;
+
+-- 一筆訂單新增 (+1) / 刪除 (-1)；修改 = 先減舊值再加新值
+CREATE OR REPLACE FUNCTION rollup_order_change() RETURNS trigger AS $$
+DECLARE
+    o RECORD;
+    delta INT;
+BEGIN
+    FOREACH delta IN ARRAY CASE TG_OP WHEN 'INSERT' THEN ARRAY[1]
+                                     WHEN 'DELETE' THEN ARRAY[-1]
+                                     ELSE ARRAY[-1, 1] END
+    LOOP
+        IF delta < 0 THEN
+            o := OLD;
+        ELSE
+            o := NEW;
+        END IF;
+
+        IF o.ordertime IS NOT NULL THEN
+            INSERT INTO rollup_daily_revenue AS r (day, revenue, order_count)
+            VALUES (o.ordertime::date, delta * COALESCE(o.price, 0), delta)
+            ON CONFLICT (day) DO UPDATE
+            SET revenue = r.revenue + EXCLUDED.revenue,
+                order_count = r.order_count + EXCLUDED.order_count;
+        END IF;
+
+        IF o.mid IS NOT NULL THEN
+            INSERT INTO rollup_member_sales AS r (mid, revenue, order_count)
+            VALUES (o.mid, delta * COALESCE(o.price, 0), delta)
+            ON CONFLICT (mid) DO UPDATE
+            SET revenue = r.revenue + EXCLUDED.revenue,
+                order_count = r.order_count + EXCLUDED.order_count;
+            DELETE FROM rollup_member_sales WHERE mid = o.mid AND order_count = 0;
+        END IF;
+
+        INSERT INTO rollup_category_sales AS r (category, total)
+        SELECT p.category, delta * SUM(COALESCE(rec.total, 0))
+        FROM record rec
+        JOIN product p ON p.pid = rec.pid
+        WHERE rec.tno = o.tno
+        GROUP BY p.category
+        ON CONFLICT (category) DO UPDATE
+        SET total = r.total + EXCLUDED.total;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 已成立訂單的明細 (record) 新增 / 修改 / 刪除；還在購物車 (沒有對應訂單) 的不計
+CREATE OR REPLACE FUNCTION rollup_record_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    delta INT;
+BEGIN
+    FOREACH delta IN ARRAY CASE TG_OP WHEN 'INSERT' THEN ARRAY[1]
+                                     WHEN 'DELETE' THEN ARRAY[-1]
+                                     ELSE ARRAY[-1, 1] END
+    LOOP
+        IF delta < 0 THEN
+            rec := OLD;
+        ELSE
+            rec := NEW;
+        END IF;
+
+        INSERT INTO rollup_category_sales AS r (category, total)
+        SELECT p.category, delta * COALESCE(rec.total, 0) * COUNT(*)
+        FROM order_list o
+        JOIN product p ON p.pid = rec.pid
+        WHERE o.tno = rec.tno
+        GROUP BY p.category
+        ON CONFLICT (category) DO UPDATE
+        SET total = r.total + EXCLUDED.total;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 清空彙總表並以目前的訂單從頭重算 (Rollup.rebuild / flask rebuild-rollups)，回傳訂單數。
+-- 重算期間以 SHARE 鎖暫停訂單寫入，避免 trigger 與重算重複計入。
+CREATE OR REPLACE FUNCTION rollup_rebuild() RETURNS BIGINT AS $$
+DECLARE
+    orders BIGINT;
+BEGIN
+    LOCK TABLE order_list, record IN SHARE MODE;
+    TRUNCATE rollup_daily_revenue, rollup_member_sales, rollup_category_sales;
+
+    INSERT INTO rollup_daily_revenue (day, revenue, order_count)
+    SELECT ordertime::date, COALESCE(SUM(price), 0), COUNT(*)
+    FROM order_list
+    WHERE ordertime IS NOT NULL
+    GROUP BY 1;
+
+    INSERT INTO rollup_member_sales (mid, revenue, order_count)
+    SELECT mid, COALESCE(SUM(price), 0), COUNT(*)
+    FROM order_list
+    WHERE mid IS NOT NULL
+    GROUP BY mid;
+
+    INSERT INTO rollup_category_sales (category, total)
+    SELECT p.category, COALESCE(SUM(rec.total), 0)
+    FROM order_list o
+    JOIN record rec ON rec.tno = o.tno
+    JOIN product p ON p.pid = rec.pid
+    GROUP BY p.category;
+
+    SELECT COUNT(*) INTO orders FROM order_list;
+    RETURN orders;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 商城的表 (order_list / record / product) 存在時才掛 trigger，並以目前的訂單重算一次
+DO $$
+BEGIN
+    IF to_regclass('order_list') IS NOT NULL AND to_regclass('record') IS NOT NULL
+       AND to_regclass('product') IS NOT NULL THEN
+        LOCK TABLE order_list, record IN SHARE MODE;
+
+        DROP TRIGGER IF EXISTS order_list_rollup ON order_list;
+        CREATE TRIGGER order_list_rollup
+            AFTER INSERT OR UPDATE OR DELETE ON order_list
+            FOR EACH ROW EXECUTE FUNCTION rollup_order_change();
+
+        DROP TRIGGER IF EXISTS record_rollup ON record;
+        CREATE TRIGGER record_rollup
+            AFTER INSERT OR UPDATE OR DELETE ON record
+            FOR EACH ROW EXECUTE FUNCTION rollup_record_change();
+
+        PERFORM rollup_rebuild();
+    END IF;
+END
+$$;
@@ -0,0 +1,8 @@
+-- 007: 參考資料快取的版本號 (api/sql.py RefCache / PageVersions)
+-- plan / course / coach 與後台頁面快取 (name 為 "page:" + endpoint) 每次寫入 +1，
+-- 各 worker 定期讀回，版本變了就重新載入。
+-- 之前的版本在第一次使用時才建立這張表，所以一律 IF NOT EXISTS。
+CREATE TABLE IF NOT EXISTS ref_version (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
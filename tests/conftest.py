@@ -0,0 +1,122 @@
+import os
+import sys
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+# 讓 tests/ 底下可以直接 import api、booking 等套件 (與 python app.py 相同的根目錄)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+import psycopg2.extensions
+
+# 需要資料庫的測試只連 TEST_DATABASE_URL (例如 postgresql://user:pw@localhost/gym_test)，
+# 不會用 .env / 預設的正式資料庫；必須在 import api.sql 之前換掉連線設定。
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    for key, value in psycopg2.extensions.parse_dsn(TEST_DATABASE_URL).items():
+        if key in ("user", "password", "host", "port", "dbname"):
+            os.environ["DB_NAME" if key == "dbname" else f"DB_{key.upper()}"] = value
+
+from api import migrate
+from api.sql import DB, _dsn
+
+# 測試資料的代號都以 zz 開頭，測試結束後刪除
+COACH_ID = "zz999"
+COURSE_ID = "zz9999"
+TIME_SLOT = "07:15-08:15"
+
+
+@pytest.fixture(scope="session")
+def db():
+    """
+    需要資料庫的測試使用，只在設定 TEST_DATABASE_URL 時執行；沒有設定或連不上時略過，而不是失敗。
+    連得上時先執行尚未執行的 migrations，並會新增 / 刪除 zz 開頭的測試資料。
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("未設定 TEST_DATABASE_URL，略過需要資料庫的測試")
+    try:
+        psycopg2.connect(connect_timeout=3, **_dsn()).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"無法連線資料庫，略過: {e}")
+    migrate.migrate()
+    return DB
+
+
+def _cleanup(members):
+    with DB.transaction() as cursor:
+        cursor.execute("DELETE FROM waitlist WHERE courseid = %s", (COURSE_ID,))
+        cursor.execute("DELETE FROM booking WHERE courseid = %s", (COURSE_ID,))
+        cursor.execute("DELETE FROM courseschedule WHERE courseid = %s", (COURSE_ID,))
+        cursor.execute("DELETE FROM course WHERE courseid = %s", (COURSE_ID,))
+        cursor.execute("DELETE FROM coach WHERE coachid = %s", (COACH_ID,))
+        cursor.execute("DELETE FROM sportmember WHERE memberid = ANY(%s)", (members,))
+
+
+@pytest.fixture
+def slot_factory(db):
+    """
+    slot_factory(limit, members) 建立一堂人數上限為 limit 的課與 members 位會員，
+    回傳 ((courseId, scheduleDate, timeSlot), [memberId, ...])。
+    """
+    created = []
+
+    def make(limit, members):
+        schedule_date = date.today() + timedelta(days=30)
+        member_ids = [f"zz{i:06d}" for i in range(members)]
+        created.extend(member_ids)
+        _cleanup(member_ids)
+        with DB.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO coach (coachid, cname, coachingtype, password) VALUES (%s, %s, %s, %s)",
+                (COACH_ID, "測試教練", "測試", "x"),
+            )
+            cursor.execute(
+                "INSERT INTO course (courseid, coursename, classroom, studentlimit) VALUES (%s, %s, %s, %s)",
+                (COURSE_ID, "測試課程", "Z1", limit),
+            )
+            cursor.execute(
+                "INSERT INTO courseschedule (coachid, courseid, scheduledate, timeslot) VALUES (%s, %s, %s, %s)",
+                (COACH_ID, COURSE_ID, schedule_date, TIME_SLOT),
+            )
+            cursor.executemany(
+                "INSERT INTO sportmember (memberid, mname, birthdate, gender, phonenumber, password, registerdate, status) "
+                "VALUES (%s, %s, '1990-01-01', 'M', '0900000000', 'x', NOW(), '有合約')",
+                [(m, m) for m in member_ids],
+            )
+        return (COURSE_ID, schedule_date, TIME_SLOT), member_ids
+
+    yield make
+    if created:
+        _cleanup(created)
+
+
+@pytest.fixture
+def run_concurrently():
+    """
+    run_concurrently(calls) 讓每個 call 各用一個執行緒、同時開始執行，
+    依傳入順序回傳結果；任何一個丟出例外都讓測試失敗。
+    """
+
+    def run(calls):
+        barrier = threading.Barrier(len(calls))
+        results = [None] * len(calls)
+        errors = []
+
+        def worker(i, call):
+            barrier.wait()
+            try:
+                results[i] = call()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i, call)) for i, call in enumerate(calls)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        return results
+
+    return run
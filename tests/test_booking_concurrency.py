@@ -0,0 +1,31 @@
+from collections import Counter
+
+from api.sql import Booking
+
+# N 位會員同時預約一堂人數上限 K 的課：恰好 K 位成功，其餘都是額滿，
+# 不會超賣也不會少賣。需要資料庫 (見 conftest.py 的 db fixture)。
+
+MEMBERS = 60
+LIMIT = 10
+
+
+def test_parallel_bookings_never_exceed_limit(slot_factory, run_concurrently):
+    slot, members = slot_factory(LIMIT, MEMBERS)
+
+    results = run_concurrently([lambda m=m: Booking.book(*slot, m) for m in members])
+
+    statuses = Counter(r.status for r in results)
+    assert statuses[Booking.BOOKED] == LIMIT
+    assert statuses[Booking.FULL] == MEMBERS - LIMIT
+    assert Booking.count_bookings_for_schedule(*slot)[0] == LIMIT
+
+
+def test_parallel_duplicate_booking_counts_once(slot_factory, run_concurrently):
+    slot, members = slot_factory(LIMIT, 1)
+
+    results = run_concurrently([lambda: Booking.book(*slot, members[0]) for _ in range(20)])
+
+    statuses = Counter(r.status for r in results)
+    assert statuses[Booking.BOOKED] == 1
+    assert statuses[Booking.ALREADY_BOOKED] == 19
+    assert Booking.count_bookings_for_schedule(*slot)[0] == 1
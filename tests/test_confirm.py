@@ -0,0 +1,71 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+from api.sql import DB, ConfirmSQL
+
+# 簽約時 endDate = startDate + 方案週期 (整數月)
+
+PLAN_ID = "zz998"
+MEMBER_ID = "zz100000"
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    calls = []
+    monkeypatch.setattr(DB, "execute_input", staticmethod(lambda sql, params: calls.append((sql, params))))
+    return calls
+
+
+@pytest.mark.parametrize("period", [12, "12", Decimal("12")])
+def test_period_is_sent_as_whole_months(executed, period):
+    ConfirmSQL.create_confirmation(MEMBER_ID, PLAN_ID, "現金", period)
+
+    (sql, params), = executed
+    assert "make_interval(months => %s)" in sql
+    assert params == (PLAN_ID, MEMBER_ID, 12, "現金")
+    assert type(params[2]) is int
+
+
+@pytest.mark.parametrize("period", [1.5, Decimal("1.5"), "1.5", "abc"])
+def test_fractional_period_is_rejected(executed, period):
+    with pytest.raises(ValueError):
+        ConfirmSQL.create_confirmation(MEMBER_ID, PLAN_ID, "現金", period)
+    assert executed == []
+
+
+def _cleanup():
+    with DB.transaction() as cursor:
+        cursor.execute("DELETE FROM confirm WHERE memberid = %s", (MEMBER_ID,))
+        cursor.execute("DELETE FROM sportmember WHERE memberid = %s", (MEMBER_ID,))
+        cursor.execute("DELETE FROM plan WHERE planid = %s", (PLAN_ID,))
+
+
+@pytest.fixture
+def plan_and_member(db):
+    _cleanup()
+    with DB.transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO plan (planid, planname, period, monthlycharge) VALUES (%s, %s, %s, %s)",
+            (PLAN_ID, "測試方案", 12, 999),
+        )
+        cursor.execute(
+            "INSERT INTO sportmember (memberid, mname, birthdate, gender, phonenumber, password, registerdate, status) "
+            "VALUES (%s, %s, '1990-01-01', 'M', '0900000000', 'x', NOW(), '無合約')",
+            (MEMBER_ID, MEMBER_ID),
+        )
+    yield
+    _cleanup()
+
+
+def test_end_date_is_period_months_after_start(plan_and_member):
+    ConfirmSQL.create_confirmation(MEMBER_ID, PLAN_ID, "現金", 12)
+
+    start, end, same = DB.fetchone(
+        "SELECT startdate, enddate, enddate = (startdate + INTERVAL '12 months')::date "
+        "FROM confirm WHERE memberid = %s",
+        (MEMBER_ID,),
+    )
+    assert same, (start, end)
+    assert end - start > timedelta(days=364)
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import api.sql
+from api.sql import DB
+
+# DB.gather：連線池借得到時各自在執行緒池中同時執行，借不到時在目前的執行緒依序執行。
+# 不需要資料庫：連線池換成只回報可借連線數的假物件。
+
+
+class _FakePool:
+    def __init__(self, available):
+        self._available = available
+
+    def available(self):
+        return self._available
+
+
+@pytest.fixture
+def pool_available(monkeypatch):
+    def set_available(n):
+        monkeypatch.setattr(api.sql, "_get_pool", lambda: _FakePool(n))
+
+    return set_available
+
+
+def _thread_name():
+    return threading.current_thread().name
+
+
+def test_runs_on_gather_threads_when_connections_are_free(pool_available):
+    pool_available(4)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def call(i):
+        return lambda: (barrier.wait(), i, _thread_name())[1:]
+
+    results = DB.gather(call(0), call(1), call(2))
+
+    assert [i for i, _ in results] == [0, 1, 2]
+    assert all(name.startswith("db-gather") for _, name in results)
+
+
+def test_runs_sequentially_when_pool_is_busy(pool_available):
+    pool_available(2)
+
+    results = DB.gather(_thread_name, _thread_name, _thread_name)
+
+    assert results == [threading.current_thread().name] * 3
+
+
+def test_first_error_in_call_order_is_raised(pool_available):
+    pool_available(4)
+
+    def fail(message):
+        def call():
+            raise ValueError(message)
+        return call
+
+    with pytest.raises(ValueError, match="first"):
+        DB.gather(lambda: 1, fail("first"), fail("second"))
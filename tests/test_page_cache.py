@@ -0,0 +1,96 @@
+import io
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+from api import bulk
+from api.cache import PAGE_CACHE, LocalBackend, LocalVersions, ResponseCache
+from api.sql import DB, RefCache
+
+# 後台頁面快取：寫入後頁面要失效，而且是所有 worker 一起失效。
+# 不需要資料庫：worker 以共用同一份版本號的兩個 ResponseCache 模擬，
+# 寫入路徑的交易換成不做事的假 cursor。
+
+
+def _page_app(cache, renders):
+    app = Flask(__name__)
+    app.secret_key = "test"
+
+    @app.route("/page")
+    @cache.cached()
+    def page():
+        renders.append(1)
+        return f"render {len(renders)}"
+
+    return app
+
+
+def test_invalidate_reaches_every_worker():
+    shared = LocalVersions()
+    renders = []
+    worker_a = _page_app(ResponseCache(LocalBackend(versions=shared)), renders)
+    cache_b = ResponseCache(LocalBackend(versions=shared))
+    worker_b = _page_app(cache_b, renders)
+
+    assert worker_a.test_client().get("/page").data == b"render 1"
+    assert worker_a.test_client().get("/page").data == b"render 1"
+
+    # 寫入由另一個 worker 處理
+    cache_b.invalidate("page")
+    assert worker_a.test_client().get("/page").data == b"render 2"
+
+
+class _FakeCursor:
+    rowcount = 1
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return None
+
+    def copy_expert(self, sql, stream):
+        pass
+
+
+@pytest.fixture
+def page_versions(monkeypatch):
+    """ 換成行程內的版本號，並讓寫入路徑的交易不碰資料庫 """
+    backend = LocalBackend()
+    monkeypatch.setattr(PAGE_CACHE, "backend", backend)
+
+    @contextmanager
+    def transaction():
+        yield _FakeCursor()
+
+    monkeypatch.setattr(DB, "transaction", staticmethod(transaction))
+    monkeypatch.setattr(RefCache, "bump", staticmethod(lambda cursor, name: None))
+    monkeypatch.setattr(RefCache, "invalidate", staticmethod(lambda *names: None))
+    return backend
+
+
+def test_coach_registration_invalidates_schedule_page(page_versions):
+    from app import app
+
+    before = page_versions.version("manager.courseSchedule")
+    response = app.test_client().post("/register", data={
+        "identity": "coach",
+        "password": "x",
+        "userId": "zz998",
+        "cName": "測試教練",
+        "coachingType": "測試",
+    })
+
+    assert response.status_code == 302
+    assert page_versions.version("manager.courseSchedule") == before + 1
+
+
+def test_course_import_invalidates_course_pages(page_versions):
+    stream = io.StringIO("courseid,coursename,classroom,studentlimit\nzz9998,測試課程,Z1,10\n")
+
+    inserted, _, rejects = bulk.import_csv("courses", stream)
+
+    assert (inserted, rejects) == (1, [])
+    assert page_versions.version("manager.courseManager") == 1
+    assert page_versions.version("manager.courseSchedule") == 1
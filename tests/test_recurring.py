@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+from flask import get_flashed_messages
+from flask_login import login_user
+
+from api.api import User
+from api.sql import CourseSchedule
+
+# 整期重複排程：星期只接受 1 (週一) ~ 7 (週日)；錯誤與沒有權限時都回到排程頁。
+# 不需要資料庫：寫入前就會被擋下。
+
+MONDAY = date(2025, 3, 3)
+SUNDAY = date(2025, 3, 16)
+
+
+def test_expand_recurring_uses_iso_weekdays():
+    dates = CourseSchedule.expand_recurring(MONDAY, SUNDAY, ["1", "7"], [date(2025, 3, 10)])
+    assert dates == [date(2025, 3, 3), date(2025, 3, 9), date(2025, 3, 16)]
+
+
+@pytest.mark.parametrize("weekdays", [["0"], ["8"], ["1", "-1"]])
+def test_expand_recurring_rejects_out_of_range_weekdays(weekdays):
+    with pytest.raises(ValueError):
+        CourseSchedule.expand_recurring(MONDAY, SUNDAY, weekdays)
+
+
+def _post_recurring(role, weekdays):
+    from app import app
+    from backstage.views.manager import courseSchedule_recurring
+
+    user = User()
+    user.id = f"{role}_zz999"
+    user.role = role
+    form = {
+        "courseid": "zz9999",
+        "coachid": "zz999",
+        "timeslot": "07:15-08:15",
+        "weekdays": weekdays,
+        "startdate": MONDAY.isoformat(),
+        "enddate": SUNDAY.isoformat(),
+    }
+    with app.test_request_context("/backstage/courseSchedule/recurring", method="POST", data=form):
+        login_user(user)
+        response = courseSchedule_recurring()
+        return response, get_flashed_messages()
+
+
+@pytest.fixture
+def no_insert(monkeypatch):
+    def create_recurring(*args):
+        raise AssertionError("不應寫入資料庫")
+
+    monkeypatch.setattr(CourseSchedule, "create_recurring", staticmethod(create_recurring))
+
+
+def test_member_is_sent_back_to_schedule_page(no_insert):
+    response, messages = _post_recurring("member", ["1"])
+
+    assert response.status_code == 302
+    assert response.location.endswith("/backstage/courseSchedule")
+    assert messages == ["No permission"]
+
+
+def test_out_of_range_weekday_is_not_inserted(no_insert):
+    response, messages = _post_recurring("manager", ["1", "8"])
+
+    assert response.location.endswith("/backstage/courseSchedule")
+    assert len(messages) == 1 and messages[0].startswith("新增失敗")
@@ -0,0 +1,23 @@
+from datetime import date
+
+from api.seats import SeatFeed
+
+# SSE 連線數上限：超過時 subscribe 回傳 None (串流回 503，頁面改為輪詢)，
+# 不會把 worker 的執行緒全部佔住。LISTEN 執行緒換成不做事的版本，不需要資料庫。
+
+WEEK_START = date(2025, 3, 3)
+
+
+def test_subscribe_is_capped_per_worker(monkeypatch):
+    monkeypatch.setattr(SeatFeed, "_run", lambda self: None)
+    feed = SeatFeed(max_subscribers=2)
+
+    first = feed.subscribe(WEEK_START)
+    second = feed.subscribe(WEEK_START)
+    assert first is not None and second is not None
+    assert feed.subscribe(WEEK_START) is None
+
+    feed.unsubscribe(first)
+    feed.unsubscribe(first)  # 串流結束與回應關閉都會退訂
+    assert feed.subscribe(WEEK_START) is not None
+    assert feed.stats()["subscribers"] == 2
@@ -0,0 +1,73 @@
+from collections import Counter
+
+from api.sql import DB, Booking, Waitlist
+
+# 額滿的課同時有人取消、有人加入候補：名額補滿但不超賣，
+# 每位加入的會員不是已預約就是在候補名單中 (不會遺失也不會兩邊都有)，
+# 候補順位從 1 開始連續。需要資料庫 (見 conftest.py 的 db fixture)。
+
+LIMIT = 20
+JOINERS = 300
+
+
+def _members_in(table, slot):
+    rows = DB.fetchall(
+        f"SELECT memberid FROM {table} WHERE courseid = %s AND scheduledate = %s AND timeslot = %s",
+        slot,
+    )
+    return {r[0] for r in rows}
+
+
+def test_concurrent_cancels_and_joins_keep_the_queue_consistent(slot_factory, run_concurrently):
+    slot, members = slot_factory(LIMIT, LIMIT + JOINERS)
+    holders, joiners = members[:LIMIT], members[LIMIT:]
+    for m in holders:
+        assert Booking.book(*slot, m).status == Booking.BOOKED
+
+    calls = [lambda m=m: Booking.cancel(*slot, m) for m in holders]
+    calls += [lambda m=m: Waitlist.join(*slot, m) for m in joiners]
+    results = run_concurrently(calls)
+
+    cancels, joins = results[:LIMIT], results[LIMIT:]
+    assert all(r.status == Booking.CANCELLED for r in cancels)
+    assert set(Counter(r.status for r in joins)) <= {Booking.BOOKED, Waitlist.WAITLISTED}
+
+    booked = _members_in("booking", slot)
+    waiting = _members_in("waitlist", slot)
+    assert len(booked) == LIMIT
+    assert not booked & set(holders)
+    assert not booked & waiting
+    assert booked | waiting == set(joiners)
+
+    # 取消時補上的會員一定都在最後的預約名單中
+    promoted = {m for r in cancels for m in r.promoted}
+    assert promoted <= booked
+
+    positions = sorted(Waitlist.position(*slot, m) for m in waiting)
+    assert positions == list(range(1, len(waiting) + 1))
+
+
+def test_concurrent_leave_and_cancel_never_promote_a_member_who_left(slot_factory, run_concurrently):
+    slot, members = slot_factory(LIMIT, LIMIT + JOINERS)
+    holders, joiners = members[:LIMIT], members[LIMIT:]
+    for m in holders:
+        Booking.book(*slot, m)
+    for m in joiners:
+        assert Waitlist.join(*slot, m).status == Waitlist.WAITLISTED
+
+    leavers = joiners[::2]
+    calls = [lambda m=m: Booking.cancel(*slot, m) for m in holders]
+    calls += [lambda m=m: Waitlist.leave(*slot, m) for m in leavers]
+    results = run_concurrently(calls)
+
+    booked = _members_in("booking", slot)
+    waiting = _members_in("waitlist", slot)
+    left = {m for m, r in zip(leavers, results[LIMIT:]) if r == Waitlist.LEFT}
+    assert len(booked) == LIMIT
+    assert not booked & left
+    assert not waiting & set(leavers)
+    # 補位依加入順序：仍在候補的人都比被補上的人晚加入
+    remaining = [m for m in joiners if m in waiting]
+    promoted = [m for m in joiners if m in booked]
+    assert promoted and remaining
+    assert joiners.index(promoted[-1]) < joiners.index(remaining[0])
@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+
+import pytest
+
+from api.cache import WEEK_GRID_CACHE
+from api.sql import DB
+from booking.views.frontdesk import get_week_grid, load_week_grid
+
+# 週課表的查詢數不能隨時段數增加 (原本每一格各查一次人數，是 N+1 查詢)。
+# 不需要資料庫：把 DB.fetchall / DB.fetchone 換成只記錄 SQL 的版本，
+# 再回傳假的排程 / 人數。
+
+WEEK_START = date(2025, 3, 3)
+
+
+def _schedule_rows(slots):
+    rows = []
+    for i in range(slots):
+        day = WEEK_START + timedelta(days=i % 7)
+        hour = 6 + (i // 7) % 16
+        time_slot = f"{hour:02d}:{(i // 112) * 15:02d}-{hour + 1:02d}:{(i // 112) * 15:02d}"
+        course_id = f"co{i:04d}"
+        rows.append((course_id, day, time_slot, "c0001", f"課程{i}", "教練", 10))
+    return rows
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    calls = []
+    state = {"schedules": []}
+
+    def fetchall(sql, input_params=None):
+        calls.append(sql)
+        if "FROM courseschedule" in sql:
+            return state["schedules"]
+        if "FROM booking" in sql:
+            # 每一格都有 3 人預約
+            return [(r[0], r[1], r[2], 3) for r in state["schedules"]]
+        return []
+
+    def fetchone(sql, input_params=None):
+        calls.append(sql)
+        return (0,)
+
+    monkeypatch.setattr(DB, "fetchall", staticmethod(fetchall))
+    monkeypatch.setattr(DB, "fetchone", staticmethod(fetchone))
+    return calls, state
+
+
+@pytest.mark.parametrize("slots", [1, 150])
+def test_load_week_grid_issues_two_queries(fake_db, slots):
+    calls, state = fake_db
+    state["schedules"] = _schedule_rows(slots)
+
+    grid = load_week_grid(WEEK_START)
+
+    assert len(calls) == 2
+    assert len(grid.cells) == slots
+    assert all(cell["current_count"] == 3 for cell in grid.cells.values())
+
+
+def test_set_count_reaches_grid_of_any_weekday(fake_db):
+    # 會員首頁以 ?week_start=週三 開啟時也要快取在週一的 key 下，預約後的人數才更新得到
+    calls, state = fake_db
+    state["schedules"] = _schedule_rows(7)
+    WEEK_GRID_CACHE.clear()
+
+    wednesday = WEEK_START + timedelta(days=2)
+    grid = get_week_grid(WEEK_GRID_CACHE.week_of(wednesday))
+    course_id, day, time_slot = next(iter(grid.cells))
+    WEEK_GRID_CACHE.set_count(course_id, day, time_slot, 9)
+
+    assert get_week_grid(WEEK_START).cells[(course_id, day, time_slot)]["current_count"] == 9
+    assert len(calls) == 2
+    WEEK_GRID_CACHE.clear()